@@ -12,7 +12,6 @@ from io import BytesIO
 from datetime import datetime
 import tempfile
 import os
-import kaleido
 
 # -----------------------
 # Fonctions de récupération des données (reprises de vos modules)
@@ -74,33 +73,6 @@ import plotly.io as pio
 import tempfile
 import os
 import streamlit as st
-import subprocess
-import sys
-
-def ensure_kaleido_chrome():
-    """
-    Vérifie si Kaleido + Chrome sont installés.
-    Si non, tente de les installer automatiquement.
-    """
-    try:
-        import kaleido
-    except ImportError:
-        st.info("📥 Installation de kaleido...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "kaleido"])
-    
-    try:
-        # Test simple pour voir si Kaleido peut exporter PNG
-        import plotly.io as pio
-        fig_test = px.line(x=[1, 2], y=[1, 2])
-        fig_test.to_image(format="png")
-    except Exception:
-        st.info("⚙ Installation de Chrome pour Kaleido...")
-        try:
-            subprocess.check_call([sys.executable, "-m", "kaleido"])
-        except Exception:
-            st.error("❌ Impossible d'installer Chrome pour Kaleido. Veuillez l'installer manuellement.")
-            return False
-    return True
 
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -793,7 +765,7 @@ if page == "Accueil":
                     )
                     st.success("✅ PDF généré !")
                 except ImportError:
-                    st.error("❌ Dépendance manquante : `pip install kaleido`")
+                    st.error("❌ Dépendance manquante : `pip install reportlab matplotlib seaborn`")
                 except Exception as e:
                     st.error(f"❌ Erreur PDF : {str(e)}")
 
@@ -1,11 +1,43 @@
 # app_fetchers.py - Fonctions fetch robustes adaptées aux nouveaux datasets
+import json
+import numpy as np
 import pandas as pd
 import requests
-import streamlit as st
+import os
 import re
+import time
+import logging
+import threading
+import contextvars
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from functools import lru_cache
+from operator import itemgetter
 from difflib import SequenceMatcher
 
+import cache_persistant
+from caches import LRUCache, MemoryBudgetCache, register_cache
+from cles import cle_commune, code_departement, nom_commune
+from indicateurs import IDENTIFIANTS, MODULE_COLUMNS, MODULES, build_indicateurs
+from metrics import labels_for_request, registry as metrics
+
+logger = logging.getLogger(__name__)
+
+# Décodeurs JSON rapides, utilisés s'ils sont installés (sinon json de la stdlib)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Racine de l'API Opendatasoft ; surchargeable pour viser un serveur local (benchmarks, hors ligne)
+API_BASE_URL = os.environ.get(
+    "FOCUS_API_BASE_URL", "https://data.economie.gouv.fr/api/explore/v2.1"
+).rstrip("/")
+
 # Mapping des années vers les nouveaux datasets
 DATASETS_MAPPING = {
     2019: "comptes-individuels-des-communes-fichier-global-2019-2020",
@@ -20,34 +52,366 @@ def get_dataset_for_year(annee):
     """Retourne le dataset approprié pour une année donnée"""
     return DATASETS_MAPPING.get(annee, "comptes-individuels-des-communes-fichier-global-2023-2024")
 
+def get_api_url_for_dataset(dataset):
+    """Retourne l'URL /records d'un dataset"""
+    return f"{API_BASE_URL}/catalog/datasets/{dataset}/records"
+
 def get_api_url_for_year(annee):
     """Retourne l'URL de l'API pour une année donnée"""
-    dataset = get_dataset_for_year(annee)
-    return f"https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/{dataset}/records"
+    return get_api_url_for_dataset(get_dataset_for_year(annee))
+
+# ==============================================================
+# COUCHE HTTP PARTAGÉE (SINGLE-FLIGHT)
+# ==============================================================
+
+class SingleFlight:
+    """Regroupe les appels identiques concurrents sur une seule exécution.
+
+    Le premier appelant d'une clé exécute la fonction, les appelants arrivés
+    pendant l'exécution attendent et reçoivent le même résultat (ou la même
+    exception). Rien n'est conservé une fois l'appel terminé : ce n'est pas
+    un cache, seulement une déduplication des appels en vol.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_cours = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._en_cours.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._en_cours[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._en_cours.pop(key, None)
+
+# Partagé par toutes les sessions Streamlit du processus
+_single_flight = SingleFlight()
+
+def _request_key(api_url, params):
+    """Clé canonique d'une requête (dataset + paramètres, ordre indifférent)"""
+    return (api_url, tuple(sorted((k, str(v)) for k, v in params.items())))
+
+# ==============================================================
+# COMPTAGE DES REQUÊTES PAR OPÉRATION LOGIQUE
+# ==============================================================
+
+# Compteurs actifs dans le contexte courant (imbriquables)
+_compteurs_actifs = contextvars.ContextVar("compteurs_requetes", default=())
+
+class RequestCounter:
+    """Compte les requêtes HTTP émises pendant une opération logique.
+
+    Actif pour le contexte courant entre `start()` et `stop()`, ou dans un
+    bloc `with`. Les compteurs s'imbriquent : une requête est comptée par
+    chacun des compteurs actifs. Un thread de travail n'hérite pas du
+    compteur, sauf s'il est lancé dans une copie du contexte
+    (`contextvars.copy_context().run`).
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.requetes = 0          # requêtes HTTP réellement émises, retries compris
+        self.appels = 0            # appels à api_get_json
+        self.coalescees = 0        # appels servis par une requête identique en vol
+        self.octets = 0            # volume des réponses reçues
+        self.par_dataset = Counter()
+        self.par_module = Counter()
+        self._lock = threading.Lock()
+        self._token = None
+
+    def start(self):
+        self._token = _compteurs_actifs.set(_compteurs_actifs.get() + (self,))
+        return self
+
+    def stop(self):
+        if self._token is not None:
+            _compteurs_actifs.reset(self._token)
+            self._token = None
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _ajouter(self, labels, requetes, octets=0):
+        dataset, _, module = labels
+        with self._lock:
+            self.appels += 1
+            if requetes:
+                self.requetes += requetes
+                self.octets += octets
+                self.par_dataset[dataset] += requetes
+                self.par_module[module] += requetes
+            else:
+                self.coalescees += 1
+
+    def depasse(self, budget):
+        return budget is not None and self.requetes > budget
+
+    def resume(self):
+        return {
+            "operation": self.name,
+            "requetes": self.requetes,
+            "appels": self.appels,
+            "coalescees": self.coalescees,
+            "octets": self.octets,
+            "par_dataset": dict(self.par_dataset),
+            "par_module": dict(self.par_module),
+        }
+
+def reset_request_counters():
+    """Désactive les compteurs restés actifs dans le contexte (rerun interrompu par st.rerun / st.stop)"""
+    _compteurs_actifs.set(())
+
+def _compter(labels, requetes, octets=0):
+    for compteur in _compteurs_actifs.get():
+        compteur._ajouter(labels, requetes, octets)
+
+def compter_requetes(name=None):
+    """Context manager : `with compter_requetes("commune") as c: ...` puis `c.requetes`"""
+    return RequestCounter(name)
+
+# Nouvelles tentatives sur erreurs transitoires (réseau, 429, 5xx)
+API_MAX_RETRIES = 2
+API_RETRY_BACKOFF = 0.5
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# ==============================================================
+# DÉCODAGE DES RÉPONSES
+# ==============================================================
+
+def decode_json(content):
+    """Décode un corps de réponse (bytes) avec orjson, msgspec ou json, selon ce qui est installé"""
+    if orjson is not None:
+        return orjson.loads(content)
+    if msgspec is not None:
+        return msgspec.json.decode(content)
+    return json.loads(content)
+
+# Champs texte des datasets : jamais convertis en nombres ("038" doit rester "038")
+CHAMPS_TEXTE = {"an", "dep", "icom", "inom", "cdreg", "reg", "type", "siren"}
+
+def records_to_frame(results, colonnes=None):
+    """DataFrame construit par colonnes depuis une liste de records.
+
+    Plus rapide que `pd.DataFrame(records)` : les champs numériques sont
+    extraits d'un coup (itemgetter) dans un bloc float64 (None → NaN), les
+    entiers restent int64 et les champs texte restent des chaînes. Par
+    défaut les colonnes sont celles du premier record ; une colonne demandée
+    absente de celui-ci est ignorée, comme avec le constructeur pandas.
+    """
+    if not results:
+        return pd.DataFrame(columns=list(colonnes or []))
+
+    premier = results[0]
+    colonnes = [c for c in colonnes if c in premier] if colonnes is not None else list(premier)
+    nombres = [c for c in colonnes if c not in CHAMPS_TEXTE]
+
+    try:
+        bloc = np.array(list(map(itemgetter(*nombres), results)), dtype="float64") if nombres else None
+    except (KeyError, TypeError, ValueError):
+        # Records hétérogènes (champ manquant, texte dans un champ numérique)
+        return _records_to_frame_par_colonne(results, colonnes)
+    if bloc is not None and bloc.ndim == 1:
+        bloc = bloc.reshape(-1, 1)
+
+    data = {}
+    for colonne in colonnes:
+        if colonne in CHAMPS_TEXTE:
+            data[colonne] = [record.get(colonne) for record in results]
+            continue
+        valeurs = bloc[:, nombres.index(colonne)]
+        if type(premier[colonne]) is int:
+            entiers = np.asarray([record[colonne] for record in results])
+            if entiers.dtype.kind == "i":
+                valeurs = entiers
+        data[colonne] = valeurs
+    return pd.DataFrame(data)
+
+def _records_to_frame_par_colonne(results, colonnes):
+    data = {}
+    for colonne in colonnes:
+        valeurs = [record.get(colonne) for record in results]
+        tableau = np.asarray(valeurs) if colonne not in CHAMPS_TEXTE else None
+        if tableau is not None and tableau.dtype.kind in "iufb":
+            data[colonne] = tableau
+        elif tableau is not None and tableau.dtype.kind == "O":
+            # Nombres mêlés de None : float64 avec NaN, sinon colonne objet telle quelle
+            try:
+                data[colonne] = np.array(valeurs, dtype="float64")
+            except (TypeError, ValueError):
+                data[colonne] = valeurs
+        else:
+            data[colonne] = valeurs
+    return pd.DataFrame(data)
+
+# Projections refusées par un dataset (champ absent de son schéma)
+_SELECTS_REFUSES = set()
+
+def _projection_refusee(data):
+    return isinstance(data, dict) and "results" not in data and bool(data.get("error_code"))
+
+# Réponses des requêtes d'une commune (une ligne, quelques Ko) gardées une heure :
+# les pages et le préchargement relisent les mêmes requêtes. Les réponses de plus
+# de REPONSE_CACHEABLE_MAX ne sont pas gardées ; les autres (y compris des pages
+# de flux paginés à `select` étroit) tiennent dans un budget en octets (taille
+# des dicts décodés). Derrière ce cache, le cache disque (cache_persistant,
+# FOCUS_CACHE_DB) s'il est ouvert.
+REPONSES_CACHE_BUDGET = 32 * 2**20
+REPONSES_CACHE_TTL = 3600
+REPONSE_CACHEABLE_MAX = 64 * 1024
+
+_reponses_cache = MemoryBudgetCache(REPONSES_CACHE_BUDGET, ttl=REPONSES_CACHE_TTL, name="reponses_api")
+
+def api_get_json(api_url, params, timeout=10, module=None, annee=None):
+    """GET sur l'API Opendatasoft, décodé en JSON.
+
+    Les requêtes identiques lancées en même temps par plusieurs sessions
+    partagent un seul appel HTTP, et les petites réponses sont gardées en
+    cache (REPONSES_CACHE_TTL). Le dict retourné est partagé entre ces
+    appelants : il doit être traité en lecture seule.
+
+    Chaque appel est instrumenté (latence, octets, retries, résultat vide)
+    sous les labels (dataset, année, module) ; l'année est déduite du
+    `where` si elle n'est pas fournie.
+
+    Si le dataset refuse la projection `select` (champ inconnu), la requête
+    est rejouée sans projection, et le sera directement pour les appels
+    suivants avec ce même `select`.
+    """
+    select = params.get("select")
+    if select:
+        if (api_url, select) not in _SELECTS_REFUSES:
+            data = _api_get_json(api_url, params, timeout, module, annee)
+            if not _projection_refusee(data):
+                return data
+            _SELECTS_REFUSES.add((api_url, select))
+            logger.warning("Projection refusée par %s (%s) : requête sans select", api_url, data.get("message"))
+        params = {k: v for k, v in params.items() if k != "select"}
+    return _api_get_json(api_url, params, timeout, module, annee)
+
+def _api_get_json(api_url, params, timeout, module, annee):
+    labels = labels_for_request(api_url, params, module=module, annee=annee)
+    cle = _request_key(api_url, params)
+    cached = _reponses_cache.get(cle)
+    if cached is not None:
+        metrics.record_cache(labels, hit=True)
+        return cached
+    if cache_persistant.reponses is not None:
+        contenu = cache_persistant.reponses.get(repr(cle))
+        if contenu is not None:
+            data = decode_json(contenu)
+            _reponses_cache.set(cle, data)
+            metrics.record_cache(labels, hit=True)
+            return data
+    metrics.record_cache(labels, hit=False)
+
+    execute = []
+    contenus = []
+
+    def _appel():
+        debut = time.perf_counter()
+        retries = 0
+        try:
+            while True:
+                try:
+                    execute.append(True)
+                    response = requests.get(api_url, params=params, timeout=timeout)
+                    if response.status_code not in RETRY_STATUS_CODES or retries >= API_MAX_RETRIES:
+                        break
+                except (requests.ConnectionError, requests.Timeout):
+                    if retries >= API_MAX_RETRIES:
+                        raise
+                retries += 1
+                time.sleep(API_RETRY_BACKOFF * 2 ** (retries - 1))
+
+            try:
+                data = decode_json(response.content)
+            except Exception as e:
+                # Même famille d'exception que response.json() : les fetchers l'ignorent
+                raise requests.exceptions.InvalidJSONError(f"Réponse JSON invalide : {e}", response=response) from e
+        except Exception:
+            metrics.record_request(labels, time.perf_counter() - debut, retries=retries, error=True)
+            raise
+
+        contenus.append(response.content)
+        metrics.record_request(
+            labels,
+            time.perf_counter() - debut,
+            payload_bytes=len(response.content),
+            retries=retries,
+            empty=not (isinstance(data, dict) and data.get("results"))
+        )
+        return data
+
+    try:
+        result = _single_flight.do(cle, _appel)
+    finally:
+        # `execute` compte les tentatives HTTP ; vide si l'appel a été coalescé
+        # (y compris quand l'appel en vol a échoué : l'exception est partagée)
+        _compter(labels, len(execute), sum(map(len, contenus)))
+        if not execute:
+            metrics.record_coalesced(labels)
+    if execute and len(contenus[0]) <= REPONSE_CACHEABLE_MAX and isinstance(result, dict) and "results" in result:
+        # Erreurs (projection refusée, 4xx...) jamais gardées
+        _reponses_cache.set(cle, result)
+        if cache_persistant.reponses is not None:
+            cache_persistant.reponses.set(repr(cle), contenus[0])
+    return result
+
+# Au niveau module (et non sur la méthode) pour ne pas retenir l'instance du fetcher
+@lru_cache(maxsize=500)
+def _normalize_commune_name(name):
+    if not name:
+        return ""
+    normalized = name.strip().upper()
+    patterns = [
+        (r'^(LA|LE|LES)\s+(.+)$', r'\2 (\1)'),
+        (r'^(.+)\s+\((LA|LE|LES)\)$', r'\2 \1'),
+    ]
+    for pattern, replacement in patterns:
+        normalized = re.sub(pattern, replacement, normalized, flags=re.IGNORECASE)
+    return re.sub(r'\s+', ' ', normalized).strip()
+
+register_cache("normalisation_noms", _normalize_commune_name)
+
+# Variantes conservées 24 h : les noms de communes changent rarement
+VARIANTS_CACHE_SIZE = 2000
+VARIANTS_CACHE_TTL = 24 * 3600
 
 class AppRobustFetcher:
     """Fetcher robuste adapté aux nouveaux datasets"""
     
     def __init__(self):
-        self._cache = {}
+        self._cache = LRUCache(maxsize=VARIANTS_CACHE_SIZE, ttl=VARIANTS_CACHE_TTL, name="variantes_communes")
     
-    @lru_cache(maxsize=500)
     def normalize_commune_name(self, name):
-        if not name:
-            return ""
-        normalized = name.strip().upper()
-        patterns = [
-            (r'^(LA|LE|LES)\s+(.+)$', r'\2 (\1)'),
-            (r'^(.+)\s+\((LA|LE|LES)\)$', r'\2 \1'),
-        ]
-        for pattern, replacement in patterns:
-            normalized = re.sub(pattern, replacement, normalized, flags=re.IGNORECASE)
-        return re.sub(r'\s+', ' ', normalized).strip()
+        return _normalize_commune_name(name)
     
     def find_commune_variants(self, commune, departement=None):
-        cache_key = f"{commune}_{departement}"
-        if cache_key in self._cache:
-            return self._cache[cache_key]
+        cache_key = commune, departement = cle_commune(commune, departement)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         variants = []
         search_terms = self._generate_search_terms(commune)
@@ -56,7 +420,7 @@ class AppRobustFetcher:
         datasets_to_search = list(set(DATASETS_MAPPING.values()))
         
         for dataset in datasets_to_search:
-            api_url = f"https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/{dataset}/records"
+            api_url = get_api_url_for_dataset(dataset)
             
             for term in search_terms:
                 where_clause = f'inom LIKE "%{term}%"'
@@ -67,8 +431,7 @@ class AppRobustFetcher:
                 params = {"where": where_clause, "limit": 50, "select": "inom,dep"}
                 
                 try:
-                    response = requests.get(api_url, params=params, timeout=10)
-                    data = response.json()
+                    data = api_get_json(api_url, params, module="variantes")
                     
                     if "results" in data:
                         for record in data["results"]:
@@ -84,7 +447,7 @@ class AppRobustFetcher:
         if not variants:
             variants = [{"nom": commune, "departement": departement or ""}]
         
-        self._cache[cache_key] = variants
+        self._cache.set(cache_key, variants)
         return variants
     
     def _generate_search_terms(self, commune):
@@ -103,418 +466,455 @@ class AppRobustFetcher:
         norm2 = self.normalize_commune_name(found_commune)
         return SequenceMatcher(None, norm1, norm2).ratio() >= threshold
 
-# Instance globale cachée
-@st.cache_resource
+# Instance globale du processus (hors st.cache_resource : utilisable sans session,
+# depuis le thread de préchargement ; son cache est vidé par reset_caches)
+_app_fetcher = AppRobustFetcher()
+
 def get_app_fetcher():
-    return AppRobustFetcher()
+    return _app_fetcher
+
+# ==============================================================
+# PROJECTION DES CHAMPS PAR MODULE (MODULE_COLUMNS : indicateurs.py)
+# ==============================================================
+
+def select_for(*modules):
+    """Valeur du paramètre `select` : union ordonnée des champs des modules demandés"""
+    champs = []
+    for module in modules:
+        for champ in MODULE_COLUMNS[module]:
+            if champ not in champs:
+                champs.append(champ)
+    return ",".join(champs)
 
 # ==============================================================
 # FONCTIONS FETCH ADAPTÉES AUX NOUVEAUX DATASETS
 # ==============================================================
 
-def fetch_commune_fonctionnement(commune, annees, departement):
-    """Version adaptée aux nouveaux datasets - garde votre logique exacte"""
+# Message « année introuvable » par module
+_MESSAGES_MANQUANTS = {
+    "fonctionnement": "Fonctionnement non trouvé",
+    "investissement": "Investissement non trouvé",
+    "caf": "CAF non trouvé",
+    "fiscalite": "Fiscalité non trouvée",
+    "endettement": "Endettement non trouvé",
+    "fdr": "FDR non trouvé",
+}
+
+# Modules dont le tableau final est trié par année
+_MODULES_TRIES = {"investissement", "caf", "endettement"}
+
+def _fetch_commune_module(module, commune, annees, departement):
+    """Une requête par année, sur la première variante de nom qui répond"""
     fetcher = get_app_fetcher()
+    departement = code_departement(departement)
     variants = fetcher.find_commune_variants(commune, departement)
-    
+
     df_list = []
-    
+
     for annee in annees:
         annee_trouvee = False
         api_url = get_api_url_for_year(annee)  # URL adaptée à l'année
-        
-        for variant in variants:
-            commune_nom = variant["nom"]
-            dept = variant["departement"] if not departement else departement
-            
-            where_clause = f'an="{annee}" AND inom="{commune_nom}"'
-            if dept:
-                where_clause += f' AND dep="{dept}"'
-            
-            params = {"where": where_clause, "limit": 100}
-            
-            try:
-                response = requests.get(api_url, params=params, timeout=10)
-                data = response.json()
-                
-                if "results" not in data or not data["results"]:
-                    continue
-                
-                df = pd.DataFrame(data["results"])
-                colonnes_voulu = ['an', 'pop1', 'prod', 'charge', 'fprod', 'mprod',
-                                  'fcharge', 'mcharge', 'fdgf', 'mdgf', 'fperso', 'mperso']
-                colonnes_existantes = [c for c in colonnes_voulu if c in df.columns]
-                
-                if not colonnes_existantes:
-                    continue
-                    
-                df_fonctionnement = df[colonnes_existantes].copy()
-
-                # Renommer colonnes (identique à votre version)
-                df_fonctionnement.rename(columns={
-                    "an": "Année",
-                    "pop1": "Population",
-                    "prod": "Recettes de fonctionnement",
-                    "charge": "Dépenses de fonctionnement",
-                    "fprod": "Recettes réelles fonctionnement / hab",
-                    "mprod": "Moyenne strate Recettes / hab",
-                    "fcharge": "Dépenses réelles fonctionnement / hab",
-                    "mcharge": "Moyenne strate Dépenses / hab",
-                    "fdgf": "DGF / habitant",
-                    "mdgf": "Moyenne strate DGF / hab",
-                    "fperso": "Dépenses personnel / hab",
-                    "mperso": "Moyenne strate Personnel / hab"
-                }, inplace=True)
-                
-                # Ratios (identiques à votre version)
-                if "Dépenses personnel / hab" in df_fonctionnement.columns and "Dépenses réelles fonctionnement / hab" in df_fonctionnement.columns:
-                    df_fonctionnement["Ratio Personnel/DRF Commune"] = (
-                        df_fonctionnement["Dépenses personnel / hab"] /
-                        df_fonctionnement["Dépenses réelles fonctionnement / hab"] * 100
-                    ).round(2)
-                
-                if "Moyenne strate Personnel / hab" in df_fonctionnement.columns and "Moyenne strate Dépenses / hab" in df_fonctionnement.columns:
-                    df_fonctionnement["Ratio Personnel/DRF Moyenne"] = (
-                        df_fonctionnement["Moyenne strate Personnel / hab"] /
-                        df_fonctionnement["Moyenne strate Dépenses / hab"] * 100
-                    ).round(2)
-                
-                df_list.append(df_fonctionnement)
-                annee_trouvee = True
-                break
-                
-            except requests.RequestException:
-                continue
-        
-        if not annee_trouvee:
-            print(f"WARN: Fonctionnement non trouvé pour {commune} en {annee}")
-    
-    return pd.concat(df_list, ignore_index=True) if df_list else pd.DataFrame()
 
-def fetch_commune_investissement(commune, annees, departement):
-    """Version adaptée aux nouveaux datasets"""
-    fetcher = get_app_fetcher()
-    variants = fetcher.find_commune_variants(commune, departement)
-    
-    df_list = []
-    
-    for an in annees:
-        annee_trouvee = False
-        api_url = get_api_url_for_year(an)
-        
         for variant in variants:
             commune_nom = variant["nom"]
             dept = variant["departement"] if not departement else departement
-            
-            where_clause = f'an="{an}" AND inom="{commune_nom}"'
-            if dept:
-                where_clause += f' AND dep="{dept}"'
-            
-            params = {"where": where_clause, "limit": 100}
-            
-            try:
-                r = requests.get(api_url, params=params, timeout=10)
-                data = r.json().get("results", [])
-                
-                if data:
-                    df = pd.DataFrame(data)
-                    cols = ['an', 'fequip', 'mequip', 'fprod', 'mprod']
-                    df_exist = [c for c in cols if c in df.columns]
-                    
-                    if df_exist:
-                        df = df[df_exist].copy()
-                        
-                        # Calculs spécifiques investissement (selon votre version app.py)
-                        df['Équipement / hab Commune'] = df['fequip']
-                        df['Équipement / hab Moyenne'] = df['mequip']
-                        df['Équipement / RRF Commune'] = (df['fequip'] / df['fprod'].replace(0, pd.NA) * 100).round(2)
-                        df['Équipement / RRF Moyenne'] = (df['mequip'] / df['mprod'].replace(0, pd.NA) * 100).round(2)
-                        
-                        df.rename(columns={'an': 'Année'}, inplace=True)
-                        df_list.append(df)
-                        annee_trouvee = True
-                        break
-                        
-            except requests.RequestException:
-                continue
-        
-        if not annee_trouvee:
-            print(f"WARN: Investissement non trouvé pour {commune} en {an}")
-    
-    if df_list:
-        return pd.concat(df_list, ignore_index=True).sort_values("Année")
-    return pd.DataFrame()
 
-def fetch_commune_caf(commune, annees, departement):
-    """Version adaptée aux nouveaux datasets"""
-    fetcher = get_app_fetcher()
-    variants = fetcher.find_commune_variants(commune, departement)
-    
-    dfs = []
-    
-    for annee in annees:
-        annee_trouvee = False
-        api_url = get_api_url_for_year(annee)
-        
-        for variant in variants:
-            commune_nom = variant["nom"]
-            dept = variant["departement"] if not departement else departement
-            
             where_clause = f'an="{annee}" AND inom="{commune_nom}"'
             if dept:
                 where_clause += f' AND dep="{dept}"'
-            
-            params = {"where": where_clause, "limit": 100}
-            
+
+            params = {"where": where_clause, "limit": 100, "select": select_for(module)}
+
             try:
-                response = requests.get(api_url, params=params, timeout=10)
-                data = response.json()
+                data = api_get_json(api_url, params, module=module)
 
                 if "results" not in data or not data["results"]:
                     continue
 
-                df = pd.DataFrame(data["results"])
-                colonnes_calc = ['an', 'pop1', 'fcaf', 'mcaf', 'fprod', 'mprod', 'fcafn', 'mcafn']
-                colonnes_existantes = [c for c in colonnes_calc if c in df.columns]
-                
-                if not colonnes_existantes:
+                df = build_indicateurs(module, records_to_frame(data["results"], MODULE_COLUMNS[module]))
+                if df is None:
                     continue
-                    
-                df_caf = df[colonnes_existantes].copy()
-
-                # Calcul des ratios (identique à votre version)
-                df_caf['CAF brute / RRF Commune'] = df_caf.apply(
-                    lambda row: (row['fcaf']/row['fprod'])*100 if row['fprod'] != 0 else None, axis=1)
-                df_caf['CAF brute / RRF Moyenne'] = df_caf.apply(
-                    lambda row: (row['mcaf']/row['mprod'])*100 if row['mprod'] != 0 else None, axis=1)
-                df_caf['CAF nette / RRF Commune'] = df_caf.apply(
-                    lambda row: (row['fcafn']/row['fprod'])*100 if row['fprod'] != 0 else None, axis=1)
-                df_caf['CAF nette / RRF Moyenne'] = df_caf.apply(
-                    lambda row: (row['mcafn']/row['mprod'])*100 if row['mprod'] != 0 else None, axis=1)
-
-                # Sélection finale et renommage (identique à votre version)
-                df_caf_final = df_caf[['an', 'pop1', 'fcaf', 'mcaf',
-                                        'CAF brute / RRF Commune', 'CAF brute / RRF Moyenne',
-                                        'CAF nette / RRF Commune', 'CAF nette / RRF Moyenne']].copy()
-                df_caf_final.rename(columns={
-                    'an': 'Année',
-                    'pop1': 'Population',
-                    'fcaf': 'CAF brute / hab Commune',
-                    'mcaf': 'CAF brute / hab Moyenne'
-                }, inplace=True)
-
-                dfs.append(df_caf_final)
+
+                df_list.append(df)
                 annee_trouvee = True
                 break
-                
+
             except requests.RequestException:
                 continue
-        
+
         if not annee_trouvee:
-            print(f"WARN: CAF non trouvé pour {commune} en {annee}")
+            metrics.record_missing(module, annee)
+            logger.warning("%s pour %s en %s", _MESSAGES_MANQUANTS[module], commune, annee)
 
-    if dfs:
-        result = pd.concat(dfs, ignore_index=True)
-        result.sort_values("Année", inplace=True)
-        return result
-    else:
+    if not df_list:
         return pd.DataFrame()
+    result = pd.concat(df_list, ignore_index=True)
+    return result.sort_values("Année") if module in _MODULES_TRIES else result
 
-def fetch_commune_fiscalite(commune, annees, departement):
+def fetch_commune_fonctionnement(commune, annees, departement):
+    """Version adaptée aux nouveaux datasets - garde votre logique exacte"""
+    return _fetch_commune_module("fonctionnement", commune, annees, departement)
+
+def fetch_commune_investissement(commune, annees, departement):
     """Version adaptée aux nouveaux datasets"""
-    fetcher = get_app_fetcher()
-    variants = fetcher.find_commune_variants(commune, departement)
-    
-    df_list = []
-    
-    for annee in annees:
-        annee_trouvee = False
-        api_url = get_api_url_for_year(annee)
-        
-        for variant in variants:
-            commune_nom = variant["nom"]
-            dept = variant["departement"] if not departement else departement
-            
-            where_clause = f'an="{annee}" AND inom="{commune_nom}"'
-            if dept:
-                where_clause += f' AND dep="{dept}"'
-            
-            params = {"where": where_clause, "limit": 100}
-            
-            try:
-                response = requests.get(api_url, params=params, timeout=10)
-                data = response.json()
+    return _fetch_commune_module("investissement", commune, annees, departement)
 
-                if "results" not in data or not data["results"]:
-                    continue
+def fetch_commune_caf(commune, annees, departement):
+    """Version adaptée aux nouveaux datasets"""
+    return _fetch_commune_module("caf", commune, annees, departement)
 
-                df = pd.DataFrame(data["results"])
-                colonnes = ['an', 'fimpo1', 'mimpo1', 'fprod', 'mprod', 'tth', 'tmth', 'tfb', 'tmfb', 'tfnb', 'tmfnb']
-                colonnes_existantes = [c for c in colonnes if c in df.columns]
-                
-                if not colonnes_existantes:
-                    continue
-                    
-                df_fiscalite = df[colonnes_existantes].copy()
-
-                # Calcul des ratios Impôts locaux sur RRF (selon votre version app.py)
-                if 'fimpo1' in df_fiscalite.columns and 'fprod' in df_fiscalite.columns:
-                    df_fiscalite['Impôts/RRF Commune'] = (df_fiscalite['fimpo1'] / df_fiscalite['fprod'].replace(0, pd.NA) * 100).round(2)
-                if 'mimpo1' in df_fiscalite.columns and 'mprod' in df_fiscalite.columns:
-                    df_fiscalite['Impôts/RRF Moyenne'] = (df_fiscalite['mimpo1'] / df_fiscalite['mprod'].replace(0, pd.NA) * 100).round(2)
-
-                # Renommer colonnes pour affichage (selon votre version app.py)
-                rename_dict = {
-                    'an': 'Année',
-                    'fimpo1': 'Impôts / hab Commune',
-                    'mimpo1': 'Impôts / hab Moyenne',
-                    'tth': 'Taux TH Commune',
-                    'tmth': 'Taux TH Moyenne',
-                    'tfb': 'Taux TFB Commune',
-                    'tmfb': 'Taux TFB Moyenne',
-                    'tfnb': 'Taux TFNB Commune',
-                    'tmfnb': 'Taux TFNB Moyenne'
-                }
-                df_fiscalite.rename(columns=rename_dict, inplace=True)
-                
-                df_list.append(df_fiscalite)
-                annee_trouvee = True
-                break
-                
-            except requests.RequestException:
-                continue
-        
-        if not annee_trouvee:
-            print(f"WARN: Fiscalité non trouvée pour {commune} en {annee}")
-    
-    if df_list:
-        return pd.concat(df_list, ignore_index=True)
-    return pd.DataFrame()
+def fetch_commune_fiscalite(commune, annees, departement):
+    """Version adaptée aux nouveaux datasets"""
+    return _fetch_commune_module("fiscalite", commune, annees, departement)
 
 def fetch_commune_endettement(commune, annees, departement):
     """Version adaptée aux nouveaux datasets"""
-    fetcher = get_app_fetcher()
-    variants = fetcher.find_commune_variants(commune, departement)
-    
-    df_list = []
-    
-    for an in annees:
-        annee_trouvee = False
-        api_url = get_api_url_for_year(an)
-        
-        for variant in variants:
-            commune_nom = variant["nom"]
-            dept = variant["departement"] if not departement else departement
-            
-            where_clause = f'an="{an}" AND inom="{commune_nom}"'
-            if dept:
-                where_clause += f' AND dep="{dept}"'
-            
-            params = {"where": where_clause, "limit": 100}
-            
-            try:
-                r = requests.get(api_url, params=params, timeout=10)
-                data = r.json().get("results", [])
-                
-                if data:
-                    df = pd.DataFrame(data)
-                    cols = ['an', 'fdette', 'mdette', 'fcaf', 'mcaf', 'fcafn', 'mcafn']
-                    df_exist = [c for c in cols if c in df.columns]
-                    
-                    if df_exist:
-                        df = df[df_exist].copy()
-
-                        # Calculs spécifiques endettement (selon votre version app.py)
-                        df['Dette / hab Commune'] = df['fdette']
-                        df['Dette / hab Moyenne'] = df['mdette']
-                        df['Dette / RRF Commune'] = (df['fdette'] / df['fcaf'].replace(0, pd.NA) * 100).round(2)
-                        df['Dette / RRF Moyenne'] = (df['mdette'] / df['mcaf'].replace(0, pd.NA) * 100).round(2)
-                        df['Dette en années CAF Commune'] = (df['fdette'] / df['fcaf'].replace(0, pd.NA)).round(2)
-                        df['Dette en années CAF Moyenne'] = (df['mdette'] / df['mcaf'].replace(0, pd.NA)).round(2)
-
-                        df.rename(columns={'an': 'Année'}, inplace=True)
-                        df_list.append(df)
-                        annee_trouvee = True
-                        break
-                        
-            except requests.RequestException:
-                continue
-        
-        if not annee_trouvee:
-            print(f"WARN: Endettement non trouvé pour {commune} en {an}")
-    
-    if df_list:
-        return pd.concat(df_list, ignore_index=True).sort_values("Année")
-    return pd.DataFrame()
+    return _fetch_commune_module("endettement", commune, annees, departement)
 
 def fetch_commune_fdr(commune, annees, departement):
     """Version adaptée aux nouveaux datasets"""
-    fetcher = get_app_fetcher()
-    variants = fetcher.find_commune_variants(commune, departement)
+    return _fetch_commune_module("fdr", commune, annees, departement)
+
+# ==============================================================
+# RECHERCHE ET AGRÉGATION (utilisées par prod.py et reports.py)
+# ==============================================================
+
+# Résultats assemblés, bornés en octets plutôt qu'en entrées : une commune sur
+# six ans (six tableaux) pèse bien plus qu'une recherche. Les moins récemment
+# lus sont évincés au-delà du budget (RSS stable sur un serveur de longue durée).
+RECHERCHES_CACHE_BUDGET = 8 * 2**20
+DONNEES_COMMUNE_CACHE_BUDGET = 128 * 2**20
+RESULTATS_CACHE_TTL = 3600
+
+_recherches_cache = MemoryBudgetCache(RECHERCHES_CACHE_BUDGET, ttl=RESULTATS_CACHE_TTL, name="recherches_commune")
+_donnees_commune_cache = MemoryBudgetCache(DONNEES_COMMUNE_CACHE_BUDGET, ttl=RESULTATS_CACHE_TTL,
+                                           name="donnees_commune")
+
+def search_commune(nom, annee_reference=2024):
+    """Recherche une commune et retourne les informations incluant le département"""
+    cle = nom_commune(nom), int(annee_reference)
+    communes = _recherches_cache.get(cle)
+    if communes is None:
+        communes = _search_commune(*cle)
+        _recherches_cache.set(cle, communes)
+    # Copies : l'appelant peut modifier le résultat sans toucher au cache
+    return [dict(c) for c in communes]
+
+def _search_commune(nom, annee_reference):
+    url = get_api_url_for_year(annee_reference)
     
-    df_list = []
+    params = {
+        "where": f'an="{annee_reference}" AND inom="{nom}"',
+        "limit": 100,
+        "select": "inom,dep,pop1"
+    }
     
-    for annee in annees:
-        annee_trouvee = False
-        api_url = get_api_url_for_year(annee)
-        
-        for variant in variants:
-            commune_nom = variant["nom"]
-            dept = variant["departement"] if not departement else departement
-            
-            where_clause = f'an="{annee}" AND inom="{commune_nom}"'
-            if dept:
-                where_clause += f' AND dep="{dept}"'
-            
-            params = {"where": where_clause, "limit": 100}
-            
-            try:
-                response = requests.get(api_url, params=params, timeout=10)
-                data = response.json()
+    data = api_get_json(url, params, module="recherche")
+    
+    if "results" not in data or not data["results"]:
+        return []
+    
+    communes = []
+    for result in data["results"]:
+        communes.append({
+            "nom": result.get("inom", ""),
+            "departement": result.get("dep", ""),
+            "population": result.get("pop1", 0)
+        })
+    
+    return communes
 
-                if "results" not in data or not data["results"]:
-                    continue
+# Une entrée par (commune, département, année) : six tableaux d'une année
+ANNEES_COMMUNE_CACHE_SIZE = 600
+ANNEES_COMMUNE_CACHE_TTL = 3600
 
-                df = pd.DataFrame(data["results"])
-                colonnes = ['an', 'ffdr', 'mfdr', 'fcharge', 'mcharge']
-                colonnes_existantes = [c for c in colonnes if c in df.columns]
-                
-                if not colonnes_existantes:
+_annees_commune_cache = LRUCache(maxsize=ANNEES_COMMUNE_CACHE_SIZE, ttl=ANNEES_COMMUNE_CACHE_TTL,
+                                 name="annees_commune")
+
+def _fetch_commune_annee(commune, annee, departement, modules=MODULES):
+    """Indicateurs d'une année pour tous les modules, en une seule requête.
+
+    Retourne {module: DataFrame ou None}, ou None si la requête a échoué
+    (rien n'est alors mis en cache).
+    """
+    variants = get_app_fetcher().find_commune_variants(commune, departement)
+    api_url = get_api_url_for_year(annee)
+    colonnes = select_for(*modules).split(",")
+    erreur = False
+
+    for variant in variants:
+        dept = variant["departement"] if not departement else departement
+        where_clause = f'an="{annee}" AND inom="{variant["nom"]}"'
+        if dept:
+            where_clause += f' AND dep="{dept}"'
+
+        params = {"where": where_clause, "limit": 100, "select": ",".join(colonnes)}
+        try:
+            data = api_get_json(api_url, params, module="commune")
+        except requests.RequestException:
+            erreur = True
+            continue
+        if "results" not in data or not data["results"]:
+            continue
+
+        brut = records_to_frame(data["results"], colonnes)
+        return {module: build_indicateurs(module, brut) for module in modules}
+
+    return None if erreur else dict.fromkeys(modules)
+
+def fetch_commune_annee(commune, annee, departement, modules=MODULES):
+    """Tableaux d'une année par module, en cache par (commune, département, année)"""
+    commune, departement = cle = cle_commune(commune, departement)
+    cle += (int(annee), tuple(modules))
+    tableaux = _annees_commune_cache.get(cle)
+    if tableaux is None:
+        tableaux = _fetch_commune_annee(commune, int(annee), departement, modules)
+        if tableaux is None:
+            return dict.fromkeys(modules)
+        _annees_commune_cache.set(cle, tableaux)
+    return tableaux
+
+def commune_request_budget(commune, annees):
+    """Budget de requêtes HTTP du chargement complet d'une commune.
+
+    Une recherche de variantes par dataset et par terme, puis une requête par
+    année (les six modules ensemble). Le dépasser signale une régression
+    (variantes en échec, requêtes répétées...).
+    """
+    nb_termes = len(get_app_fetcher()._generate_search_terms(commune))
+    return len(set(DATASETS_MAPPING.values())) * nb_termes + len(annees)
+
+def get_all_commune_data(commune, annees, departement):
+    """Récupère toutes les données financières pour une commune.
+
+    Assemblé année par année depuis le cache (commune, département, année) :
+    ajouter ou retirer une année à la sélection coûte au plus une requête.
+    Les tableaux retournés sont des copies complètes de ceux du cache : sans
+    copy-on-write (pandas < 3), une copie superficielle partagerait les valeurs
+    et une écriture via .loc / .iloc modifierait le cache.
+    """
+    cle = cle_commune(commune, departement, annees)
+    data = _donnees_commune_cache.get(cle)
+    if data is None:
+        data = _get_all_commune_data(*cle)
+        _donnees_commune_cache.set(cle, data)
+    return {module: df.copy() for module, df in data.items()}
+
+def _get_all_commune_data(commune, departement, annees):
+    par_module = {module: [] for module in MODULES}
+    with compter_requetes("commune") as compteur:
+        for annee in annees:
+            for module, df in fetch_commune_annee(commune, annee, departement).items():
+                if df is None:
+                    metrics.record_missing(module, annee)
+                    logger.warning("%s pour %s en %s", _MESSAGES_MANQUANTS[module], commune, annee)
+                else:
+                    par_module[module].append(df)
+
+    data = {}
+    for module, frames in par_module.items():
+        if not frames:
+            data[module] = pd.DataFrame()
+            continue
+        df = pd.concat(frames, ignore_index=True)
+        data[module] = df.sort_values("Année") if module in _MODULES_TRIES else df
+
+    budget = commune_request_budget(commune, annees)
+    if compteur.depasse(budget):
+        logger.warning("Chargement de %s : %d requêtes HTTP pour un budget de %d (%s)",
+                       commune, compteur.requetes, budget, dict(compteur.par_module))
+    return data
+
+# ==============================================================
+# FLUX PAGINÉ (DÉPARTEMENT, STRATE...)
+# ==============================================================
+
+# Limites de l'endpoint /records : 100 lignes par page, offset + limit <= 10 000
+RECORDS_PAGE_SIZE = 100
+RECORDS_WINDOW = 10_000
+# Pages demandées en avance sur le consommateur (et requêtes simultanées)
+PREFETCH_PAGES = 4
+
+def get_exports_url_for_dataset(dataset, format="jsonl"):
+    """Retourne l'URL d'export complet d'un dataset"""
+    return f"{API_BASE_URL}/catalog/datasets/{dataset}/exports/{format}"
+
+def iter_record_pages(dataset, where, select=None, page_size=RECORDS_PAGE_SIZE,
+                      prefetch=PREFETCH_PAGES, module="flux"):
+    """Itère sur toutes les lignes d'une requête, par pages (listes de records).
+
+    La première page donne `total_count`. Les suivantes sont demandées par
+    offset, en parallèle, au plus `prefetch` pages en avance sur le
+    consommateur : un consommateur lent ne fait pas gonfler la mémoire.
+    Les pages sortent dans l'ordre. Au-delà de la fenêtre de 10 000 lignes
+    de /records, le résultat est lu en flux sur /exports/jsonl.
+    """
+    api_url = get_api_url_for_dataset(dataset)
+    params = {"where": where, "limit": page_size, "offset": 0}
+    if select:
+        params["select"] = select
+
+    premiere = api_get_json(api_url, params, module=module)
+    if "results" not in premiere:
+        raise requests.RequestException(f"Réponse sans résultats : {premiere.get('message', premiere)}")
+    total = premiere.get("total_count", len(premiere["results"]))
+
+    if total > RECORDS_WINDOW:
+        yield from _iter_export_pages(dataset, where, select, page_size, module)
+        return
+
+    if premiere["results"]:
+        yield premiere["results"]
+
+    offsets = iter(range(page_size, total, page_size))
+    pool = ThreadPoolExecutor(max_workers=max(1, prefetch), thread_name_prefix="focus-pages")
+    en_vol = deque()
+
+    def soumettre():
+        offset = next(offsets, None)
+        if offset is not None:
+            # Copie du contexte : les compteurs de requêtes actifs suivent le thread
+            contexte = contextvars.copy_context()
+            en_vol.append(pool.submit(contexte.run, api_get_json, api_url, dict(params, offset=offset), module=module))
+
+    try:
+        for _ in range(max(1, prefetch)):
+            soumettre()
+        while en_vol:
+            page = en_vol.popleft().result().get("results") or []
+            soumettre()
+            if page:
+                yield page
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _iter_export_pages(dataset, where, select, page_size, module):
+    """Lecture en flux de /exports/jsonl, regroupée en pages de `page_size` lignes"""
+    url = get_exports_url_for_dataset(dataset, "jsonl")
+    params = {"where": where}
+    if select:
+        params["select"] = select
+    labels = labels_for_request(url, params, module=module)
+
+    debut = time.perf_counter()
+    octets = 0
+    page = []
+    try:
+        with requests.get(url, params=params, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            for ligne in response.iter_lines():
+                if not ligne:
                     continue
-                    
-                df_fr = df[colonnes_existantes].copy()
-
-                # Renommage pour lisibilité (selon votre version app.py)
-                df_fr.rename(columns={
-                    'an': 'Année',
-                    'ffdr': 'FDR / hab Commune',
-                    'mfdr': 'FDR / hab Moyenne',
-                    'fcharge': 'Charges fonct / hab Commune',
-                    'mcharge': 'Charges fonct / hab Moyenne'
-                }, inplace=True)
-
-                # Calcul fonds de roulement en jours de charges (selon votre version app.py)
-                df_fr['FDR en jours DRF Commune'] = (
-                    df_fr['FDR / hab Commune'] / df_fr['Charges fonct / hab Commune'].replace(0, pd.NA) * 365
-                ).round(2)
-                df_fr['FDR en jours DRF Moyenne'] = (
-                    df_fr['FDR / hab Moyenne'] / df_fr['Charges fonct / hab Moyenne'].replace(0, pd.NA) * 365
-                ).round(2)
-
-                # Suppression colonnes intermédiaires (selon votre version app.py)
-                columns_to_drop = ['Charges fonct / hab Commune', 'Charges fonct / hab Moyenne']
-                df_fr.drop(columns=columns_to_drop, inplace=True)
-                
-                df_list.append(df_fr)
-                annee_trouvee = True
-                break
-                
-            except requests.RequestException:
-                continue
-        
-        if not annee_trouvee:
-            print(f"WARN: FDR non trouvé pour {commune} en {annee}")
-    
-    if df_list:
-        return pd.concat(df_list, ignore_index=True)
-    return pd.DataFrame()
\ No newline at end of file
+                octets += len(ligne) + 1
+                page.append(decode_json(ligne))
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+        if page:
+            yield page
+    except Exception:
+        metrics.record_request(labels, time.perf_counter() - debut, payload_bytes=octets, error=True)
+        raise
+    finally:
+        _compter(labels, 1, octets)
+    metrics.record_request(labels, time.perf_counter() - debut, payload_bytes=octets)
+
+def datasets_for_years(annees):
+    """Regroupe les années par dataset : {dataset: [années]}"""
+    groupes = {}
+    for annee in sorted(annees):
+        groupes.setdefault(get_dataset_for_year(annee), []).append(annee)
+    return groupes
+
+# Lignes accumulées avant chaque calcul d'indicateurs (le coût fixe pandas
+# d'un calcul par page de 100 lignes dominerait le temps total)
+LOT_INDICATEURS = 5_000
+
+def iter_indicateurs(where, annees, modules=MODULES, page_size=RECORDS_PAGE_SIZE,
+                     prefetch=PREFETCH_PAGES, lot=LOT_INDICATEURS):
+    """Flux de lots {module: DataFrame} pour toutes les communes répondant à `where`.
+
+    Une requête paginée par dataset ; les pages reçues sont regroupées par
+    lots d'environ `lot` lignes, convertis puis passés aux calculs vectorisés
+    d'indicateurs. La mémoire reste bornée par la taille d'un lot.
+    """
+    select = ",".join(list(IDENTIFIANTS) + select_for(*modules).split(","))
+
+    def calculer(lignes):
+        frame = records_to_frame(lignes)
+        return {module: build_indicateurs(module, frame, identifiants=True) for module in modules}
+
+    for dataset, annees_dataset in datasets_for_years(annees).items():
+        annees_in = ",".join(f'"{a}"' for a in annees_dataset)
+        clause = f'({where}) AND an IN ({annees_in})'
+        lignes = []
+        for page in iter_record_pages(dataset, clause, select=select, page_size=page_size,
+                                      prefetch=prefetch, module="flux"):
+            lignes.extend(page)
+            if len(lignes) >= lot:
+                yield calculer(lignes)
+                lignes = []
+        if lignes:
+            yield calculer(lignes)
+
+def fetch_indicateurs(where, annees, modules=MODULES, **kwargs):
+    """Indicateurs de toutes les communes répondant à `where`, un tableau par module"""
+    lots = {module: [] for module in modules}
+    for lot in iter_indicateurs(where, annees, modules, **kwargs):
+        for module, df in lot.items():
+            if df is not None:
+                lots[module].append(df)
+    return {
+        module: pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+        for module, dfs in lots.items()
+    }
+
+def fetch_departement(departement, annees, modules=MODULES, **kwargs):
+    """Indicateurs de toutes les communes d'un département"""
+    return fetch_indicateurs(f'dep="{code_departement(departement)}"', annees, modules, **kwargs)
+
+def where_communes(communes):
+    """Clause `where` pour une liste de (nom, département), département facultatif"""
+    clauses = []
+    for nom, departement in communes:
+        nom, departement = cle_commune(nom, departement)
+        clause = f'inom="{nom}"'
+        if departement:
+            clause += f' AND dep="{departement}"'
+        clauses.append(f"({clause})")
+    return " OR ".join(clauses)
+
+def resoudre_communes(communes):
+    """(nom, département) saisis -> {(nom dans l'API, département): nom saisi}.
+
+    Chaque nom passe par la recherche de variantes (« LA ROCHELLE » /
+    « ROCHELLE (LA) »...), en parallèle : la clause exacte `inom="..."` ne
+    manque plus une commune écrite autrement dans un dataset. Le département
+    saisi (éventuellement vide) est conservé.
+    """
+    communes = [cle_commune(nom, departement) for nom, departement in communes]
+    fetcher = get_app_fetcher()
+    with ThreadPoolExecutor(max_workers=PREFETCH_PAGES, thread_name_prefix="focus-variantes") as pool:
+        # Copie du contexte : les compteurs de requêtes actifs suivent le thread
+        variantes = [pool.submit(contextvars.copy_context().run, fetcher.find_commune_variants, nom, departement)
+                     for nom, departement in communes]
+        resolues = {}
+        for (nom, departement), future in zip(communes, variantes):
+            for variante in future.result():
+                resolues.setdefault(cle_commune(variante["nom"], departement), nom)
+    return resolues
+
+def fetch_communes(communes, annees, modules=MODULES, **kwargs):
+    """Indicateurs de plusieurs communes en une requête par dataset (et non par commune et par année).
+
+    Les noms sont résolus en leurs variantes (resoudre_communes) ; les lignes
+    reviennent sous le nom saisi.
+    """
+    resolues = resoudre_communes(communes)
+    data = fetch_indicateurs(where_communes(resolues), annees, modules, **kwargs)
+    noms = {variante: nom for (variante, _), nom in resolues.items()}
+    for df in data.values():
+        if not df.empty:
+            df["Commune"] = df["Commune"].replace(noms)
+    return data
+
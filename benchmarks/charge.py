@@ -0,0 +1,302 @@
+# charge.py - Test de charge : sessions Streamlit concurrentes contre l'API locale
+#
+# N utilisateurs simulés (streamlit AppTest, un thread chacun, même processus et
+# donc mêmes caches qu'un serveur) ouvrent l'accueil, choisissent une commune,
+# parcourent les pages d'analyse puis exportent le rapport PDF. Rapport :
+# latence des reruns (p50 / p95 / p99), dont la navigation d'une session pendant
+# l'export PDF d'une autre, mémoire par session et débit des exports.
+#
+#   python local_api.py --port 8766 &                       # ou l'API démarrée par le script (--panel-dir)
+#   python benchmarks/charge.py --sessions 20 --api-url http://127.0.0.1:8766/api/explore/v2.1
+#   python benchmarks/charge.py --sessions 8 --communes top_communes.txt --json charge.json
+#   python benchmarks/charge.py --sessions 8 --max-p95-pendant-export 2000   # code retour 1 au-delà
+import argparse
+import contextlib
+import gc
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+PROD = os.path.join(RACINE, "prod.py")
+
+# Pages d'analyse, dans l'ordre de la navigation de prod.py
+PAGES = ["Fonctionnement", "CAF", "Fiscalité", "Endettement", "Investissement", "Fonds de roulement"]
+
+BOUTON_PDF = "📄 Rapport PDF"
+
+SESSIONS = 8
+# Délai maximal d'un rerun (un export PDF à froid sous charge compris)
+TIMEOUT = 600
+QUANTILES = (50, 95, 99)
+
+def rss_octets():
+    """Mémoire résidente du processus (Linux : /proc ; ailleurs : pic via resource)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pic if sys.platform == "darwin" else pic * 1024
+
+class Journal:
+    """Reruns mesurés, toutes sessions confondues"""
+
+    def __init__(self):
+        self.reruns = []
+        self._lock = threading.Lock()
+
+    def rerun(self, session, type_, etape, action, succes=None):
+        """Exécute `action` (un `.run()` d'AppTest) et note sa durée ; retourne l'AppTest, ou None en cas d'échec"""
+        debut = time.perf_counter()
+        at = None
+        try:
+            at = action()
+            if at.exception:
+                erreur = at.exception[0].message
+            elif succes is not None and not succes(at):
+                erreur = "; ".join(e.value for e in at.error) or f"{etape} : résultat attendu absent"
+            else:
+                erreur = None
+        except Exception as e:
+            # Délai du script dépassé, élément introuvable
+            erreur = f"{type(e).__name__} : {e}"
+        with self._lock:
+            self.reruns.append({
+                "session": session, "type": type_, "etape": etape,
+                "debut": debut, "fin": time.perf_counter(), "erreur": erreur,
+            })
+        return None if erreur else at
+
+@contextlib.contextmanager
+def runtime_partage():
+    """Runtime Streamlit visible de toutes les sessions pendant le test de charge.
+
+    AppTest installe un Runtime factice au début de chaque rerun et le retire
+    (`Runtime._instance = None`) à la fin : un rerun concurrent d'une autre
+    session perdait alors le sien en cours de route (« Runtime hasn't been
+    created! », éléments absents). Le dernier Runtime installé reste servi.
+    """
+    from unittest import mock
+
+    from streamlit.runtime.runtime import Runtime
+
+    dernier = []
+
+    def instance():
+        if Runtime._instance is not None:
+            dernier[:] = [Runtime._instance]
+        if not dernier:
+            raise RuntimeError("Runtime hasn't been created!")
+        return dernier[0]
+
+    def existe():
+        return Runtime._instance is not None or bool(dernier)
+
+    with mock.patch.object(Runtime, "instance", staticmethod(instance)), \
+         mock.patch.object(Runtime, "exists", staticmethod(existe)):
+        yield
+
+def simuler_session(journal, numero, commune, departement=None, pages=PAGES, export=True, timeout=TIMEOUT):
+    """Un utilisateur : accueil, choix de la commune, pages d'analyse, export PDF -> AppTest"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(PROD, default_timeout=timeout)
+    if journal.rerun(numero, "accueil", "Accueil", at.run) is None:
+        return at
+
+    if journal.rerun(numero, "commune", commune, lambda: at.text_input[0].input(commune).run()) is None:
+        return at
+    homonymes = [s for s in at.selectbox if s.label == "Choisissez la commune :"]
+    if homonymes and departement:
+        option = next((o for o in homonymes[0].options if f"Dépt {departement} " in o), None)
+        if option is not None and journal.rerun(numero, "commune", commune,
+                                                lambda: homonymes[0].select(option).run()) is None:
+            return at
+
+    for page in pages:
+        if journal.rerun(numero, "navigation", page, lambda: at.sidebar.selectbox[0].select(page).run()) is None:
+            return at
+
+    if export:
+        if pages and journal.rerun(numero, "navigation", "Accueil",
+                                   lambda: at.sidebar.selectbox[0].select("Accueil").run()) is None:
+            return at
+        journal.rerun(
+            numero, "export", "PDF",
+            lambda: next(b for b in at.button if b.label == BOUTON_PDF).click().run(),
+            succes=lambda at: any("PDF généré" in s.value for s in at.success),
+        )
+    return at
+
+def centiles(durees):
+    """{"n", "p50", "p95", "p99"} en millisecondes"""
+    if not durees:
+        return {"n": 0}
+    ms = np.asarray(durees) * 1000
+    return {"n": len(durees), **{f"p{q}": round(float(np.percentile(ms, q)), 1) for q in QUANTILES}}
+
+def analyser(reruns):
+    """Latences par type de rerun, navigation pendant un export d'une autre session, débit des exports"""
+    reussis = [r for r in reruns if r["erreur"] is None]
+    exports = [r for r in reussis if r["type"] == "export"]
+
+    def pendant_un_export(r):
+        return any(e["session"] != r["session"] and e["debut"] < r["fin"] and r["debut"] < e["fin"] for e in exports)
+
+    latences = {}
+    for type_ in ("accueil", "commune", "navigation", "export"):
+        latences[type_] = centiles([r["fin"] - r["debut"] for r in reussis if r["type"] == type_])
+    latences["navigation pendant un export"] = centiles([
+        r["fin"] - r["debut"] for r in reussis if r["type"] == "navigation" and pendant_un_export(r)
+    ])
+
+    debit = {"n": len(exports)}
+    if exports:
+        fenetre = max(e["fin"] for e in exports) - min(e["debut"] for e in exports)
+        debit.update({
+            "fenêtre (s)": round(fenetre, 2),
+            "par minute": round(len(exports) / fenetre * 60, 2) if fenetre else None,
+            "médiane (s)": round(float(np.median([e["fin"] - e["debut"] for e in exports])), 2),
+        })
+    return latences, debit
+
+def lancer(communes, sessions=SESSIONS, pages=PAGES, export=True, rampe=0.0, timeout=TIMEOUT, suivre_allocations=False):
+    """Lance `sessions` utilisateurs simulés (communes attribuées à tour de rôle) -> rapport"""
+    # Streamlit et les modules de tête de prod.py sont chargés hors mesure
+    import streamlit.testing.v1  # noqa: F401
+    import app_fetchers  # noqa: F401
+
+    journal = Journal()
+    gc.collect()
+    if suivre_allocations:
+        tracemalloc.start()
+    rss_avant = rss_octets()
+
+    def utilisateur(numero):
+        time.sleep(rampe * numero / sessions)
+        commune, departement = communes[numero % len(communes)]
+        return simuler_session(journal, numero, commune, departement, pages, export, timeout)
+
+    debut = time.perf_counter()
+    with runtime_partage(), ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="session") as executor:
+        # Les AppTest restent référencés jusqu'à la mesure mémoire
+        apps = list(executor.map(utilisateur, range(sessions)))
+    duree = time.perf_counter() - debut
+
+    gc.collect()
+    rss = rss_octets() - rss_avant
+    memoire = {
+        "rss total (Mo)": round(rss / 2**20, 1),
+        "rss par session (Mo)": round(rss / sessions / 2**20, 2),
+    }
+    if suivre_allocations:
+        courant, pic = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memoire["alloué par session (Mo)"] = round(courant / sessions / 2**20, 2)
+        memoire["pic alloué (Mo)"] = round(pic / 2**20, 1)
+    del apps
+
+    latences, exports = analyser(journal.reruns)
+    return {
+        "sessions": sessions,
+        "communes": len(communes),
+        "durée (s)": round(duree, 2),
+        "latences (ms)": latences,
+        "mémoire": memoire,
+        "exports PDF": exports,
+        "erreurs": [f"session {r['session']}, {r['etape']} : {r['erreur']}" for r in journal.reruns if r["erreur"]],
+    }
+
+def afficher(rapport, sortie=sys.stdout):
+    print(f"{rapport['sessions']} sessions, {rapport['communes']} communes, {rapport['durée (s)']} s", file=sortie)
+    print(f"{'rerun':<30}{'n':>5}" + "".join(f"{f'p{q} (ms)':>12}" for q in QUANTILES), file=sortie)
+    for type_, mesure in rapport["latences (ms)"].items():
+        print(f"{type_:<30}{mesure['n']:>5}" + "".join(f"{mesure.get(f'p{q}', '-'):>12}" for q in QUANTILES), file=sortie)
+    print("Mémoire : " + ", ".join(f"{k} {v}" for k, v in rapport["mémoire"].items()), file=sortie)
+    print("Exports PDF : " + ", ".join(f"{k} {v}" for k, v in rapport["exports PDF"].items()), file=sortie)
+    for erreur in rapport["erreurs"]:
+        print(f"❌ {erreur}", file=sortie)
+
+def communes_du_panel(api, n, annee=2024, graine=0):
+    """n communes tirées au hasard dans le panel local -> [(nom, département)]"""
+    from app_fetchers import get_dataset_for_year
+    from cles import cle_commune
+
+    df = api.table(get_dataset_for_year(annee)).df
+    df = df[df["an"].astype(str) == str(annee)].drop_duplicates(["inom", "dep"])
+    echantillon = df.sample(min(n, len(df)), random_state=graine)
+    return [cle_commune(nom, dep) for nom, dep in zip(echantillon["inom"], echantillon["dep"])]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge : sessions Streamlit concurrentes contre l'API locale")
+    parser.add_argument("--sessions", type=int, default=SESSIONS)
+    parser.add_argument("--communes", help="Fichier des communes (« NOM » ou « NOM;département » par ligne) ; "
+                                           "défaut : tirage dans le panel")
+    parser.add_argument("--pages", nargs="*", default=PAGES, help="Pages parcourues par chaque session")
+    parser.add_argument("--sans-export", action="store_true", help="Pas d'export PDF en fin de session")
+    parser.add_argument("--rampe", type=float, default=0.0, help="Secondes pour démarrer toutes les sessions")
+    parser.add_argument("--api-url", help="API locale déjà lancée (défaut : démarrée ici sur --panel-dir)")
+    parser.add_argument("--panel-dir", help="Panel Parquet servi par l'API locale (défaut : data/panel)")
+    parser.add_argument("--sans-prechargement", action="store_true", help="FOCUS_PRECHARGEMENT=0")
+    parser.add_argument("--tracemalloc", action="store_true", help="Mesure aussi les allocations Python (plus lent)")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT)
+    parser.add_argument("--json", help="Écrit le rapport dans ce fichier")
+    parser.add_argument("--max-p95-pendant-export", type=float, metavar="MS",
+                        help="Code retour 1 si la navigation pendant un export dépasse ce p95")
+    args = parser.parse_args(argv)
+
+    import streamlit.logger
+
+    import app_fetchers
+    from local_api import LocalAPI, LocalAPIServer
+
+    # Avertissements de dépréciation répétés à chaque rerun de chaque session
+    streamlit.logger.set_log_level("error")
+    if args.sans_prechargement:
+        os.environ["FOCUS_PRECHARGEMENT"] = "0"
+
+    api = LocalAPI(args.panel_dir)
+    serveur = None
+    if args.api_url:
+        app_fetchers.API_BASE_URL = args.api_url
+    else:
+        serveur = LocalAPIServer(api).start()
+        app_fetchers.API_BASE_URL = serveur.base_url
+
+    try:
+        if args.communes:
+            from warmup import lire_communes
+            with open(args.communes, encoding="utf-8") as f:
+                communes = lire_communes(f)
+        else:
+            communes = communes_du_panel(api, args.sessions)
+        rapport = lancer(communes, args.sessions, args.pages, not args.sans_export, args.rampe, args.timeout,
+                         args.tracemalloc)
+    finally:
+        if serveur is not None:
+            serveur.stop()
+
+    afficher(rapport)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rapport, f, ensure_ascii=False, indent=2)
+
+    p95 = rapport["latences (ms)"]["navigation pendant un export"].get("p95")
+    if args.max_p95_pendant_export is not None and p95 is not None and p95 > args.max_p95_pendant_export:
+        print(f"❌ navigation pendant un export : p95 {p95} ms > {args.max_p95_pendant_export} ms")
+        return 1
+    return 1 if rapport["erreurs"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
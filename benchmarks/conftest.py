@@ -0,0 +1,117 @@
+# conftest.py - Fixtures des benchmarks : serveur /records local et caches à froid
+#
+#   python -m pytest benchmarks --benchmark-only
+#   FOCUS_BENCH_LATENCY=0,0.05 python -m pytest benchmarks   # latences simulées (s)
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+from mock_api import ReplayServer  # noqa: E402
+
+# Latences réseau simulées par requête, en secondes
+LATENCES = [float(x) for x in os.environ.get("FOCUS_BENCH_LATENCY", "0,0.02").split(",") if x.strip()]
+
+@pytest.fixture(scope="session")
+def mock_server():
+    import app_fetchers
+
+    with ReplayServer() as server:
+        url_precedente = app_fetchers.API_BASE_URL
+        app_fetchers.API_BASE_URL = server.base_url
+        try:
+            yield server
+        finally:
+            app_fetchers.API_BASE_URL = url_precedente
+
+@pytest.fixture(params=LATENCES, ids=lambda l: f"latence={l * 1000:g}ms")
+def mock_api(request, mock_server):
+    """Serveur local avec la latence du paramètre ; échoue si une requête n'est pas dans la cassette"""
+    mock_server.latency = request.param
+    mock_server.reset_counters()
+    yield mock_server
+    mock_server.latency = 0.0
+    assert not mock_server.misses, f"Requêtes absentes de la cassette : {mock_server.misses[:3]}"
+
+@pytest.fixture
+def cold_caches():
+    """Vide tous les caches applicatifs, pour mesurer le chemin complet à chaque tour"""
+    import streamlit as st
+    from caches import reset_caches
+
+    def vider():
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        reset_caches()
+
+    vider()
+    return vider
+
+@pytest.fixture
+def bench_cold(benchmark, mock_api, cold_caches):
+    """Mesure une fonction caches vidés avant chaque tour.
+
+    Le nombre de requêtes HTTP du dernier tour est noté dans `extra_info` et,
+    si `budget` est donné, ne doit pas le dépasser.
+    """
+    from app_fetchers import compter_requetes
+
+    def mesurer(fn, *args, rounds=3, budget=None):
+        compteurs = []
+
+        def setup():
+            cold_caches()
+            mock_api.reset_counters()
+
+        def appel(*a):
+            with compter_requetes(getattr(fn, "__name__", None)) as compteur:
+                result = fn(*a)
+            compteurs.append(compteur)
+            return result
+
+        result = benchmark.pedantic(appel, args=args, setup=setup, rounds=rounds, iterations=1)
+        compteur = compteurs[-1]
+        benchmark.extra_info["requetes_http"] = compteur.requetes
+        benchmark.extra_info["octets"] = compteur.octets
+        benchmark.extra_info["requetes_par_dataset"] = dict(compteur.par_dataset)
+        assert compteur.requetes == len(mock_api.requests)
+        if budget is not None:
+            assert not compteur.depasse(budget), f"{compteur.requetes} requêtes pour un budget de {budget}"
+        return result
+
+    return mesurer
+
+@pytest.fixture(scope="session")
+def panel_dir(tmp_path_factory):
+    """Panel local (un Parquet par année) construit à partir des lignes de la cassette"""
+    import pandas as pd
+    from make_cassette import generer_lignes
+
+    dossier = tmp_path_factory.mktemp("panel")
+    df = pd.DataFrame(generer_lignes())
+    for annee, lignes in df.groupby("an"):
+        lignes.to_parquet(os.path.join(dossier, f"{annee}.parquet"), index=False)
+    return str(dossier)
+
+@pytest.fixture(scope="session")
+def local_api(panel_dir):
+    from local_api import LocalAPI
+
+    return LocalAPI(panel_dir)
+
+@pytest.fixture
+def serveur_local(local_api, cold_caches):
+    """API locale sur le panel de test, caches vidés ; l'application la vise pendant le test"""
+    import app_fetchers
+    from local_api import LocalAPIServer
+
+    with LocalAPIServer(local_api) as serveur:
+        url_precedente = app_fetchers.API_BASE_URL
+        app_fetchers.API_BASE_URL = serveur.base_url
+        try:
+            yield serveur
+        finally:
+            app_fetchers.API_BASE_URL = url_precedente
@@ -0,0 +1,114 @@
+# importtime.py - Temps d'import (python -X importtime) du démarrage de prod.py et des pages
+#
+# Chaque cible est mesurée dans un interpréteur neuf, après les imports de tête
+# de prod.py : le temps noté est donc le surcoût propre à la page ou à l'export.
+#
+#   python benchmarks/importtime.py            # tableau des temps (ms) et piles lourdes chargées
+#   python benchmarks/importtime.py --save     # met à jour importtime_baseline.json
+#   python benchmarks/importtime.py --check    # code retour 1 si une cible régresse
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "importtime_baseline.json")
+
+# Imports de tête de prod.py, payés à chaque démarrage
+DEMARRAGE = ["streamlit", "app_fetchers", "profiling"]
+
+CIBLES = [
+    "pages.fonctionnement", "pages.caf", "pages.fiscalite", "pages.endettements",
+    "pages.investissements", "pages.fdr", "pages.comparaison", "pages.similaires",
+    "pages.departement", "pages.diagnostic", "reports", "panel_store", "score_sante",
+]
+
+# Piles qui ne doivent pas être chargées au démarrage
+LOURDS = ["matplotlib", "seaborn", "reportlab", "kaleido", "openpyxl", "plotly.express"]
+
+# Régression : plus de TOLERANCE x la référence et plus de MARGE_MS de plus
+TOLERANCE = 1.5
+MARGE_MS = 50
+
+_LIGNE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def _lancer(code):
+    env = dict(os.environ, MPLBACKEND="Agg", PYTHONDONTWRITEBYTECODE="1")
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=RACINE, env=env,
+                          capture_output=True, text=True, check=True)
+
+def mesurer(module=None, repetitions=3, agregat=statistics.median):
+    """Temps cumulé (ms) de l'import de `module` après le démarrage ; sans module, le démarrage seul.
+
+    Renvoie (agrégat des temps, médiane par défaut ; piles lourdes présentes dans sys.modules).
+    """
+    a_mesurer = [module] if module else DEMARRAGE
+    code = f"import {', '.join(DEMARRAGE)}" if module else ""
+    code += f"\nimport {', '.join(a_mesurer)}\nimport sys\nprint(','.join(m for m in {LOURDS!r} if m in sys.modules))"
+
+    temps = []
+    for _ in range(repetitions):
+        resultat = _lancer(code)
+        total = 0
+        for ligne in resultat.stderr.splitlines():
+            match = _LIGNE_RE.match(ligne)
+            # Lignes de premier niveau uniquement : les imports imbriqués sont déjà dans le cumul
+            if match and len(match.group(3)) == 1 and match.group(4) in a_mesurer:
+                total += int(match.group(2))
+        temps.append(total / 1000)
+    lourds = [m for m in resultat.stdout.strip().split(",") if m]
+    return agregat(temps), lourds
+
+def mesurer_tout(cibles=CIBLES, repetitions=3):
+    mesures = {"démarrage": mesurer(repetitions=repetitions)}
+    for cible in cibles:
+        mesures[cible] = mesurer(cible, repetitions=repetitions)
+    return mesures
+
+def charger_reference(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def regressions(mesures, reference):
+    """Cibles plus lentes que la référence au-delà de la tolérance"""
+    lentes = {}
+    for cible, (ms, _) in mesures.items():
+        avant = reference.get(cible)
+        if avant is not None and ms > avant * TOLERANCE and ms - avant > MARGE_MS:
+            lentes[cible] = (avant, ms)
+    return lentes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Temps d'import du démarrage et des pages")
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--save", action="store_true", help="Enregistre les mesures comme référence")
+    parser.add_argument("--check", action="store_true", help="Compare à la référence enregistrée")
+    args = parser.parse_args(argv)
+
+    mesures = mesurer_tout(repetitions=args.repetitions)
+    reference = charger_reference()
+    for cible, (ms, lourds) in mesures.items():
+        avant = reference.get(cible)
+        comparaison = f" (réf. {avant:.0f} ms)" if avant is not None else ""
+        print(f"{cible:24s} {ms:8.0f} ms{comparaison}  {', '.join(lourds)}")
+
+    if args.save:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({cible: round(ms) for cible, (ms, _) in mesures.items()}, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Référence écrite : {BASELINE_PATH}")
+
+    if args.check:
+        lentes = regressions(mesures, reference)
+        for cible, (avant, ms) in lentes.items():
+            print(f"❌ {cible} : {avant:.0f} ms -> {ms:.0f} ms", file=sys.stderr)
+        return 1 if lentes else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# make_cassette.py - Génère la cassette synthétique des benchmarks (fixtures/records.jsonl)
+#
+# Les valeurs sont fictives mais la forme est celle des datasets DGFiP : ~180
+# champs par ligne (total, /hab, moyenne de strate, ratio pour chaque agrégat),
+# de sorte que le volume décodé reste représentatif. Les clés `where` reprennent
+# exactement les requêtes émises par app_fetchers. Pour rejouer de vraies
+# réponses, utiliser plutôt `python benchmarks/mock_api.py serve --record`.
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_fetchers import DATASETS_MAPPING, AppRobustFetcher  # noqa: E402
+from mock_api import CASSETTE_PATH, save_interaction  # noqa: E402
+
+ANNEES = list(range(2019, 2025))
+
+# (nom, département, population 2019)
+COMMUNES = [
+    ("RENAGE", "038", 3800),
+    ("LA ROCHELLE", "017", 77000),
+]
+
+# Agrégats déclinés en total (k€), /hab (f), moyenne de strate (m) et ratio (r)
+AGREGATS = [
+    "prod", "charge", "perso", "achat", "fin", "cont", "subv", "impo1", "impo2",
+    "dgf", "tp", "tascom", "resinv", "recinv", "depinv", "emp", "remb", "equip",
+    "caf", "cafn", "dette", "det2cal", "fdr", "annu", "avance", "fctva", "tfb_bases",
+    "tfnb_bases", "th_bases", "cvae", "ifer", "tafnb", "dotation", "compensation",
+    "reversement", "opeinv", "subvrecu", "cessions", "rbtemp", "interet", "solde",
+    "excedent", "deficit", "bf", "creance",
+]
+
+# Quelques ordres de grandeur (€ / hab) pour que les ratios aient un sens
+NIVEAUX = {
+    "prod": 1100, "charge": 950, "perso": 520, "dgf": 160, "impo1": 480, "caf": 180,
+    "cafn": 90, "dette": 850, "det2cal": 850, "fdr": 300, "equip": 320,
+}
+
+def ligne_synthetique(rng, nom, dep, icom, annee, population):
+    """Un enregistrement fictif au format des datasets DGFiP"""
+    ligne = {"an": str(annee), "dep": dep, "icom": icom, "inom": nom, "pop1": population}
+    for agregat in AGREGATS:
+        niveau = NIVEAUX.get(agregat, rng.uniform(5, 400))
+        par_hab = round(niveau * rng.uniform(0.8, 1.2), 0)
+        moyenne = round(niveau * rng.uniform(0.9, 1.1), 0)
+        ligne[agregat] = round(par_hab * population / 1000, 0)
+        ligne[f"f{agregat}"] = par_hab
+        ligne[f"m{agregat}"] = moyenne
+        ligne[f"r{agregat}"] = round(rng.uniform(0, 100), 2)
+    for taxe in ("th", "fb", "fnb"):
+        ligne[f"t{taxe}"] = round(rng.uniform(5, 45), 2)
+        ligne[f"tm{taxe}"] = round(rng.uniform(5, 45), 2)
+    return ligne
+
+def generer_lignes(seed=2024):
+    rng = random.Random(seed)
+    lignes = []
+    for i, (nom, dep, population) in enumerate(COMMUNES):
+        icom = f"{i + 1:03d}"
+        for annee in ANNEES:
+            population = int(population * rng.uniform(0.99, 1.02))
+            lignes.append(ligne_synthetique(rng, nom, dep, icom, annee, population))
+    return lignes
+
+def generer_cassette(path=CASSETTE_PATH):
+    if os.path.exists(path):
+        os.remove(path)
+
+    lignes = generer_lignes()
+    fetcher = AppRobustFetcher()
+    annees_in = ",".join(f'"{a}"' for a in ANNEES)
+
+    for nom, dep, _ in COMMUNES:
+        de_la_commune = [l for l in lignes if l["inom"] == nom and l["dep"] == dep]
+
+        # find_commune_variants : un LIKE par dataset et par terme de recherche
+        for dataset in sorted(set(DATASETS_MAPPING.values())):
+            annees_dataset = {str(a) for a, d in DATASETS_MAPPING.items() if d == dataset}
+            for term in fetcher._generate_search_terms(nom):
+                where = f'inom LIKE "%{term}%" AND dep="{dep}" AND an IN ({annees_in})'
+                resultats = [l for l in de_la_commune if l["an"] in annees_dataset and term in l["inom"]]
+                save_interaction(path, dataset, where, resultats)
+
+        # fetch_commune_* : une requête par année (identique pour les six modules)
+        for annee in ANNEES:
+            where = f'an="{annee}" AND inom="{nom}" AND dep="{dep}"'
+            resultats = [l for l in de_la_commune if l["an"] == str(annee)]
+            save_interaction(path, DATASETS_MAPPING[annee], where, resultats)
+
+        # search_commune (année de référence 2024)
+        where = f'an="2024" AND inom="{nom}"'
+        save_interaction(path, DATASETS_MAPPING[2024], where,
+                         [l for l in lignes if l["inom"] == nom and l["an"] == "2024"])
+
+if __name__ == "__main__":
+    generer_cassette()
+    print(f"Cassette écrite : {CASSETTE_PATH}")
@@ -0,0 +1,193 @@
+# mock_api.py - Serveur local rejouant des réponses /records enregistrées (cassette)
+#
+# Les réponses sont indexées par (dataset, where) ; `select`, `limit` et `offset`
+# sont appliqués au rejeu, ce qui permet d'enregistrer des lignes complètes une
+# fois et de les resservir quelle que soit la projection demandée par l'app.
+#
+# Usage :
+#   python benchmarks/mock_api.py serve            # rejeu sur http://127.0.0.1:8765
+#   python benchmarks/mock_api.py serve --record   # complète la cassette depuis l'API réelle
+#   FOCUS_API_BASE_URL=http://127.0.0.1:8765/api/explore/v2.1 streamlit run prod.py
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+BASE_PATH = "/api/explore/v2.1"
+UPSTREAM_URL = "https://data.economie.gouv.fr/api/explore/v2.1"
+CASSETTE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "records.jsonl")
+
+_RECORDS_RE = re.compile(r"^/api/explore/v2\.1/catalog/datasets/([^/]+)/records$")
+
+def normalize_where(where):
+    """Clé de rejeu : espaces multiples réduits, casse conservée"""
+    return re.sub(r"\s+", " ", (where or "").strip())
+
+def load_cassette(path=CASSETTE_PATH):
+    """Charge une cassette JSON Lines en dict {(dataset, where): [records]}"""
+    interactions = {}
+    if not os.path.exists(path):
+        return interactions
+    with open(path, encoding="utf-8") as f:
+        for ligne in f:
+            if ligne.strip():
+                entree = json.loads(ligne)
+                interactions[(entree["dataset"], normalize_where(entree["where"]))] = entree["results"]
+    return interactions
+
+def save_interaction(path, dataset, where, results):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"dataset": dataset, "where": where, "results": results}, ensure_ascii=False) + "\n")
+
+def project(results, select=None, limit=None, offset=0):
+    """Applique select / offset / limit à une liste de records"""
+    lignes = results[offset:]
+    if limit is not None:
+        lignes = lignes[:limit]
+    if select:
+        champs = [c.strip() for c in select.split(",") if c.strip()]
+        lignes = [{c: r.get(c) for c in champs} for r in lignes]
+    return lignes
+
+class ReplayServer:
+    """Serveur /records local ; latence artificielle réglable par requête"""
+
+    def __init__(self, cassette_path=CASSETTE_PATH, latency=0.0, host="127.0.0.1", port=0,
+                 record=False, upstream=UPSTREAM_URL):
+        self.cassette_path = cassette_path
+        self.interactions = load_cassette(cassette_path)
+        self.latency = latency
+        self.record = record
+        self.upstream = upstream.rstrip("/")
+        self.requests = []
+        self.misses = []
+        self.en_cours = 0
+        self.max_en_cours = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{BASE_PATH}"
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests.clear()
+            self.misses.clear()
+            self.max_en_cours = 0
+
+    def add_interaction(self, dataset, where, results):
+        """Ajoute une réponse en mémoire (sans l'écrire dans la cassette)"""
+        with self._lock:
+            self.interactions[(dataset, normalize_where(where))] = results
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def lookup(self, dataset, where):
+        key = (dataset, normalize_where(where))
+        results = self.interactions.get(key)
+        if results is None and self.record:
+            results = self._fetch_upstream(dataset, where)
+            with self._lock:
+                self.interactions[key] = results
+                save_interaction(self.cassette_path, dataset, where, results)
+        if results is None:
+            with self._lock:
+                self.misses.append(key)
+            return []
+        return results
+
+    def _fetch_upstream(self, dataset, where):
+        # Enregistre les lignes complètes (sans select), jusqu'à 100 par requête
+        url = f"{self.upstream}/catalog/datasets/{dataset}/records"
+        response = requests.get(url, params={"where": where, "limit": 100}, timeout=30)
+        response.raise_for_status()
+        return response.json().get("results", [])
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                match = _RECORDS_RE.match(url.path)
+                if not match:
+                    self.send_error(404)
+                    return
+
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                dataset = match.group(1)
+                with server._lock:
+                    server.requests.append((dataset, query))
+                    server.en_cours += 1
+                    server.max_en_cours = max(server.max_en_cours, server.en_cours)
+                try:
+                    if server.latency:
+                        time.sleep(server.latency)
+                    results = server.lookup(dataset, query.get("where", ""))
+                finally:
+                    with server._lock:
+                        server.en_cours -= 1
+
+                lignes = project(
+                    results,
+                    select=query.get("select"),
+                    limit=int(query.get("limit", 10)),
+                    offset=int(query.get("offset", 0)),
+                )
+                payload = json.dumps({"total_count": len(results), "results": lignes},
+                                     ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rejeu local de l'API /records (benchmarks, hors ligne)")
+    sub = parser.add_subparsers(dest="commande", required=True)
+
+    p_serve = sub.add_parser("serve", help="Sert la cassette en HTTP")
+    p_serve.add_argument("--port", type=int, default=8765)
+    p_serve.add_argument("--latency", type=float, default=0.0, help="Latence ajoutée par requête (s)")
+    p_serve.add_argument("--cassette", default=CASSETTE_PATH)
+    p_serve.add_argument("--record", action="store_true", help="Interroge l'API réelle pour les requêtes inconnues")
+
+    args = parser.parse_args(argv)
+    server = ReplayServer(args.cassette, latency=args.latency, port=args.port, record=args.record)
+    print(f"FOCUS_API_BASE_URL={server.base_url}")
+    try:
+        server.start()._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
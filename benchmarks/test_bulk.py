@@ -0,0 +1,143 @@
+# test_bulk.py - Flux paginé : toutes les communes d'un département
+import math
+import random
+
+import pytest
+
+import app_fetchers
+from make_cassette import ligne_synthetique
+
+DEPARTEMENT = "099"
+NB_COMMUNES = 700
+ANNEES = list(range(2019, 2025))
+
+@pytest.fixture(scope="module")
+def lignes():
+    """700 communes fictives sur six ans"""
+    rng = random.Random(700)
+    return [
+        ligne_synthetique(rng, f"COMMUNE {i:03d}", DEPARTEMENT, f"{i:03d}", annee, rng.randint(50, 50_000))
+        for i in range(NB_COMMUNES) for annee in ANNEES
+    ]
+
+@pytest.fixture(scope="module")
+def departement(mock_server, lignes):
+    """Le département entier servi en mémoire par le serveur local ; renvoie le nombre de pages"""
+    nb_pages = 0
+    for dataset, annees in app_fetchers.datasets_for_years(ANNEES).items():
+        annees_in = ",".join(f'"{a}"' for a in annees)
+        resultats = [l for l in lignes if int(l["an"]) in annees]
+        mock_server.add_interaction(dataset, f'(dep="{DEPARTEMENT}") AND an IN ({annees_in})', resultats)
+        nb_pages += math.ceil(len(resultats) / app_fetchers.RECORDS_PAGE_SIZE)
+    return nb_pages
+
+@pytest.mark.parametrize("prefetch", [1, 4])
+def test_fetch_departement(bench_cold, departement, prefetch):
+    data = bench_cold(lambda: app_fetchers.fetch_departement(DEPARTEMENT, ANNEES, prefetch=prefetch),
+                      budget=departement)
+    for module, df in data.items():
+        assert len(df) == NB_COMMUNES * len(ANNEES), module
+        assert df["Département"].eq(DEPARTEMENT).all()
+
+def test_prefetch_borne(mock_api, departement):
+    """Jamais plus de `prefetch` pages en vol, même si le consommateur traîne"""
+    mock_api.latency = 0.01
+    pages = app_fetchers.iter_record_pages(
+        app_fetchers.get_dataset_for_year(2021), f'(dep="{DEPARTEMENT}") AND an IN ("2021")',
+        select="inom,an", prefetch=3)
+    total = sum(len(page) for page in pages)
+    assert total == NB_COMMUNES
+    assert mock_api.max_en_cours <= 3
+
+def test_iter_indicateurs_arret_anticipe(mock_api, departement):
+    """Un consommateur qui s'arrête tôt ne déclenche pas la lecture du reste"""
+    lots = app_fetchers.iter_indicateurs(f'dep="{DEPARTEMENT}"', ANNEES, modules=["caf"], prefetch=2, lot=1)
+    premier = next(lots)
+    lots.close()
+    assert len(premier["caf"]) == app_fetchers.RECORDS_PAGE_SIZE
+    assert len(mock_api.requests) <= 1 + 2
+
+def test_tableau_departement(benchmark, mock_api, departement):
+    """Tableau de la page Département : fusion des six modules pour une année"""
+    from pages.departement import tableau_departement
+
+    data = app_fetchers.fetch_departement(DEPARTEMENT, ANNEES)
+    tableau = benchmark(tableau_departement, data, 2024)
+    assert len(tableau) == NB_COMMUNES
+    assert {"Population", "CAF brute / hab", "Dette / hab", "FDR en jours de DRF"} <= set(tableau.columns)
+
+@pytest.fixture(scope="module")
+def comparaison(mock_server, lignes):
+    """Dix communes du département servies par le serveur local ; renvoie [(nom, département)]"""
+    communes = [(f"COMMUNE {i:03d}", DEPARTEMENT) for i in range(0, NB_COMMUNES, 70)]
+    where = app_fetchers.where_communes(communes)
+    noms = {nom for nom, _ in communes}
+    toutes_annees = ",".join(f'"{a}"' for a in ANNEES)
+    for dataset, annees in app_fetchers.datasets_for_years(ANNEES).items():
+        annees_in = ",".join(f'"{a}"' for a in annees)
+        resultats = [l for l in lignes if l["inom"] in noms and int(l["an"]) in annees]
+        mock_server.add_interaction(dataset, f"({where}) AND an IN ({annees_in})", resultats)
+        # Recherche de variantes (resoudre_communes) : un LIKE par commune et par dataset
+        for nom in noms:
+            mock_server.add_interaction(dataset, f'inom LIKE "%{nom}%" AND dep="{DEPARTEMENT}" AND an IN ({toutes_annees})',
+                                        [l for l in resultats if l["inom"] == nom])
+    return communes
+
+def test_fetch_communes(bench_cold, comparaison):
+    """Comparaison : une requête par dataset quel que soit le nombre de communes (plus les variantes)"""
+    nb_variantes = len(comparaison) * len(set(app_fetchers.DATASETS_MAPPING.values()))
+    data = bench_cold(lambda: app_fetchers.fetch_communes(comparaison, ANNEES),
+                      budget=len(app_fetchers.datasets_for_years(ANNEES)) + nb_variantes)
+    for module, df in data.items():
+        assert len(df) == len(comparaison) * len(ANNEES), module
+
+@pytest.mark.parametrize("page", ["departement", "comparaison"])
+def test_cache_borne_des_pages(mock_api, cold_caches, departement, comparaison, page):
+    """Pages Département et Comparaison : cache en octets visible sur Diagnostic, copies modifiables"""
+    from caches import cache_stats
+    from pages.comparaison import charger_comparaison
+    from pages.departement import charger_departement
+
+    if page == "departement":
+        charger, argument, cache = charger_departement, DEPARTEMENT, "departements"
+    else:
+        charger, argument, cache = charger_comparaison, tuple(comparaison), "comparaisons"
+
+    data = charger(argument, tuple(ANNEES))
+    data["caf"].loc[:, "CAF brute / hab Commune"] = -1
+    with app_fetchers.compter_requetes() as compteur:
+        relu = charger(argument, tuple(ANNEES))
+    assert compteur.requetes == 0
+    assert not relu["caf"]["CAF brute / hab Commune"].eq(-1).any()
+
+    stats = {s["cache"]: s for s in cache_stats()}
+    assert stats[cache]["entrées"] == 1 and 0 < stats[cache]["octets"] <= stats[cache]["budget (octets)"]
+
+def test_export_panel_annees(panel_dir, monkeypatch):
+    """Aucune année sélectionnée : export vide ; None : toutes les années du stockage"""
+    import panel_store
+
+    monkeypatch.setattr(panel_store, "PANEL_DIR", panel_dir)
+    assert list(panel_store.iter_panel_batches(["pop1"], annees=[])) == []
+    lues = {a for batch in panel_store.iter_panel_batches(["pop1"]) for a in batch.column("an").to_pylist()}
+    assert sorted(int(a) for a in lues) == ANNEES
+
+def test_export_panel_plafonne(panel_dir, monkeypatch, tmp_path):
+    """Au-delà du plafond de l'application : rien d'écrit, la commande équivalente produit l'export"""
+    import io
+    import shlex
+    import panel_store
+
+    monkeypatch.setattr(panel_store, "PANEL_DIR", panel_dir)
+    complet = io.BytesIO()
+    taille = panel_store.write_panel_export(complet, ["pop1", "fcaf"], ANNEES[:2])
+    assert panel_store.write_panel_export(io.BytesIO(), ["pop1", "fcaf"], ANNEES[:2], max_octets=taille) == taille
+
+    plafonne = io.BytesIO()
+    assert panel_store.write_panel_export(plafonne, ["pop1", "fcaf"], ANNEES[:2], max_octets=taille - 1) is None
+    assert len(plafonne.getvalue()) < taille
+
+    sortie = tmp_path / "panel.csv"
+    commande = panel_store.commande_export(["pop1", "fcaf"], ANNEES[:2], "csv", sortie=str(sortie))
+    panel_store.main(shlex.split(commande)[2:])
+    assert sortie.read_bytes() == complet.getvalue()
@@ -0,0 +1,85 @@
+# test_caches.py - Cache borné en octets des résultats (données d'une commune, recherches)
+import pandas as pd
+
+import app_fetchers
+from caches import MemoryBudgetCache, cache_stats, taille_octets
+
+from test_fetchers import ANNEES, COMMUNE, DEPARTEMENT
+
+def test_eviction_au_budget():
+    cache = MemoryBudgetCache(max_bytes=250, sizeof=len)
+    cache.set("a", "x" * 100)
+    cache.set("b", "x" * 100)
+    cache.get("a")
+    cache.set("c", "x" * 100)  # évince b, le moins récemment lu
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.bytes == 200 and cache.evictions == 1
+
+    cache.set("a", "x" * 10)  # remplacement : volume recalculé
+    assert cache.bytes == 110
+
+    cache.set("d", "x" * 300)  # plus gros que le budget : pas gardé
+    assert "d" not in cache and cache.bytes == 110
+
+    stats = cache.stats()
+    assert stats["entrées"] == 2 and stats["octets"] == 110 and stats["rejets"] == 1
+    assert stats["taux de hit"] == 1.0
+
+def test_expiration_libere_le_budget():
+    cache = MemoryBudgetCache(max_bytes=100, ttl=-1, sizeof=len)
+    cache.set("a", "x" * 50)
+    assert cache.get("a") is None
+    assert cache.bytes == 0 and cache.expirations == 1
+
+def test_taille_dataframe():
+    df = pd.DataFrame({"Année": ["2023", "2024"], "valeur": [1.0, 2.0]})
+    assert taille_octets({"caf": df}) > taille_octets(df) == df.memory_usage(deep=True).sum()
+
+def test_donnees_commune_bornees(mock_api, cold_caches, monkeypatch):
+    data = app_fetchers.get_all_commune_data(COMMUNE, ANNEES, DEPARTEMENT)
+    cache = app_fetchers._donnees_commune_cache
+    assert cache.bytes == taille_octets(data)
+
+    # Dict et tableaux retournés sont des copies : les modifier ne touche pas au cache
+    data["caf"]["nouvelle"] = 1
+    data["caf"].iloc[0, 1:] = -1
+    data["fonctionnement"].loc[:, data["fonctionnement"].columns[1]] = -1
+    data["caf"].rename(columns={"Année": "an"}, inplace=True)
+    data["caf"].sort_values("an", ascending=False, inplace=True)
+    data.clear()
+    relu = app_fetchers.get_all_commune_data(COMMUNE, ANNEES, DEPARTEMENT)
+    assert "nouvelle" not in relu["caf"] and list(relu["caf"]["Année"].astype(int)) == ANNEES
+    assert not relu["caf"].iloc[0, 1:].eq(-1).any()
+    assert not relu["fonctionnement"].iloc[:, 1].eq(-1).any()
+
+    # Budget d'une seule commune : la suivante évince la première
+    monkeypatch.setattr(cache, "max_bytes", cache.bytes)
+    app_fetchers.get_all_commune_data(COMMUNE, ANNEES[:-1], DEPARTEMENT)
+    assert len(cache) == 1 and cache.evictions == 1
+    assert cache.bytes <= cache.max_bytes
+
+    stats = {s["cache"]: s for s in cache_stats()}
+    assert stats["donnees_commune"]["hits"] == 1
+    assert stats["recherches_commune"]["entrées"] == 0
+
+def test_taille_donnees_commune(benchmark, mock_api, cold_caches):
+    """Coût de l'estimation de taille, payé à chaque mise en cache d'une commune"""
+    data = app_fetchers.get_all_commune_data(COMMUNE, ANNEES, DEPARTEMENT)
+    benchmark.extra_info["octets"] = benchmark(taille_octets, data)
+
+def test_reponses_api_bornees(mock_api, cold_caches, monkeypatch):
+    """Les réponses API gardées en mémoire tiennent dans un budget en octets"""
+    cache = app_fetchers._reponses_cache
+    app_fetchers.get_all_commune_data(COMMUNE, ANNEES, DEPARTEMENT)
+    assert 0 < cache.bytes <= cache.max_bytes
+
+    # Budget plein : la recherche (projetée sur inom, dep, pop1) évince les plus anciennes réponses annuelles
+    monkeypatch.setattr(cache, "max_bytes", cache.bytes)
+    evictions = cache.evictions
+    app_fetchers.search_commune("LA ROCHELLE")
+    assert cache.bytes <= cache.max_bytes and cache.evictions > evictions
+
+    # Quelques centaines d'octets au lieu d'une ligne complète (~25 Ko)
+    params = {"where": 'an="2024" AND inom="LA ROCHELLE"', "limit": 100, "select": "inom,dep,pop1"}
+    recherche = app_fetchers._request_key(app_fetchers.get_api_url_for_year(2024), params)
+    assert cache._sizes[recherche] < 2_000
@@ -0,0 +1,68 @@
+# test_charge.py - Test de charge réduit : deux sessions concurrentes sur l'API locale
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from streamlit.runtime.runtime import Runtime
+
+from charge import analyser, runtime_partage
+from importtime import RACINE
+
+def lancer_charge(panel_dir, tmp_path, sessions):
+    """charge.py sur l'API locale, dans un interpréteur neuf (les pages lisent l'URL de l'API à l'import)"""
+    communes = tmp_path / "communes.txt"
+    communes.write_text("RENAGE;038\nLA ROCHELLE;017\n", encoding="utf-8")
+    sortie = tmp_path / "charge.json"
+    resultat = subprocess.run(
+        [sys.executable, "benchmarks/charge.py", "--sessions", str(sessions), "--communes", str(communes),
+         "--panel-dir", panel_dir, "--pages", "CAF", "Endettement", "--sans-export", "--sans-prechargement",
+         "--timeout", "120", "--json", str(sortie)],
+        cwd=RACINE, capture_output=True, text=True, timeout=300,
+    )
+    assert resultat.returncode == 0, resultat.stdout[-2000:] + resultat.stderr[-2000:]
+
+    # Nombres de reruns seulement : les durées dépendent de la machine
+    rapport = json.loads(sortie.read_text(encoding="utf-8"))
+    assert rapport["erreurs"] == []
+    latences = rapport["latences (ms)"]
+    assert latences["accueil"]["n"] == latences["commune"]["n"] == sessions
+    assert latences["navigation"]["n"] == 2 * sessions
+    assert "rss par session (Mo)" in rapport["mémoire"]
+    assert rapport["exports PDF"] == {"n": 0}
+
+def test_session_unique(panel_dir, tmp_path):
+    """Parcours complet d'une session : déterministe, lancé à chaque passage"""
+    lancer_charge(panel_dir, tmp_path, sessions=1)
+
+# AppTest n'est pas prévu pour plusieurs sessions par processus (identifiants de widgets,
+# compilation des scripts) : des courses rares restent possibles, le test est donc à la demande
+@pytest.mark.skipif(not os.environ.get("FOCUS_BENCH_CHARGE"),
+                    reason="sessions AppTest concurrentes : FOCUS_BENCH_CHARGE=1 pour les lancer")
+def test_sessions_concurrentes(panel_dir, tmp_path):
+    lancer_charge(panel_dir, tmp_path, sessions=2)
+
+def test_runtime_partage():
+    """Le Runtime retiré par le rerun d'une session reste servi aux reruns concurrents"""
+    runtime = object()
+    with runtime_partage():
+        Runtime._instance = runtime
+        assert Runtime.instance() is runtime
+        Runtime._instance = None
+        assert Runtime.exists() and Runtime.instance() is runtime
+    assert not Runtime.exists()
+
+def rerun(session, type_, debut, fin):
+    return {"session": session, "type": type_, "etape": type_, "debut": debut, "fin": fin, "erreur": None}
+
+def test_navigation_pendant_un_export():
+    latences, exports = analyser([
+        rerun(0, "export", 0.0, 10.0),
+        rerun(1, "navigation", 2.0, 5.0),    # pendant l'export de la session 0
+        rerun(0, "navigation", 11.0, 12.0),  # après
+        rerun(1, "export", 20.0, 30.0),
+    ])
+    assert latences["navigation"]["n"] == 2
+    assert latences["navigation pendant un export"] == {"n": 1, "p50": 3000.0, "p95": 3000.0, "p99": 3000.0}
+    assert exports == {"n": 2, "fenêtre (s)": 30.0, "par minute": 4.0, "médiane (s)": 10.0}
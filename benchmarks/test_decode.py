@@ -0,0 +1,63 @@
+# test_decode.py - Décodage d'une page de 10 000 records : JSON puis DataFrame
+import json
+import random
+
+import pandas as pd
+import pytest
+
+import app_fetchers
+from make_cassette import ligne_synthetique
+
+NB_RECORDS = 10_000
+
+@pytest.fixture(scope="module")
+def page():
+    """Corps JSON d'une réponse /records de 10 000 lignes (~180 champs chacune)"""
+    rng = random.Random(10_000)
+    results = [
+        ligne_synthetique(rng, f"COMMUNE {i}", f"{i % 95 + 1:03d}", f"{i % 1000:03d}", 2022, rng.randint(50, 50_000))
+        for i in range(NB_RECORDS)
+    ]
+    return json.dumps({"total_count": NB_RECORDS, "results": results}).encode("utf-8")
+
+@pytest.fixture(scope="module")
+def results(page):
+    return json.loads(page)["results"]
+
+def _decodeur(nom):
+    if nom == "json":
+        return json.loads
+    module = pytest.importorskip(nom)
+    return module.loads if nom == "orjson" else module.json.decode
+
+@pytest.mark.parametrize("decodeur", ["json", "orjson", "msgspec"])
+def test_decode(benchmark, page, decodeur):
+    data = benchmark(_decodeur(decodeur), page)
+    assert len(data["results"]) == NB_RECORDS
+
+def test_frame_pandas_records(benchmark, results):
+    df = benchmark(pd.DataFrame, results)
+    assert len(df) == NB_RECORDS
+
+def test_frame_columnar(benchmark, results):
+    df = benchmark(app_fetchers.records_to_frame, results)
+    assert len(df) == NB_RECORDS
+    assert df["dep"].iloc[0] == "001"
+
+def test_frame_projection_pandas_records(benchmark, results):
+    colonnes = app_fetchers.select_for(*app_fetchers.MODULE_COLUMNS).split(",")
+    df = benchmark(lambda: pd.DataFrame(results)[colonnes])
+    assert list(df.columns) == colonnes
+
+def test_frame_projection_columnar(benchmark, results):
+    colonnes = app_fetchers.select_for(*app_fetchers.MODULE_COLUMNS).split(",")
+    df = benchmark(app_fetchers.records_to_frame, results, colonnes)
+    assert list(df.columns) == colonnes
+
+def test_decode_and_frame_baseline(benchmark, page):
+    df = benchmark(lambda: pd.DataFrame(json.loads(page)["results"]))
+    assert len(df) == NB_RECORDS
+
+def test_decode_and_frame_fast(benchmark, page):
+    df = benchmark(lambda: app_fetchers.records_to_frame(app_fetchers.decode_json(page)["results"]))
+    assert len(df) == NB_RECORDS
@@ -0,0 +1,159 @@
+# test_fetchers.py - Benchmarks de la couche de récupération (app_fetchers)
+import threading
+
+import pytest
+import requests
+
+import app_fetchers
+from metrics import labels_for_request, registry as metrics
+
+COMMUNE = "RENAGE"
+DEPARTEMENT = "038"
+ANNEES = list(range(2019, 2025))
+
+FETCHERS = [
+    "fetch_commune_fonctionnement",
+    "fetch_commune_caf",
+    "fetch_commune_fiscalite",
+    "fetch_commune_endettement",
+    "fetch_commune_investissement",
+    "fetch_commune_fdr",
+]
+
+# Une recherche de variantes par dataset (et par terme de recherche)
+NB_DATASETS = len(set(app_fetchers.DATASETS_MAPPING.values()))
+
+def test_find_commune_variants(bench_cold):
+    variants = bench_cold(lambda: app_fetchers.get_app_fetcher().find_commune_variants(COMMUNE, DEPARTEMENT),
+                          budget=NB_DATASETS)
+    assert variants == [{"nom": COMMUNE, "departement": DEPARTEMENT}]
+
+def test_find_commune_variants_article(bench_cold):
+    variants = bench_cold(lambda: app_fetchers.get_app_fetcher().find_commune_variants("LA ROCHELLE", "017"),
+                          budget=NB_DATASETS * 3)
+    assert {"nom": "LA ROCHELLE", "departement": "017"} in variants
+
+@pytest.mark.parametrize("fetcher", FETCHERS)
+def test_fetch_commune(bench_cold, fetcher):
+    df = bench_cold(getattr(app_fetchers, fetcher), COMMUNE, ANNEES, DEPARTEMENT,
+                    budget=NB_DATASETS + len(ANNEES))
+    assert sorted(df["Année"].astype(int)) == ANNEES
+
+def test_fetch_select_pushdown(mock_api, cold_caches):
+    """Les requêtes annuelles ne demandent que les champs du module"""
+    app_fetchers.fetch_commune_fiscalite(COMMUNE, ANNEES, DEPARTEMENT)
+    selects = [q.get("select") for _, q in mock_api.requests if q["where"].startswith("an=")]
+    assert selects == [app_fetchers.select_for("fiscalite")] * len(ANNEES)
+
+def test_get_all_commune_data(bench_cold):
+    budget = app_fetchers.commune_request_budget(COMMUNE, ANNEES)
+    data = bench_cold(app_fetchers.get_all_commune_data, COMMUNE, ANNEES, DEPARTEMENT, budget=budget)
+    assert all(len(df) == len(ANNEES) for df in data.values())
+
+def test_search_commune(bench_cold):
+    communes = bench_cold(app_fetchers.search_commune, COMMUNE, budget=1)
+    assert communes[0]["departement"] == DEPARTEMENT
+
+def test_get_all_commune_data_cached(mock_api, cold_caches):
+    """Deuxième chargement de la même commune : aucune requête HTTP"""
+    app_fetchers.get_all_commune_data(COMMUNE, ANNEES, DEPARTEMENT)
+    with app_fetchers.compter_requetes() as compteur:
+        app_fetchers.get_all_commune_data(COMMUNE, ANNEES, DEPARTEMENT)
+    assert compteur.requetes == 0
+
+def test_get_all_commune_data_une_requete_par_annee(mock_api, cold_caches):
+    """Les six modules d'une année arrivent en une seule requête"""
+    app_fetchers.get_app_fetcher().find_commune_variants(COMMUNE, DEPARTEMENT)
+    with app_fetchers.compter_requetes() as compteur:
+        app_fetchers.get_all_commune_data(COMMUNE, ANNEES, DEPARTEMENT)
+    assert compteur.requetes == len(ANNEES)
+
+@pytest.mark.parametrize("annees, requetes", [(ANNEES, 1), (ANNEES[1:-1], 0)], ids=["ajout", "retrait"])
+def test_get_all_commune_data_annee_modifiee(mock_api, cold_caches, annees, requetes):
+    """Ajouter une année à la sélection coûte une requête, en retirer une aucune"""
+    app_fetchers.get_all_commune_data(COMMUNE, ANNEES[:-1], DEPARTEMENT)
+    with app_fetchers.compter_requetes() as compteur:
+        data = app_fetchers.get_all_commune_data(COMMUNE, annees, DEPARTEMENT)
+    assert compteur.requetes == requetes
+    assert all(sorted(df["Année"].astype(int)) == annees for df in data.values())
+
+@pytest.mark.parametrize("commune, annees, departement", [
+    ("Renage", ANNEES, DEPARTEMENT),
+    (COMMUNE, ANNEES[::-1], DEPARTEMENT),
+    (f" {COMMUNE.lower()} ", ANNEES, "38"),
+], ids=["casse", "ordre_annees", "departement"])
+def test_get_all_commune_data_cle_canonique(mock_api, cold_caches, commune, annees, departement):
+    """Casse du nom, ordre des années et écriture du département : même entrée de cache"""
+    app_fetchers.get_all_commune_data(COMMUNE, ANNEES, DEPARTEMENT)
+    with app_fetchers.compter_requetes() as compteur:
+        app_fetchers.get_all_commune_data(commune, annees, departement)
+        app_fetchers.get_app_fetcher().find_commune_variants(commune, departement)
+    assert compteur.requetes == 0
+
+def test_search_commune_cle_canonique(mock_api, cold_caches):
+    app_fetchers.search_commune(COMMUNE)
+    with app_fetchers.compter_requetes() as compteur:
+        communes = app_fetchers.search_commune("Renage ")
+    assert compteur.requetes == 0
+    assert communes[0]["departement"] == DEPARTEMENT
+
+# Appels identiques simultanés (plusieurs sessions sur la même commune)
+APPELS_CONCURRENTS = 8
+# Latence du serveur : les appels lancés ensemble arrivent tous pendant le premier
+LATENCE_EN_VOL = 1.0
+
+def appels_concurrents(api_url, params, **kwargs):
+    """Lance APPELS_CONCURRENTS api_get_json identiques ensemble -> résultats (ou exceptions)"""
+    depart = threading.Barrier(APPELS_CONCURRENTS)
+    resultats = [None] * APPELS_CONCURRENTS
+
+    def appel(i):
+        depart.wait()
+        try:
+            resultats[i] = app_fetchers.api_get_json(api_url, params, module="test", **kwargs)
+        except Exception as e:
+            resultats[i] = e
+
+    threads = [threading.Thread(target=appel, args=(i,)) for i in range(APPELS_CONCURRENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    return resultats
+
+def requete_caf():
+    api_url = app_fetchers.get_api_url_for_year(2024)
+    params = {"where": f'an="2024" AND inom="{COMMUNE}" AND dep="{DEPARTEMENT}"', "limit": 100,
+              "select": app_fetchers.select_for("caf")}
+    return api_url, params
+
+def stats_requete(api_url, params):
+    labels = labels_for_request(api_url, params, module="test")
+    lignes, _ = metrics.snapshot()
+    return next(l for l in lignes if (l["dataset"], l["annee"], l["module"]) == labels)
+
+def test_single_flight(mock_api, cold_caches):
+    """Requêtes identiques en vol : un seul appel HTTP, les autres appelants reçoivent le même dict"""
+    mock_api.latency = LATENCE_EN_VOL
+    metrics.reset()
+    api_url, params = requete_caf()
+
+    resultats = appels_concurrents(api_url, params)
+    assert len(mock_api.requests) == 1
+    assert resultats[0]["results"] and all(r is resultats[0] for r in resultats)
+    stats = stats_requete(api_url, params)
+    assert (stats["requetes"], stats["coalescees"]) == (1, APPELS_CONCURRENTS - 1)
+
+def test_single_flight_exception(mock_api, cold_caches, monkeypatch):
+    """L'exception de l'appel en vol (délai dépassé) est levée chez tous les appelants coalescés"""
+    monkeypatch.setattr(app_fetchers, "API_MAX_RETRIES", 0)
+    mock_api.latency = LATENCE_EN_VOL
+    metrics.reset()
+    api_url, params = requete_caf()
+
+    resultats = appels_concurrents(api_url, params, timeout=LATENCE_EN_VOL / 2)
+    assert len(mock_api.requests) == 1
+    assert isinstance(resultats[0], requests.Timeout)
+    assert all(r is resultats[0] for r in resultats)
+    stats = stats_requete(api_url, params)
+    assert (stats["requetes"], stats["erreurs"], stats["coalescees"]) == (1, 1, APPELS_CONCURRENTS - 1)
@@ -0,0 +1,48 @@
+# test_figures.py - Figures des mini-tableaux : construction à froid et rerun (cache JSON)
+import pandas as pd
+import pytest
+
+from figures import _figures_cache, cle_figure, figure_evolution
+
+ANNEES = list(range(2019, 2025))
+
+@pytest.fixture
+def tableau():
+    return pd.DataFrame({
+        "Année": [str(a) for a in ANNEES],
+        "CAF brute / habitant Commune": [150.0, 160, 170, 140, 180, 190],
+        "CAF brute / habitant Moyenne": [170.0, 172, 175, 168, 180, 181],
+    })
+
+COLONNES = ["CAF brute / habitant Commune", "CAF brute / habitant Moyenne"]
+
+def test_figure_froide(benchmark, tableau):
+    def construire():
+        _figures_cache.reset()
+        return figure_evolution(tableau, COLONNES, "CAF brute / habitant", cle_figure("caf", "RENAGE", "038", ANNEES))
+
+    fig = benchmark(construire)
+    assert [trace["name"] for trace in fig["data"]] == COLONNES
+
+def test_figure_rerun(benchmark, tableau):
+    cle = cle_figure("caf", "RENAGE", "038", ANNEES)
+    premiere = figure_evolution(tableau, COLONNES, "CAF brute / habitant", cle)
+    fig = benchmark(figure_evolution, tableau, COLONNES, "CAF brute / habitant", cle)
+    assert fig == premiere
+
+def test_figure_annee_manquante(tableau):
+    """Une année absente (requête en échec) puis retrouvée : la figure suit les données"""
+    cle = cle_figure("caf", "RENAGE", "038", ANNEES)
+    incomplete = figure_evolution(tableau.drop(index=3), COLONNES, "CAF brute / habitant", cle)
+    complete = figure_evolution(tableau, COLONNES, "CAF brute / habitant", cle)
+    assert len(incomplete["data"][0]["x"]) == len(ANNEES) - 1
+    assert len(complete["data"][0]["x"]) == len(ANNEES)
+
+def test_figure_layout(tableau):
+    """Le layout fait partie de la clé : une autre mise en page n'est pas servie depuis le cache"""
+    cle = cle_figure("caf", "RENAGE", "038", ANNEES)
+    haute = figure_evolution(tableau, COLONNES, "CAF brute / habitant", cle, layout={"height": 500, "showlegend": False})
+    basse = figure_evolution(tableau, COLONNES, "CAF brute / habitant", cle, layout={"height": 300})
+    meme = figure_evolution(tableau, COLONNES, "CAF brute / habitant", cle, layout={"showlegend": False, "height": 500})
+    assert haute["layout"]["height"] == 500 and basse["layout"]["height"] == 300
+    assert meme == haute
@@ -0,0 +1,39 @@
+# test_importtime.py - Démarrage de prod.py sans les piles d'export ni les pages
+import os
+import subprocess
+import sys
+
+import pytest
+
+from importtime import LOURDS, RACINE, charger_reference, mesurer, regressions
+
+# Premier affichage de prod.py (page Accueil) dans un interpréteur neuf
+SCRIPT_ACCUEIL = f"""
+import sys
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("prod.py", default_timeout=60).run()
+assert not at.exception, at.exception
+if "prechargement" in sys.modules:
+    # Attend un éventuel préchargement lancé en tâche de fond
+    sys.modules["prechargement"]._executor.shutdown(wait=True)
+print(",".join(m for m in {LOURDS!r} + ["pages.caf", "prechargement"] if m in sys.modules))
+"""
+
+def test_accueil_sans_piles_lourdes(mock_server):
+    """Premier affichage, configuration par défaut : la commune pré-remplie n'est pas préchargée"""
+    env = dict(os.environ, FOCUS_API_BASE_URL=mock_server.base_url, MPLBACKEND="Agg")
+    env.pop("FOCUS_PRECHARGEMENT", None)
+    resultat = subprocess.run([sys.executable, "-c", SCRIPT_ACCUEIL], cwd=RACINE, env=env,
+                              capture_output=True, text=True, timeout=120)
+    assert resultat.returncode == 0, resultat.stderr[-2000:]
+    assert resultat.stdout.strip() == ""
+
+def test_demarrage_sans_piles_lourdes():
+    assert not mesurer(repetitions=1)[1]
+
+@pytest.mark.skipif(not os.environ.get("FOCUS_BENCH_IMPORTTIME"),
+                    reason="temps machine : FOCUS_BENCH_IMPORTTIME=1 pour comparer à la référence")
+def test_importtime_demarrage():
+    """Temps d'import du démarrage (meilleur de 5) comparé à importtime_baseline.json"""
+    mesures = {"démarrage": mesurer(repetitions=5, agregat=min)}
+    assert not regressions(mesures, charger_reference())
@@ -0,0 +1,86 @@
+# test_local_api.py - API locale sur le panel Parquet : parité avec la cassette et débit
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+import app_fetchers
+from local_api import ErreurRequete, analyser_where
+from mock_api import load_cassette
+
+from test_fetchers import ANNEES, COMMUNE, DEPARTEMENT
+
+def test_analyser_where():
+    assert analyser_where('an="2024" AND inom="RENAGE"') == ("and", [("=", "an", "2024"), ("=", "inom", "RENAGE")])
+    assert analyser_where(app_fetchers.where_communes([("RENAGE", "038"), ("VOIRON", "")])) == ("or", [
+        ("and", [("=", "inom", "RENAGE"), ("=", "dep", "038")]),
+        ("=", "inom", "VOIRON"),
+    ])
+    assert analyser_where("an in (2019, 2020)") == ("in", "an", [2019, 2020])
+    with pytest.raises(ErreurRequete):
+        analyser_where('an = "2024" AND')
+
+def cle_tri(ligne):
+    return ligne["an"], ligne["inom"], ligne["dep"]
+
+def test_parite_cassette(local_api):
+    """Chaque requête enregistrée dans la cassette donne les mêmes lignes sur le panel local"""
+    for (dataset, where), attendues in load_cassette().items():
+        obtenues = local_api.records(dataset, {"where": where, "limit": 100})["results"]
+        assert sorted(obtenues, key=cle_tri) == sorted(attendues, key=cle_tri), where
+
+def test_limites(local_api):
+    dataset = app_fetchers.get_dataset_for_year(2024)
+    with pytest.raises(ErreurRequete):
+        local_api.records(dataset, {"limit": 101})
+    with pytest.raises(ErreurRequete):
+        local_api.records(dataset, {"limit": 100, "offset": 9_950})
+    with pytest.raises(ErreurRequete):
+        local_api.records(dataset, {"offset": "1.5"})
+    page = local_api.records(dataset, {"where": 'inom LIKE "%roch%"', "select": "inom,dep", "limit": 1})
+    assert page == {"total_count": 2, "results": [{"inom": "LA ROCHELLE", "dep": "017"}]}
+
+def test_application_sur_api_locale(serveur_local):
+    data = app_fetchers.get_all_commune_data(COMMUNE, ANNEES, DEPARTEMENT)
+    assert all(len(df) == len(ANNEES) for df in data.values())
+
+    communes = app_fetchers.fetch_communes([(COMMUNE, DEPARTEMENT), ("LA ROCHELLE", "017")], ANNEES)
+    assert len(communes["caf"]) == 2 * len(ANNEES)
+
+def test_comparaison_variante_article(serveur_local):
+    """« ROCHELLE (LA) » saisi : résolu en « LA ROCHELLE » (nom de l'API), lignes rendues sous le nom saisi"""
+    assert app_fetchers.resoudre_communes([("rochelle (la)", "17")]) == {("LA ROCHELLE", "017"): "ROCHELLE (LA)"}
+    data = app_fetchers.fetch_communes([("ROCHELLE (LA)", "017"), (COMMUNE, DEPARTEMENT)], ANNEES)
+    assert len(data["caf"]) == 2 * len(ANNEES)
+    assert set(data["caf"]["Commune"]) == {"ROCHELLE (LA)", COMMUNE}
+
+def test_projection_refusee(serveur_local):
+    url = app_fetchers.get_api_url_for_year(2024)
+    reponse = requests.get(url, params={"select": "inconnu"}, timeout=5)
+    assert reponse.status_code == 400 and reponse.json()["error_code"] == "ODSQLError"
+    reponse = requests.get(url, params={"limit": "dix"}, timeout=5)
+    assert reponse.status_code == 400 and reponse.json()["error_code"] == "InvalidRESTParameterError"
+    # L'application rejoue la requête sans projection
+    data = app_fetchers.api_get_json(url, {"where": f'inom="{COMMUNE}"', "select": "inom,inconnu", "limit": 10})
+    assert len(data["results"]) == 2
+
+def test_requete_commune(benchmark, local_api):
+    dataset = app_fetchers.get_dataset_for_year(2024)
+    params = {"where": f'an="2024" AND inom="{COMMUNE}" AND dep="{DEPARTEMENT}"', "limit": 100,
+              "select": app_fetchers.select_for("caf")}
+    page = benchmark(local_api.records, dataset, params)
+    assert page["total_count"] == 1
+
+def test_debit_http(benchmark, serveur_local):
+    """Requêtes d'une commune en HTTP, 8 clients en parallèle (connexions réutilisées)"""
+    url = app_fetchers.get_api_url_for_year(2024)
+    params = {"where": f'an="2024" AND inom="{COMMUNE}" AND dep="{DEPARTEMENT}"', "limit": 100}
+    sessions = [requests.Session() for _ in range(8)]
+
+    def salve():
+        with ThreadPoolExecutor(max_workers=len(sessions)) as pool:
+            return list(pool.map(lambda s: [s.get(url, params=params).status_code for _ in range(25)], sessions))
+
+    statuts = benchmark.pedantic(salve, rounds=3, iterations=1)
+    assert {code for lot in statuts for code in lot} == {200}
+    benchmark.extra_info["requetes_par_salve"] = 8 * 25
@@ -0,0 +1,81 @@
+# test_metrics.py - Instrumentation des appels API : agrégats et expositions Prometheus / JSON
+import json
+
+import app_fetchers
+from metrics import LATENCY_BUCKETS, MetricsRegistry, labels_for_request, registry
+
+from test_fetchers import COMMUNE, DEPARTEMENT
+
+LABELS = ("comptes-individuels-des-communes-fichier-global-2023-2024", "2024", "page_caf")
+
+def registre_rempli():
+    metriques = MetricsRegistry()
+    metriques.record_request(LABELS, 0.2, payload_bytes=1500, retries=1)
+    metriques.record_request(LABELS, 3.0, empty=True)
+    metriques.record_coalesced(LABELS)
+    metriques.record_cache(LABELS, hit=True)
+    metriques.record_cache(LABELS, hit=False)
+    metriques.record_missing("endettement", 2019)
+    return metriques
+
+def test_labels_for_request():
+    url = app_fetchers.get_api_url_for_year(2024)
+    assert labels_for_request(url, {"where": 'an="2024" AND inom="RENAGE"'}, module="page_caf") == LABELS
+    assert labels_for_request(url, {"where": 'inom LIKE "%RENAGE%"'})[1:] == ("", "autre")
+
+def test_to_prometheus():
+    texte = registre_rempli().to_prometheus()
+    lbl = '{dataset="%s",annee="2024",module="page_caf"' % LABELS[0]
+    lignes = texte.splitlines()
+    for attendue in [
+        f"focus_api_requests_total{lbl}}} 2",
+        f"focus_api_coalesced_total{lbl}}} 1",
+        f"focus_api_cache_hits_total{lbl}}} 1",
+        f"focus_api_cache_misses_total{lbl}}} 1",
+        f"focus_api_empty_results_total{lbl}}} 1",
+        f"focus_api_retries_total{lbl}}} 1",
+        f"focus_api_response_bytes_total{lbl}}} 1500",
+        # Histogramme cumulatif : 0,2 s dans les bornes >= 0,25 s, 3 s au-delà de 2,5 s
+        f'focus_api_request_duration_seconds_bucket{lbl},le="0.1"}} 0',
+        f'focus_api_request_duration_seconds_bucket{lbl},le="0.25"}} 1',
+        f'focus_api_request_duration_seconds_bucket{lbl},le="5.0"}} 2',
+        f'focus_api_request_duration_seconds_bucket{lbl},le="+Inf"}} 2',
+        f"focus_api_request_duration_seconds_sum{lbl}}} 3.2",
+        f"focus_api_request_duration_seconds_count{lbl}}} 2",
+        'focus_fetch_missing_years_total{module="endettement",annee="2019"} 1',
+        "# TYPE focus_api_request_duration_seconds histogram",
+    ]:
+        assert attendue in lignes, attendue
+    # Chaque série est précédée de son HELP et de son TYPE
+    noms = {l.split("{")[0].split(" ")[0] for l in lignes if not l.startswith("#")}
+    types = {l.split(" ")[2] for l in lignes if l.startswith("# TYPE")}
+    assert {n.removesuffix("_bucket").removesuffix("_sum").removesuffix("_count") for n in noms} <= types
+    assert texte.endswith("\n")
+
+def test_to_prometheus_echappement():
+    metriques = MetricsRegistry()
+    metriques.record_coalesced(('jeu "a"\\b', "", "x\ny"))
+    assert 'dataset="jeu \\"a\\"\\\\b",annee="",module="x\\ny"' in metriques.to_prometheus()
+
+def test_to_json():
+    contenu = json.loads(registre_rempli().to_json())
+    assert set(contenu) == {"depuis", "requetes", "annees_manquantes", "caches"}
+    (ligne,) = contenu["requetes"]
+    assert (ligne["dataset"], ligne["annee"], ligne["module"]) == LABELS
+    assert ligne["requetes"] == 2 and ligne["coalescees"] == 1 and ligne["erreurs"] == 0
+    assert (ligne["cache_hits"], ligne["cache_misses"]) == (1, 1)
+    assert ligne["latence_moyenne_s"] == 1.6
+    assert list(ligne["latence_buckets"]) == [str(b) for b in LATENCY_BUCKETS]
+    assert contenu["annees_manquantes"] == [{"module": "endettement", "annee": "2019", "total": 1}]
+
+def test_cache_par_requete(mock_api, cold_caches):
+    """Hit / miss du cache des réponses notés sous les labels de la requête"""
+    registry.reset()
+    url = app_fetchers.get_api_url_for_year(2024)
+    params = {"where": f'an="2024" AND inom="{COMMUNE}" AND dep="{DEPARTEMENT}"', "limit": 100,
+              "select": app_fetchers.select_for("caf")}
+    for _ in range(3):
+        app_fetchers.api_get_json(url, params, module="page_caf")
+    (ligne,) = registry.snapshot()[0]
+    assert (ligne["dataset"], ligne["annee"], ligne["module"]) == LABELS
+    assert (ligne["requetes"], ligne["cache_misses"], ligne["cache_hits"]) == (1, 1, 2)
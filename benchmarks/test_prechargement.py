@@ -0,0 +1,86 @@
+# test_prechargement.py - Préchargement en tâche de fond : les pages ne refont plus de requête
+import importlib
+import logging
+
+import pytest
+
+import app_fetchers
+import prechargement
+import reports
+
+from test_fetchers import ANNEES, COMMUNE, DEPARTEMENT
+
+PAGES = [
+    "pages.fonctionnement", "pages.caf", "pages.fiscalite",
+    "pages.endettements", "pages.investissements", "pages.fdr",
+]
+
+# Fonction de chargement affichée par chaque page (une année ou toutes les années par appel)
+FETCH_PAGES = {
+    "pages.fonctionnement": ("fetch_commune_fonctionnement", True),
+    "pages.caf": ("fetch_commune_caf", False),
+    "pages.fiscalite": ("fetch_commune_fiscalite", True),
+    "pages.endettements": ("fetch_commune_endettement", False),
+    "pages.investissements": ("fetch_commune_investissement", False),
+    "pages.fdr": ("fetch_commune_fdr", True),
+}
+
+def test_pages_prechargees(mock_api, cold_caches):
+    future = prechargement.precharger_commune(COMMUNE, ANNEES, DEPARTEMENT, pages=PAGES)
+    future.result(timeout=120)
+    assert mock_api.requests
+
+    # Relancé pour la même commune (autre écriture) : rien à faire
+    assert prechargement.precharger_commune("Renage", ANNEES[::-1], "38", pages=PAGES) is None
+
+    with app_fetchers.compter_requetes() as compteur:
+        for page in PAGES:
+            importlib.import_module(page).precharger(COMMUNE, ANNEES, DEPARTEMENT)
+        app_fetchers.get_all_commune_data(COMMUNE, ANNEES, DEPARTEMENT)
+    assert compteur.requetes == 0
+
+def test_prechargement_sans_session(mock_api, cold_caches):
+    """Le thread de préchargement n'appelle pas Streamlit (aucun « missing ScriptRunContext »)"""
+    avertissements = []
+
+    class Collecteur(logging.Handler):
+        def emit(self, record):
+            avertissements.append(record.getMessage())
+
+    collecteur = Collecteur()
+    journal = logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context")
+    journal.addHandler(collecteur)
+    try:
+        prechargement.precharger_commune(COMMUNE, ANNEES, DEPARTEMENT, pages=PAGES).result(timeout=120)
+    finally:
+        journal.removeHandler(collecteur)
+    assert not [m for m in avertissements if prechargement.PREFIXE_THREADS in m]
+
+    # Les pages affichées relisent les réponses préchargées
+    with app_fetchers.compter_requetes() as compteur:
+        for page, (fonction, par_annee) in FETCH_PAGES.items():
+            fetch = getattr(importlib.import_module(page), fonction)
+            if par_annee:
+                for annee in ANNEES:
+                    fetch(COMMUNE, annee, DEPARTEMENT)
+            else:
+                fetch(COMMUNE, ANNEES, DEPARTEMENT)
+    assert compteur.requetes == 0
+
+def test_graphiques_pdf_precharges(mock_api, cold_caches):
+    nb_graphiques = reports.precharger_graphiques(COMMUNE, ANNEES, DEPARTEMENT)
+    assert nb_graphiques > 0
+    rendus = reports._graphiques_cache.misses
+    assert reports.precharger_graphiques(COMMUNE, ANNEES, DEPARTEMENT) == nb_graphiques
+    assert reports._graphiques_cache.misses == rendus
+
+@pytest.mark.parametrize("page", PAGES)
+def test_departement_deux_chiffres(mock_api, cold_caches, monkeypatch, page):
+    """« 38 » saisi dans la page : les requêtes partent avec « 038 » (aucune absente de la cassette)"""
+    module = importlib.import_module(page)
+    monkeypatch.setattr(module, "API_BASE_URL", mock_api.base_url)
+    module.precharger(COMMUNE, ANNEES, "38")
+    wheres = [q["where"] for _, q in mock_api.requests if q["where"].startswith("an=")]
+    assert wheres and all(f'dep="{DEPARTEMENT}"' in w for w in wheres)
+    if page == "pages.caf":
+        assert len(module.fetch_commune_caf(COMMUNE, ANNEES, "38")) == len(ANNEES)
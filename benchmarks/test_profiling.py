@@ -0,0 +1,35 @@
+# test_profiling.py - Timeline des exports : trace Chrome et profils récents
+import json
+
+import profiling
+from profiling import Timeline
+
+def test_chrome_trace():
+    """Événements complets (ph X) en microsecondes, triés par début, arguments en texte"""
+    timeline = Timeline("Export PDF")
+    with timeline.stage("Export PDF"):
+        with timeline.stage("Données", annees=[2023, 2024]):
+            pass
+        with timeline.stage("doc.build"):
+            pass
+
+    trace = json.loads(timeline.to_chrome_trace())
+    assert trace["displayTimeUnit"] == "ms"
+    evenements = trace["traceEvents"]
+    assert [e["name"] for e in evenements] == ["Export PDF", "Données", "doc.build"]
+    assert all(e["ph"] == "X" and e["cat"] == "Export PDF" for e in evenements)
+    assert [e["ts"] for e in evenements] == sorted(e["ts"] for e in evenements)
+    racine = evenements[0]
+    assert all(racine["ts"] <= e["ts"] and e["ts"] + e["dur"] <= racine["ts"] + racine["dur"] + 0.2
+               for e in evenements[1:])
+    assert evenements[1]["args"] == {"annees": "[2023, 2024]"}
+    assert abs(racine["ts"] + racine["dur"] - timeline.total * 1e6) < 0.2
+
+def test_profils_recents(monkeypatch):
+    """Profilage actif : chaque export terminé rejoint RECENT_TIMELINES (page Diagnostic)"""
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "RECENT_TIMELINES", profiling.deque(maxlen=2))
+    for nom in ["Export PDF", "Export Excel", "Export PDF"]:
+        with profiling.profile(nom) as timeline:
+            assert timeline.name == nom
+    assert [t.name for t in profiling.RECENT_TIMELINES] == ["Export Excel", "Export PDF"]
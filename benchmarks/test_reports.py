@@ -0,0 +1,17 @@
+# test_reports.py - Benchmarks des exports PDF et Excel (récupération comprise)
+import app_fetchers
+import reports
+
+COMMUNE = "RENAGE"
+DEPARTEMENT = "038"
+ANNEES = list(range(2019, 2025))
+
+def test_create_pdf_report(bench_cold):
+    pdf = bench_cold(reports.create_pdf_report, COMMUNE, ANNEES, DEPARTEMENT,
+                     budget=app_fetchers.commune_request_budget(COMMUNE, ANNEES))
+    assert pdf[:4] == b"%PDF"
+
+def test_create_excel_report(bench_cold):
+    xlsx = bench_cold(reports.create_excel_report, COMMUNE, ANNEES, DEPARTEMENT,
+                      budget=app_fetchers.commune_request_budget(COMMUNE, ANNEES))
+    assert xlsx[:2] == b"PK"
@@ -0,0 +1,100 @@
+# test_score_sante.py - Score de santé et classement par strate sur le panel national
+import numpy as np
+import pandas as pd
+import pytest
+
+from score_sante import STRATES, classer, evaluer, rang_dans_strate
+
+NB_COMMUNES = 35_000
+ANNEES = [str(a) for a in range(2019, 2025)]
+
+@pytest.fixture(scope="module")
+def panel_caf():
+    """Indicateurs CAF fictifs, une ligne par commune et par année"""
+    rng = np.random.default_rng(40)
+    n = NB_COMMUNES * len(ANNEES)
+    return pd.DataFrame({
+        "Commune": np.repeat([f"COMMUNE {i:05d}" for i in range(NB_COMMUNES)], len(ANNEES)),
+        "Département": np.repeat([f"{i % 95 + 1:03d}" for i in range(NB_COMMUNES)], len(ANNEES)),
+        "Année": np.tile(ANNEES, NB_COMMUNES),
+        "Population": np.repeat(rng.lognormal(7, 1.5, NB_COMMUNES).round(), len(ANNEES)),
+        "CAF brute / hab Commune": rng.normal(180, 60, n).round(),
+        "CAF brute / RRF Commune": rng.normal(12, 5, n),
+        "CAF brute / RRF Moyenne": rng.normal(12, 1, n),
+    })
+
+def test_classement(benchmark, panel_caf):
+    classement = benchmark(classer, panel_caf)
+    assert len(classement) == len(panel_caf)
+    assert classement["Score"].between(0, 100).all()
+    assert set(classement["Strate"].dropna().unique()) <= set(STRATES)
+    premiers = classement[classement["Rang strate"] == 1]
+    assert premiers.groupby(["Année", "Strate"], observed=True)["Score"].min().ge(
+        classement.groupby(["Année", "Strate"], observed=True)["Score"].max()).all()
+
+def test_rang_dans_strate(panel_caf):
+    classement = classer(panel_caf)
+    ligne = classement.iloc[len(classement) // 2]
+    rang, effectif, strate = rang_dans_strate(ligne["Score"], ligne["Population"], ligne["Année"],
+                                              ligne["Commune"], ligne["Département"], classement=classement)
+    assert strate == ligne["Strate"]
+    assert effectif == ligne["Communes strate"]
+    assert rang == ligne["Rang strate"]
+
+def score_scalaire(caf_df):
+    """Règles de l'ancienne carte de test.py, ligne à ligne sur la dernière année -> (score, alertes, priorités)"""
+    derniere = caf_df.iloc[-1]
+    ratio, moyenne = derniere["CAF brute / RRF Commune"], derniere["CAF brute / RRF Moyenne"]
+    evolution = None
+    if len(caf_df) > 1:
+        caf_hab = caf_df["CAF brute / hab Commune"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            evolution = ((caf_hab.iloc[-1] / caf_hab.iloc[0]) - 1) * 100
+
+    score = 50
+    if ratio > 10:
+        score += 20
+    elif ratio > 7:
+        score += 10
+    elif ratio < 5:
+        score -= 10
+    score += 15 if ratio > moyenne else -5
+    if evolution is not None:
+        if evolution > 5:
+            score += 15
+        elif evolution > 0:
+            score += 10
+        elif evolution < -5:
+            score -= 15
+
+    ecart = ratio - moyenne
+    alertes = (
+        abs(ecart) > 2 and ecart > 0, abs(ecart) > 2 and ecart < 0,
+        evolution is not None and evolution > 10, evolution is not None and evolution < -10, ratio < 5,
+    )
+    priorites = (ratio < 7, ratio < moyenne, evolution is not None and evolution < 0)
+    return max(0, min(100, score)), alertes, priorites
+
+def test_evaluer_comme_les_regles_scalaires():
+    """Mêmes scores et indicateurs que l'ancienne implémentation scalaire (NaN, une seule année, CAF nulle)"""
+    rng = np.random.default_rng(3000)
+    lignes = []
+    for i in range(3000):
+        nb_annees = rng.integers(1, 7)
+        for annee in ANNEES[:nb_annees]:
+            valeurs = [rng.normal(8, 5), rng.normal(8, 2), rng.choice([0.0, rng.normal(150, 80)], p=[0.05, 0.95])]
+            valeurs = [np.nan if rng.random() < 0.1 else v for v in valeurs]
+            lignes.append((f"COMMUNE {i:04d}", "038", annee, *valeurs))
+    df = pd.DataFrame(lignes, columns=["Commune", "Département", "Année", "CAF brute / RRF Commune",
+                                       "CAF brute / RRF Moyenne", "CAF brute / hab Commune"])
+
+    evaluation = evaluer(df).groupby("Commune").tail(1).set_index("Commune")
+    colonnes_alertes = ["Alerte CAF / RRF supérieur", "Alerte CAF / RRF inférieur", "Alerte croissance",
+                        "Alerte baisse", "Alerte vigilance"]
+    colonnes_priorites = ["Priorité ratio", "Priorité moyenne", "Priorité tendance"]
+    assert (df.groupby("Commune").size() == 1).any() and df.iloc[:, 3:].isna().any().all()
+    for commune, caf_df in df.groupby("Commune"):
+        score, alertes, priorites = score_scalaire(caf_df)
+        ligne = evaluation.loc[commune]
+        assert (ligne["Score"], tuple(ligne[colonnes_alertes]), tuple(ligne[colonnes_priorites])) == \
+            (score, alertes, priorites), commune
@@ -0,0 +1,40 @@
+# test_similaires.py - Recherche des communes similaires sur une matrice nationale
+import numpy as np
+import pandas as pd
+import pytest
+
+from communes_similaires import CHAMPS, ProfilsCommunes
+
+NB_COMMUNES = 35_000
+
+@pytest.fixture(scope="module")
+def profils():
+    """~35 000 communes fictives aux champs bruts tirés au hasard"""
+    rng = np.random.default_rng(35)
+    df = pd.DataFrame({c: rng.lognormal(5, 0.5, NB_COMMUNES) for c in CHAMPS[3:]})
+    df["inom"] = [f"COMMUNE {i:05d}" for i in range(NB_COMMUNES)]
+    df["dep"] = [f"{i % 95 + 1:03d}" for i in range(NB_COMMUNES)]
+    df["icom"] = [f"{i % 1000:03d}" for i in range(NB_COMMUNES)]
+    df.loc[::500, "fcaf"] = 0
+    return ProfilsCommunes(df)
+
+def test_similaires(benchmark, profils):
+    tableau = benchmark(profils.similaires, "COMMUNE 01234", "095", k=10)
+    assert len(tableau) == 11
+    assert tableau["Distance"].is_monotonic_increasing
+
+def test_plus_proches_exact(profils):
+    """La recherche par blocs donne les mêmes voisins que le calcul direct"""
+    requetes = np.arange(0, NB_COMMUNES, 3500)
+    voisins, _ = profils.plus_proches(requetes, k=5, bloc=4)
+    for i, attendus in zip(requetes, voisins):
+        d2 = ((profils.matrice - profils.matrice[i]) ** 2).sum(axis=1)
+        d2[i] = np.inf
+        assert set(np.argsort(d2)[:5]) == set(attendus)
+
+def test_construction(benchmark):
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({c: rng.lognormal(5, 0.5, NB_COMMUNES) for c in CHAMPS[3:]})
+    df["inom"], df["dep"] = "X", "001"
+    profils = benchmark(ProfilsCommunes, df)
+    assert profils.matrice.shape == (NB_COMMUNES, 6)
@@ -0,0 +1,81 @@
+# test_warmup.py - Préchauffage : un serveur neuf ne refait aucune requête pour les communes préchauffées
+import io
+
+import pytest
+import streamlit as st
+
+import app_fetchers
+import cache_persistant
+import reports
+import warmup
+from caches import registered_caches, reset_caches
+
+from test_fetchers import ANNEES, COMMUNE, DEPARTEMENT
+
+@pytest.fixture
+def base(tmp_path):
+    chemin = str(tmp_path / "focus.sqlite")
+    cache_persistant.configurer(chemin)
+    yield chemin
+    cache_persistant.configurer(None)
+
+def vider_memoire():
+    """Caches en mémoire vidés, base persistante conservée (redémarrage du serveur)"""
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    reset_caches([nom for nom in registered_caches() if not nom.endswith("_disque")])
+
+def test_lire_communes():
+    lignes = ["# top", "renage;38", "", "LA ROCHELLE", "RENAGE;038"]
+    assert warmup.lire_communes(lignes) == [("RENAGE", "038"), ("LA ROCHELLE", "")]
+
+def test_warmup_puis_serveur_neuf(mock_api, cold_caches, base, tmp_path):
+    fichier = tmp_path / "top.txt"
+    fichier.write_text(f"{COMMUNE};{DEPARTEMENT}\n", encoding="utf-8")
+    assert warmup.main(["--communes", str(fichier), "--db", base, "--concurrence", "2"]) == 0
+    assert mock_api.requests
+    assert len(cache_persistant.graphiques) > 0
+
+    vider_memoire()
+    mock_api.reset_counters()
+    absents = cache_persistant.graphiques.misses
+    app_fetchers.search_commune(COMMUNE)
+    app_fetchers.get_all_commune_data(COMMUNE, ANNEES, DEPARTEMENT)
+    reports.precharger_graphiques(COMMUNE, ANNEES, DEPARTEMENT)
+    assert not mock_api.requests
+    # Graphiques relus sur disque, aucun rendu matplotlib
+    assert cache_persistant.graphiques.misses == absents
+    assert cache_persistant.graphiques.hits > 0
+
+def test_warmup_consultations(mock_api, cold_caches, base):
+    for _ in range(2):
+        cache_persistant.consultations.noter(COMMUNE, DEPARTEMENT)
+    cache_persistant.consultations.noter("LA ROCHELLE", "017")
+    assert cache_persistant.consultations.plus_consultees(1) == [(COMMUNE, DEPARTEMENT, 2)]
+
+    echecs = warmup.rechauffer([(COMMUNE, DEPARTEMENT)], graphiques=False, sortie=io.StringIO())
+    assert echecs == []
+    assert len(cache_persistant.reponses) > 0
+
+def test_consultations_choix_explicites(mock_api, cold_caches, base, monkeypatch):
+    """La commune pré-remplie de l'accueil n'est comptée qu'à l'ouverture d'une page d'analyse"""
+    from streamlit.testing.v1 import AppTest
+
+    from importtime import RACINE
+
+    monkeypatch.setenv("FOCUS_PRECHARGEMENT", "0")
+    prod = f"{RACINE}/prod.py"
+
+    at = AppTest.from_file(prod, default_timeout=60).run()
+    assert not at.exception
+    assert cache_persistant.consultations.plus_consultees(5) == []
+
+    at.text_input[0].input("LA ROCHELLE").run()
+    assert [c[:2] for c in cache_persistant.consultations.plus_consultees(5)] == [("LA ROCHELLE", "017")]
+
+    at = AppTest.from_file(prod, default_timeout=60).run()
+    at.sidebar.selectbox[0].select("CAF").run()
+    assert not at.exception
+    assert {c[:2] for c in cache_persistant.consultations.plus_consultees(5)} == {
+        ("LA ROCHELLE", "017"), (COMMUNE, DEPARTEMENT)
+    }
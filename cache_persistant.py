@@ -0,0 +1,143 @@
+# cache_persistant.py - Cache disque (SQLite) des réponses API et des graphiques PDF
+#
+# Partagé entre processus : warmup.py le remplit avant l'ouverture du serveur,
+# l'application le relit derrière ses caches en mémoire. Désactivé tant que
+# FOCUS_CACHE_DB n'est pas renseigné (ou `configurer(chemin)` appelé).
+# La même base garde le décompte des communes consultées, relu par warmup.py.
+import os
+import sqlite3
+import threading
+import time
+
+from caches import register_cache, unregister_cache
+
+CACHE_DB_DEFAUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache", "focus.sqlite")
+
+# Les comptes changent une fois par an : une semaine sur disque
+REPONSES_DISQUE_TTL = 7 * 24 * 3600
+GRAPHIQUES_DISQUE_TTL = 7 * 24 * 3600
+
+class _BaseSQLite:
+    """Une connexion par thread ; base en mode WAL (un processus écrit pendant que d'autres lisent)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connexion(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+class CacheSQLite(_BaseSQLite):
+    """Table clé (texte) -> valeur (octets) d'une base SQLite, avec TTL.
+
+    Même interface de statistiques que caches.LRUCache (page Diagnostic).
+    """
+
+    def __init__(self, path, table, ttl=None, name=None):
+        super().__init__(path)
+        self.table = table
+        self.ttl = ttl
+        self.name = name
+        self._reset_stats()
+        with self._connexion() as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (cle TEXT PRIMARY KEY, valeur BLOB, cree REAL)")
+        if name:
+            register_cache(name, self)
+
+    def _reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        ligne = self._connexion().execute(
+            f"SELECT valeur, cree FROM {self.table} WHERE cle = ?", (key,)
+        ).fetchone()
+        if ligne is None:
+            self.misses += 1
+            return default
+        valeur, cree = ligne
+        if self.ttl and cree + self.ttl <= time.time():
+            with self._connexion() as conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE cle = ?", (key,))
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self.hits += 1
+        return valeur
+
+    def set(self, key, value):
+        with self._connexion() as conn:
+            conn.execute(f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)", (key, value, time.time()))
+
+    def __len__(self):
+        return self._connexion().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def reset(self):
+        """Vide la table et remet les compteurs à zéro"""
+        with self._connexion() as conn:
+            conn.execute(f"DELETE FROM {self.table}")
+        self._reset_stats()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "cache": self.name,
+            "entrées": len(self),
+            "max": None,
+            "ttl (s)": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": None,
+            "expirations": self.expirations,
+            "taux de hit": round(self.hits / total, 3) if total else None,
+        }
+
+class Consultations(_BaseSQLite):
+    """Nombre de consultations par commune (alimente `warmup.py --consultations`)"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        with self._connexion() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS compteurs "
+                         "(commune TEXT, departement TEXT, nombre INTEGER, derniere REAL, "
+                         "PRIMARY KEY (commune, departement))")
+
+    def noter(self, commune, departement):
+        with self._connexion() as conn:
+            conn.execute(
+                "INSERT INTO compteurs VALUES (?, ?, 1, ?) ON CONFLICT (commune, departement) "
+                "DO UPDATE SET nombre = nombre + 1, derniere = excluded.derniere",
+                (commune, departement, time.time())
+            )
+
+    def plus_consultees(self, n):
+        """[(commune, département, nombre)] des n communes les plus consultées"""
+        return self._connexion().execute(
+            "SELECT commune, departement, nombre FROM compteurs ORDER BY nombre DESC, derniere DESC LIMIT ?", (n,)
+        ).fetchall()
+
+# Caches ouverts (None : persistance désactivée)
+reponses = None
+graphiques = None
+consultations = None
+
+def configurer(path):
+    """Ouvre (ou ferme, avec None) la base persistante des caches"""
+    global reponses, graphiques, consultations
+    if not path:
+        reponses = graphiques = consultations = None
+        unregister_cache("reponses_disque")
+        unregister_cache("graphiques_disque")
+        return
+    reponses = CacheSQLite(path, "reponses", ttl=REPONSES_DISQUE_TTL, name="reponses_disque")
+    graphiques = CacheSQLite(path, "graphiques", ttl=GRAPHIQUES_DISQUE_TTL, name="graphiques_disque")
+    consultations = Consultations(path)
+
+configurer(os.environ.get("FOCUS_CACHE_DB"))
@@ -0,0 +1,214 @@
+# caches.py - Caches en mémoire bornés, avec statistiques pour la page Diagnostic
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Tous les caches nommés du processus, pour l'introspection
+_REGISTRY = {}
+_REGISTRY_LOCK = threading.Lock()
+
+_MISSING = object()
+
+class LRUCache:
+    """Cache LRU thread-safe borné en nombre d'entrées, avec TTL optionnel.
+
+    Les compteurs (hits, misses, evictions, expirations) alimentent la page
+    Diagnostic ; `reset()` vide le cache et remet les compteurs à zéro.
+    """
+
+    def __init__(self, maxsize=1000, ttl=None, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._reset_stats()
+        if name:
+            register_cache(name, self)
+
+    def _reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (value, expires_at)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def _remove(self, key):
+        del self._data[key]
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return False
+            expires_at = entry[1]
+            return expires_at is None or expires_at > time.monotonic()
+
+    def __len__(self):
+        return len(self._data)
+
+    def reset(self):
+        """Vide le cache et remet les compteurs à zéro"""
+        with self._lock:
+            self._data.clear()
+            self._reset_stats()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "cache": self.name,
+            "entrées": len(self._data),
+            "max": self.maxsize,
+            "ttl (s)": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "taux de hit": round(self.hits / total, 3) if total else None,
+        }
+
+def taille_octets(valeur):
+    """Taille approchée d'une valeur en mémoire : DataFrame / Series (memory_usage), tableaux, conteneurs"""
+    if hasattr(valeur, "memory_usage"):
+        taille = valeur.memory_usage(deep=True, index=True)
+        return int(taille.sum()) if hasattr(taille, "sum") else int(taille)
+    if hasattr(valeur, "nbytes"):
+        return int(valeur.nbytes)
+    if isinstance(valeur, dict):
+        return sys.getsizeof(valeur) + sum(taille_octets(k) + taille_octets(v) for k, v in valeur.items())
+    if isinstance(valeur, (list, tuple, set, frozenset)):
+        return sys.getsizeof(valeur) + sum(taille_octets(v) for v in valeur)
+    return sys.getsizeof(valeur)
+
+class MemoryBudgetCache(LRUCache):
+    """Cache LRU thread-safe borné en octets (taille estimée des valeurs), avec TTL optionnel.
+
+    Pour les résultats volumineux (DataFrames) : au-delà du budget, les entrées
+    les moins récemment lues sont évincées ; une valeur plus grosse que tout le
+    budget n'est pas gardée. Statistiques de LRUCache, plus le volume occupé.
+    """
+
+    def __init__(self, max_bytes, ttl=None, name=None, sizeof=taille_octets):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self._sizes = {}
+        super().__init__(maxsize=None, ttl=ttl, name=name)
+
+    def _reset_stats(self):
+        super()._reset_stats()
+        self.rejected = 0
+
+    def _remove(self, key):
+        del self._data[key]
+        self.bytes -= self._sizes.pop(key)
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if size > self.max_bytes:
+                self.rejected += 1
+                return
+            self._data[key] = (value, expires_at)
+            self._sizes[key] = size
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.bytes = 0
+            self._reset_stats()
+
+    def stats(self):
+        return {
+            **super().stats(),
+            "octets": self.bytes,
+            "budget (octets)": self.max_bytes,
+            "rejets": self.rejected,
+        }
+
+class _LruCacheInfoAdapter:
+    """Expose un `functools.lru_cache` avec la même interface que LRUCache"""
+
+    def __init__(self, name, cached_function):
+        self.name = name
+        self._fn = cached_function
+
+    def reset(self):
+        self._fn.cache_clear()
+
+    def stats(self):
+        info = self._fn.cache_info()
+        total = info.hits + info.misses
+        return {
+            "cache": self.name,
+            "entrées": info.currsize,
+            "max": info.maxsize,
+            "ttl (s)": None,
+            "hits": info.hits,
+            "misses": info.misses,
+            "evictions": None,
+            "expirations": None,
+            "taux de hit": round(info.hits / total, 3) if total else None,
+        }
+
+def register_cache(name, cache):
+    """Enregistre un cache (LRUCache ou fonction lru_cache) pour le Diagnostic"""
+    if hasattr(cache, "cache_info"):
+        cache = _LruCacheInfoAdapter(name, cache)
+    with _REGISTRY_LOCK:
+        _REGISTRY[name] = cache
+    return cache
+
+def unregister_cache(name):
+    with _REGISTRY_LOCK:
+        _REGISTRY.pop(name, None)
+
+def registered_caches():
+    with _REGISTRY_LOCK:
+        return dict(_REGISTRY)
+
+def cache_stats():
+    """Statistiques de tous les caches enregistrés"""
+    return [cache.stats() for cache in registered_caches().values()]
+
+def reset_caches(names=None):
+    """Vide les caches enregistrés (tous, ou seulement ceux nommés)"""
+    for name, cache in registered_caches().items():
+        if names is None or name in names:
+            cache.reset()
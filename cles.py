@@ -0,0 +1,28 @@
+# cles.py - Clés canoniques des requêtes (commune, département, années)
+#
+# Tous les caches de l'application (variantes, données par année, recherche,
+# figures, pages) passent par ces fonctions : "Renage" et "RENAGE", [2024, 2023]
+# et [2023, 2024], departement "" et None désignent la même entrée.
+import re
+
+def nom_commune(nom):
+    """Nom tel qu'écrit dans les datasets : majuscules, espaces réduits"""
+    if not nom:
+        return ""
+    return re.sub(r"\s+", " ", str(nom)).strip().upper()
+
+def code_departement(departement):
+    """Code département sur trois caractères ("38" -> "038", "2A" -> "02A"), "" si absent"""
+    if departement is None:
+        return ""
+    code = str(departement).strip().upper()
+    return code.zfill(3) if code else ""
+
+def annees_canoniques(annees):
+    """Années triées et dédoublonnées, en tuple d'entiers"""
+    return tuple(sorted({int(annee) for annee in annees or ()}))
+
+def cle_commune(commune, departement=None, annees=None):
+    """Clé (nom, département[, années]) d'une requête sur une commune"""
+    cle = (nom_commune(commune), code_departement(departement))
+    return cle if annees is None else cle + (annees_canoniques(annees),)
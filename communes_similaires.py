@@ -0,0 +1,136 @@
+# communes_similaires.py - Communes au profil financier le plus proche (groupe de pairs)
+#
+# Chaque commune est décrite par un petit vecteur d'indicateurs standardisés
+# (CAF / RRF, dette en années de CAF, FDR en jours, taux TFB, équipement / hab,
+# population en log). La matrice nationale (~35 000 lignes) est construite une
+# fois par année puis interrogée par recherche exhaustive vectorisée, par blocs :
+# quelques millisecondes par requête, sans dépendance au-delà de NumPy.
+import numpy as np
+import pandas as pd
+
+import panel_store
+from caches import LRUCache
+from cles import cle_commune
+
+# Champs bruts lus, poussés dans `select` (API) ou dans les colonnes lues (panel local)
+CHAMPS = ["inom", "dep", "icom", "pop1", "fcaf", "fprod", "fdette", "ffdr", "fcharge", "tfb", "fequip"]
+
+CARACTERISTIQUES = [
+    "CAF brute / RRF",
+    "Dette en années de CAF",
+    "FDR en jours de DRF",
+    "Taux TFB",
+    "Équipement / hab",
+    "Population (log)",
+]
+
+# Bornes de winsorisation (quantiles) : une CAF quasi nulle donne une dette en
+# années de CAF démesurée, qui écraserait les autres dimensions
+QUANTILES = (0.01, 0.99)
+
+BLOC = 256
+
+_profils_cache = LRUCache(maxsize=6, name="profils_communes")
+
+def _diviser(numerateur, denominateur):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        resultat = numerateur / denominateur
+    resultat[~np.isfinite(resultat)] = np.nan
+    return resultat
+
+def caracteristiques(df):
+    """Matrice (n, 6) des indicateurs bruts, NaN si non calculable"""
+    def col(nom):
+        if nom not in df.columns:
+            return np.full(len(df), np.nan)
+        return pd.to_numeric(df[nom], errors="coerce").to_numpy(dtype=np.float64, copy=True)
+
+    fcaf, fprod, fcharge = col("fcaf"), col("fprod"), col("fcharge")
+    population = col("pop1")
+    population[population <= 0] = np.nan
+    return np.column_stack([
+        _diviser(fcaf, fprod) * 100,
+        _diviser(col("fdette"), fcaf),
+        _diviser(col("ffdr"), fcharge) * 365,
+        col("tfb"),
+        col("fequip"),
+        np.log10(population),
+    ])
+
+class ProfilsCommunes:
+    """Matrice standardisée des communes d'une année et recherche des k plus proches"""
+
+    def __init__(self, df, poids=None):
+        df = df.reset_index(drop=True)
+        self.communes = pd.DataFrame({
+            "Commune": df["inom"].astype(str),
+            "Département": df["dep"].astype(str),
+            "Code commune": df["icom"].astype(str) if "icom" in df.columns else "",
+        })
+        self.brut = caracteristiques(df)
+
+        bas, haut = np.nanquantile(self.brut, QUANTILES, axis=0)
+        borne = np.clip(self.brut, bas, haut)
+        self.moyenne = np.nanmean(borne, axis=0)
+        self.ecart_type = np.nanstd(borne, axis=0)
+        self.ecart_type[~(self.ecart_type > 0)] = 1.0
+
+        # Valeur manquante = moyenne nationale (0 une fois centrée)
+        centre = np.nan_to_num((borne - self.moyenne) / self.ecart_type, nan=0.0)
+        poids = np.ones(len(CARACTERISTIQUES)) if poids is None else np.asarray(poids, dtype=np.float64)
+        self.matrice = np.ascontiguousarray(centre * np.sqrt(poids), dtype=np.float32)
+        self._normes = np.einsum("ij,ij->i", self.matrice, self.matrice)
+        self._index = {
+            (nom, dep): i for i, (nom, dep) in enumerate(zip(self.communes["Commune"], self.communes["Département"]))
+        }
+
+    def __len__(self):
+        return len(self.matrice)
+
+    def indice(self, commune, departement=None):
+        """Ligne d'une commune ; sans département, la première homonyme"""
+        commune, departement = cle_commune(commune, departement)
+        if departement:
+            return self._index.get((commune, departement))
+        trouvees = np.flatnonzero(self.communes["Commune"].to_numpy() == commune)
+        return int(trouvees[0]) if len(trouvees) else None
+
+    def plus_proches(self, indices, k=10, bloc=BLOC):
+        """k plus proches voisins (hors elle-même) de chaque ligne demandée -> (indices, distances)"""
+        requetes = np.atleast_1d(np.asarray(indices))
+        k = min(k, len(self) - 1)
+        voisins = np.empty((len(requetes), k), dtype=np.int64)
+        distances = np.empty((len(requetes), k), dtype=np.float32)
+
+        for debut in range(0, len(requetes), bloc):
+            lot = requetes[debut:debut + bloc]
+            # ||a - b||² = ||a||² + ||b||² - 2 a.b, un bloc de requêtes à la fois
+            d2 = self._normes[lot, None] + self._normes[None, :] - 2 * (self.matrice[lot] @ self.matrice.T)
+            d2[np.arange(len(lot)), lot] = np.inf
+            candidats = np.argpartition(d2, k, axis=1)[:, :k]
+            d2_candidats = np.take_along_axis(d2, candidats, axis=1)
+            ordre = np.argsort(d2_candidats, axis=1)
+            voisins[debut:debut + bloc] = np.take_along_axis(candidats, ordre, axis=1)
+            distances[debut:debut + bloc] = np.sqrt(np.maximum(np.take_along_axis(d2_candidats, ordre, axis=1), 0))
+        return voisins, distances
+
+    def similaires(self, commune, departement=None, k=10):
+        """Tableau des k communes les plus proches, avec leurs indicateurs et la distance"""
+        i = self.indice(commune, departement)
+        if i is None:
+            return pd.DataFrame()
+        voisins, distances = self.plus_proches([i], k)
+        lignes = np.concatenate([[i], voisins[0]])
+        tableau = self.communes.iloc[lignes].reset_index(drop=True)
+        tableau["Distance"] = np.concatenate([[0.0], distances[0]]).round(3)
+        brut = pd.DataFrame(self.brut[lignes], columns=CARACTERISTIQUES).round(2)
+        brut["Population (log)"] = (10 ** brut["Population (log)"]).round(0)
+        return pd.concat([tableau, brut.rename(columns={"Population (log)": "Population"})], axis=1)
+
+def charger_profils(annee):
+    """Profils de toutes les communes d'une année (panel local si présent, sinon API), en cache"""
+    profils = _profils_cache.get(annee)
+    if profils is None:
+        profils = ProfilsCommunes(panel_store.lire_annee(annee, CHAMPS))
+        _profils_cache.set(annee, profils)
+    return profils
@@ -0,0 +1,59 @@
+# figures.py - Cache des figures Plotly des pages de module (JSON sérialisé)
+#
+# Chaque rerun Streamlit (y compris l'ouverture d'un expander) refaisait, pour
+# chaque mini-tableau, un melt pandas puis un px.line. La figure ne dépend que
+# des valeurs tracées : elle est construite une fois, gardée en JSON et resservie
+# telle quelle aux reruns suivants.
+import hashlib
+import json
+
+import pandas as pd
+
+from caches import LRUCache
+from cles import cle_commune
+
+# Même durée que les données affichées (cache des fetchers) : pas de figure périmée
+FIGURES_TTL = 3600
+
+_figures_cache = LRUCache(maxsize=512, ttl=FIGURES_TTL, name="figures")
+
+def cle_figure(page, commune, departement, annees):
+    """Clé des figures d'une page pour une commune et une période"""
+    return (page, *cle_commune(commune, departement, annees))
+
+def figure_evolution(df, colonnes, titre, cle, layout=None):
+    """Figure « Évolution - titre » (une courbe par colonne, en fonction de l'année), en cache.
+
+    `df` est indexé par année ou porte une colonne « Année ». Renvoie la figure
+    sous forme de dict Plotly, directement utilisable par st.plotly_chart.
+    """
+    donnees = df.set_index("Année")[colonnes] if "Année" in df.columns else df[colonnes]
+    # Empreinte des valeurs : une année manquante (requête en échec) ne fige pas la figure
+    contenu = pd.util.hash_pandas_object(donnees.reset_index(), index=False).to_numpy()
+    # Mise en page sérialisée (clés triées) : deux layouts différents, deux figures
+    mise_en_page = json.dumps(layout or {}, sort_keys=True, default=str)
+    cle = (*cle, titre, tuple(colonnes), hashlib.sha1(contenu.tobytes()).hexdigest(),
+           hashlib.sha1(mise_en_page.encode()).hexdigest())
+    spec = _figures_cache.get(cle)
+    if spec is None:
+        import plotly.express as px
+
+        df_plot = (
+            donnees
+            .reset_index()
+            .sort_values("Année")
+            .melt(id_vars="Année", var_name="Indicateur", value_name="Valeur")
+        )
+        fig = px.line(
+            df_plot,
+            x="Année",
+            y="Valeur",
+            color="Indicateur",
+            markers=True,
+            title=f"Évolution - {titre}"
+        )
+        fig.update_traces(mode="lines+markers", line=dict(width=2), marker=dict(size=6))
+        fig.update_layout(template="plotly_white", hovermode="x unified", **(layout or {}))
+        spec = fig.to_json()
+        _figures_cache.set(cle, spec)
+    return json.loads(spec)
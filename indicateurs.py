@@ -0,0 +1,188 @@
+# indicateurs.py - Calcul vectorisé des indicateurs des six modules
+#
+# Chaque fonction prend les champs bruts de l'API (une ligne par commune et par
+# année, autant de lignes que l'on veut) et renvoie le tableau du module, avec
+# les mêmes colonnes que l'application affiche. Utilisé aussi bien pour une
+# commune (fetch_commune_*) que pour un département entier (flux paginé).
+import pandas as pd
+
+# Champs lus par chaque module, poussés dans `select` : l'API ne renvoie que
+# ces colonnes au lieu des ~200 champs d'un enregistrement complet
+MODULE_COLUMNS = {
+    "fonctionnement": ['an', 'pop1', 'prod', 'charge', 'fprod', 'mprod', 'fcharge', 'mcharge', 'fdgf', 'mdgf', 'fperso', 'mperso'],
+    "investissement": ['an', 'fequip', 'mequip', 'fprod', 'mprod'],
+    "caf": ['an', 'pop1', 'fcaf', 'mcaf', 'fprod', 'mprod', 'fcafn', 'mcafn'],
+    "fiscalite": ['an', 'fimpo1', 'mimpo1', 'fprod', 'mprod', 'tth', 'tmth', 'tfb', 'tmfb', 'tfnb', 'tmfnb'],
+    "endettement": ['an', 'fdette', 'mdette', 'fcaf', 'mcaf', 'fcafn', 'mcafn'],
+    "fdr": ['an', 'ffdr', 'mfdr', 'fcharge', 'mcharge'],
+}
+
+MODULES = list(MODULE_COLUMNS)
+
+# Identifiants conservés pour les requêtes multi-communes, et leur libellé
+IDENTIFIANTS = {"inom": "Commune", "dep": "Département", "icom": "Code commune"}
+
+def _projeter(df, module, identifiants):
+    colonnes = [c for c in MODULE_COLUMNS[module] if c in df.columns]
+    if not colonnes:
+        return None
+    if identifiants:
+        colonnes = [c for c in IDENTIFIANTS if c in df.columns] + colonnes
+    return df[colonnes].copy()
+
+def fonctionnement(df, identifiants=False):
+    """Recettes, dépenses, DGF, personnel et ratio personnel / DRF"""
+    df_fonctionnement = _projeter(df, "fonctionnement", identifiants)
+    if df_fonctionnement is None:
+        return None
+
+    df_fonctionnement.rename(columns={
+        "an": "Année",
+        "pop1": "Population",
+        "prod": "Recettes de fonctionnement",
+        "charge": "Dépenses de fonctionnement",
+        "fprod": "Recettes réelles fonctionnement / hab",
+        "mprod": "Moyenne strate Recettes / hab",
+        "fcharge": "Dépenses réelles fonctionnement / hab",
+        "mcharge": "Moyenne strate Dépenses / hab",
+        "fdgf": "DGF / habitant",
+        "mdgf": "Moyenne strate DGF / hab",
+        "fperso": "Dépenses personnel / hab",
+        "mperso": "Moyenne strate Personnel / hab",
+        **IDENTIFIANTS
+    }, inplace=True)
+
+    if "Dépenses personnel / hab" in df_fonctionnement.columns and "Dépenses réelles fonctionnement / hab" in df_fonctionnement.columns:
+        df_fonctionnement["Ratio Personnel/DRF Commune"] = (
+            df_fonctionnement["Dépenses personnel / hab"] /
+            df_fonctionnement["Dépenses réelles fonctionnement / hab"] * 100
+        ).round(2)
+
+    if "Moyenne strate Personnel / hab" in df_fonctionnement.columns and "Moyenne strate Dépenses / hab" in df_fonctionnement.columns:
+        df_fonctionnement["Ratio Personnel/DRF Moyenne"] = (
+            df_fonctionnement["Moyenne strate Personnel / hab"] /
+            df_fonctionnement["Moyenne strate Dépenses / hab"] * 100
+        ).round(2)
+
+    return df_fonctionnement
+
+def investissement(df, identifiants=False):
+    """Dépenses d'équipement par habitant et rapportées aux RRF"""
+    df = _projeter(df, "investissement", identifiants)
+    if df is None:
+        return None
+
+    df['Équipement / hab Commune'] = df['fequip']
+    df['Équipement / hab Moyenne'] = df['mequip']
+    df['Équipement / RRF Commune'] = (df['fequip'] / df['fprod'].replace(0, pd.NA) * 100).round(2)
+    df['Équipement / RRF Moyenne'] = (df['mequip'] / df['mprod'].replace(0, pd.NA) * 100).round(2)
+
+    df.rename(columns={'an': 'Année', **IDENTIFIANTS}, inplace=True)
+    return df
+
+def _ratio(numerateur, denominateur):
+    """numérateur / dénominateur en %, vide si le dénominateur est nul"""
+    return numerateur / denominateur.where(denominateur != 0) * 100
+
+def caf(df, identifiants=False):
+    """CAF brute et nette, par habitant et rapportées aux RRF"""
+    df_caf = _projeter(df, "caf", identifiants)
+    if df_caf is None:
+        return None
+
+    df_caf['CAF brute / RRF Commune'] = _ratio(df_caf['fcaf'], df_caf['fprod'])
+    df_caf['CAF brute / RRF Moyenne'] = _ratio(df_caf['mcaf'], df_caf['mprod'])
+    df_caf['CAF nette / RRF Commune'] = _ratio(df_caf['fcafn'], df_caf['fprod'])
+    df_caf['CAF nette / RRF Moyenne'] = _ratio(df_caf['mcafn'], df_caf['mprod'])
+
+    ids = [c for c in IDENTIFIANTS if c in df_caf.columns]
+    df_caf_final = df_caf[ids + ['an', 'pop1', 'fcaf', 'mcaf',
+                                 'CAF brute / RRF Commune', 'CAF brute / RRF Moyenne',
+                                 'CAF nette / RRF Commune', 'CAF nette / RRF Moyenne']].copy()
+    df_caf_final.rename(columns={
+        'an': 'Année',
+        'pop1': 'Population',
+        'fcaf': 'CAF brute / hab Commune',
+        'mcaf': 'CAF brute / hab Moyenne',
+        **IDENTIFIANTS
+    }, inplace=True)
+    return df_caf_final
+
+def fiscalite(df, identifiants=False):
+    """Impôts locaux par habitant, rapportés aux RRF, et taux TH / TFB / TFNB"""
+    df_fiscalite = _projeter(df, "fiscalite", identifiants)
+    if df_fiscalite is None:
+        return None
+
+    if 'fimpo1' in df_fiscalite.columns and 'fprod' in df_fiscalite.columns:
+        df_fiscalite['Impôts/RRF Commune'] = (df_fiscalite['fimpo1'] / df_fiscalite['fprod'].replace(0, pd.NA) * 100).round(2)
+    if 'mimpo1' in df_fiscalite.columns and 'mprod' in df_fiscalite.columns:
+        df_fiscalite['Impôts/RRF Moyenne'] = (df_fiscalite['mimpo1'] / df_fiscalite['mprod'].replace(0, pd.NA) * 100).round(2)
+
+    df_fiscalite.rename(columns={
+        'an': 'Année',
+        'fimpo1': 'Impôts / hab Commune',
+        'mimpo1': 'Impôts / hab Moyenne',
+        'tth': 'Taux TH Commune',
+        'tmth': 'Taux TH Moyenne',
+        'tfb': 'Taux TFB Commune',
+        'tmfb': 'Taux TFB Moyenne',
+        'tfnb': 'Taux TFNB Commune',
+        'tmfnb': 'Taux TFNB Moyenne',
+        **IDENTIFIANTS
+    }, inplace=True)
+    return df_fiscalite
+
+def endettement(df, identifiants=False):
+    """Dette par habitant, rapportée à la CAF, et capacité de désendettement"""
+    df = _projeter(df, "endettement", identifiants)
+    if df is None:
+        return None
+
+    df['Dette / hab Commune'] = df['fdette']
+    df['Dette / hab Moyenne'] = df['mdette']
+    df['Dette / RRF Commune'] = (df['fdette'] / df['fcaf'].replace(0, pd.NA) * 100).round(2)
+    df['Dette / RRF Moyenne'] = (df['mdette'] / df['mcaf'].replace(0, pd.NA) * 100).round(2)
+    df['Dette en années CAF Commune'] = (df['fdette'] / df['fcaf'].replace(0, pd.NA)).round(2)
+    df['Dette en années CAF Moyenne'] = (df['mdette'] / df['mcaf'].replace(0, pd.NA)).round(2)
+
+    df.rename(columns={'an': 'Année', **IDENTIFIANTS}, inplace=True)
+    return df
+
+def fdr(df, identifiants=False):
+    """Fonds de roulement par habitant et en jours de charges"""
+    df_fr = _projeter(df, "fdr", identifiants)
+    if df_fr is None:
+        return None
+
+    df_fr.rename(columns={
+        'an': 'Année',
+        'ffdr': 'FDR / hab Commune',
+        'mfdr': 'FDR / hab Moyenne',
+        'fcharge': 'Charges fonct / hab Commune',
+        'mcharge': 'Charges fonct / hab Moyenne',
+        **IDENTIFIANTS
+    }, inplace=True)
+
+    df_fr['FDR en jours DRF Commune'] = (
+        df_fr['FDR / hab Commune'] / df_fr['Charges fonct / hab Commune'].replace(0, pd.NA) * 365
+    ).round(2)
+    df_fr['FDR en jours DRF Moyenne'] = (
+        df_fr['FDR / hab Moyenne'] / df_fr['Charges fonct / hab Moyenne'].replace(0, pd.NA) * 365
+    ).round(2)
+
+    df_fr.drop(columns=['Charges fonct / hab Commune', 'Charges fonct / hab Moyenne'], inplace=True)
+    return df_fr
+
+BUILDERS = {
+    "fonctionnement": fonctionnement,
+    "investissement": investissement,
+    "caf": caf,
+    "fiscalite": fiscalite,
+    "endettement": endettement,
+    "fdr": fdr,
+}
+
+def build_indicateurs(module, df, identifiants=False):
+    """Tableau d'un module à partir des champs bruts ; None si aucun champ du module n'est présent"""
+    return BUILDERS[module](df, identifiants=identifiants)
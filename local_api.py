@@ -0,0 +1,387 @@
+# local_api.py - Serveur local au format Opendatasoft v2.1, sur le panel Parquet (panel_store)
+#
+# Implémente le sous-ensemble de l'API utilisé par l'application : /records avec
+# `where` (=, LIKE, IN, AND, OR, parenthèses), `select`, `limit` et `offset`, et
+# /exports/jsonl pour les flux au-delà de la fenêtre de 10 000 lignes. Les lignes
+# sont indexées par an, inom et dep : une requête sur une commune ne parcourt
+# que quelques lignes, le serveur tient des milliers de requêtes par seconde.
+#
+#   python panel_store.py build                        # une fois : data/panel/<année>.parquet
+#   python local_api.py --port 8766
+#   FOCUS_API_BASE_URL=http://127.0.0.1:8766/api/explore/v2.1 streamlit run prod.py
+import argparse
+import json
+import math
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+import panel_store
+from app_fetchers import DATASETS_MAPPING
+
+BASE_PATH = "/api/explore/v2.1"
+
+# Limites de /records (comme l'API réelle)
+LIMITE_MAX = 100
+FENETRE = 10_000
+
+# Champs indexés : ceux de toutes les requêtes de l'application
+CHAMPS_INDEXES = ("an", "inom", "dep")
+
+_CHEMIN_RE = re.compile(r"^/api/explore/v2\.1/catalog/datasets/([^/]+)/(records|exports/jsonl)$")
+
+class ErreurRequete(ValueError):
+    """Requête refusée (400), avec le code d'erreur Opendatasoft"""
+
+    def __init__(self, message, code="ODSQLError"):
+        super().__init__(message)
+        self.code = code
+
+# ==============================================================
+# ANALYSE DU WHERE
+# ==============================================================
+
+_JETON_RE = re.compile(r'\s*(?:(\()|(\))|(,)|("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')|(-?\d+(?:\.\d+)?)|(=)|(\w+))')
+
+def _jetons(where):
+    position, jetons = 0, []
+    where = where.strip()
+    while position < len(where):
+        match = _JETON_RE.match(where, position)
+        if not match or match.end() == position:
+            raise ErreurRequete(f"Syntaxe invalide près de : {where[position:position + 20]!r}")
+        ouvrante, fermante, virgule, texte, nombre, egal, mot = match.groups()
+        if texte is not None:
+            jetons.append(("valeur", texte[1:-1].replace('\\"', '"').replace("\\'", "'")))
+        elif nombre is not None:
+            jetons.append(("valeur", float(nombre) if "." in nombre else int(nombre)))
+        elif mot is not None and mot.upper() in ("AND", "OR", "LIKE", "IN"):
+            jetons.append((mot.upper(), None))
+        elif mot is not None:
+            jetons.append(("champ", mot))
+        else:
+            jetons.append((ouvrante or fermante or virgule or egal, None))
+        position = match.end()
+    return jetons
+
+def analyser_where(where):
+    """Arbre d'un `where` : ("and"|"or", [enfants]) ou (opérateur, champ, valeur(s)) ; None si vide"""
+    jetons = _jetons(where or "")
+    if not jetons:
+        return None
+    position = 0
+
+    def suivant(attendu=None):
+        nonlocal position
+        if position >= len(jetons):
+            raise ErreurRequete("Fin de clause inattendue")
+        jeton = jetons[position]
+        if attendu and jeton[0] != attendu:
+            raise ErreurRequete(f"{attendu} attendu, {jeton[0]} trouvé")
+        position += 1
+        return jeton
+
+    def regarder():
+        return jetons[position][0] if position < len(jetons) else None
+
+    def expression():
+        enfants = [terme()]
+        while regarder() == "OR":
+            suivant()
+            enfants.append(terme())
+        return enfants[0] if len(enfants) == 1 else ("or", enfants)
+
+    def terme():
+        enfants = [facteur()]
+        while regarder() == "AND":
+            suivant()
+            enfants.append(facteur())
+        return enfants[0] if len(enfants) == 1 else ("and", enfants)
+
+    def facteur():
+        if regarder() == "(":
+            suivant()
+            noeud = expression()
+            suivant(")")
+            return noeud
+        champ = suivant("champ")[1]
+        operateur = suivant()[0]
+        if operateur == "=":
+            return ("=", champ, suivant("valeur")[1])
+        if operateur == "LIKE":
+            return ("like", champ, suivant("valeur")[1])
+        if operateur == "IN":
+            suivant("(")
+            valeurs = [suivant("valeur")[1]]
+            while regarder() == ",":
+                suivant()
+                valeurs.append(suivant("valeur")[1])
+            suivant(")")
+            return ("in", champ, valeurs)
+        raise ErreurRequete(f"Opérateur non pris en charge : {operateur}")
+
+    arbre = expression()
+    if position != len(jetons):
+        raise ErreurRequete(f"Jeton inattendu : {jetons[position][0]}")
+    return arbre
+
+def _motif_like(motif):
+    """LIKE : % (toute suite) et _ (un caractère), sans tenir compte de la casse"""
+    regex = "".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in str(motif))
+    return re.compile(regex, re.IGNORECASE | re.DOTALL)
+
+# ==============================================================
+# TABLE D'UN DATASET
+# ==============================================================
+
+class TableDataset:
+    """Lignes des années d'un dataset, index par valeur sur CHAMPS_INDEXES"""
+
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        self.colonnes = list(self.df.columns)
+        self._valeurs = {c: self.df[c].to_numpy() for c in self.colonnes}
+        self._index = {}
+        for champ in CHAMPS_INDEXES:
+            if champ in self.df.columns:
+                positions = self.df.groupby(self.df[champ].astype(str), sort=False).indices
+                self._index[champ] = {cle: np.sort(pos) for cle, pos in positions.items()}
+        # Lignes converties en dict à la première lecture (NaN -> null)
+        self._lignes = [None] * len(self.df)
+
+    def __len__(self):
+        return len(self.df)
+
+    def ligne(self, i):
+        ligne = self._lignes[i]
+        if ligne is None:
+            ligne = {
+                c: None if isinstance(v, float) and math.isnan(v) else v.item() if isinstance(v, np.generic) else v
+                for c, v in zip(self.colonnes, (self._valeurs[c][i] for c in self.colonnes))
+            }
+            self._lignes[i] = ligne
+        return ligne
+
+    def _candidats(self, noeud):
+        """Positions candidates d'après les index (sur-ensemble du résultat), None : toutes"""
+        if noeud is None:
+            return None
+        genre = noeud[0]
+        if genre == "and":
+            ensembles = [e for e in (self._candidats(enfant) for enfant in noeud[1]) if e is not None]
+            return min(ensembles, key=len) if ensembles else None
+        if genre == "or":
+            ensembles = [self._candidats(enfant) for enfant in noeud[1]]
+            if any(e is None for e in ensembles):
+                return None
+            return np.unique(np.concatenate(ensembles))
+        champ = noeud[1]
+        index = self._index.get(champ)
+        if index is None or genre == "like":
+            return None
+        valeurs = [noeud[2]] if genre == "=" else noeud[2]
+        ensembles = [index.get(str(v)) for v in valeurs]
+        ensembles = [e for e in ensembles if e is not None]
+        return np.unique(np.concatenate(ensembles)) if ensembles else np.empty(0, dtype=np.intp)
+
+    def _masque(self, noeud, positions):
+        """Évaluation vectorisée d'un nœud sur les lignes `positions`"""
+        genre = noeud[0]
+        if genre in ("and", "or"):
+            masques = [self._masque(enfant, positions) for enfant in noeud[1]]
+            return np.logical_and.reduce(masques) if genre == "and" else np.logical_or.reduce(masques)
+
+        champ = noeud[1]
+        if champ not in self._valeurs:
+            raise ErreurRequete(f"Champ inconnu : {champ}")
+        colonne = self._valeurs[champ][positions]
+        if genre == "like":
+            motif = _motif_like(noeud[2])
+            return np.fromiter((v is not None and bool(motif.fullmatch(str(v))) for v in colonne),
+                               dtype=bool, count=len(colonne))
+        valeurs = [noeud[2]] if genre == "=" else noeud[2]
+        if colonne.dtype.kind in "iuf":
+            try:
+                return np.isin(colonne, [float(v) for v in valeurs])
+            except (TypeError, ValueError):
+                return np.zeros(len(colonne), dtype=bool)
+        return np.isin(colonne.astype(str), [str(v) for v in valeurs])
+
+    def filtrer(self, arbre):
+        """Positions (triées) des lignes qui vérifient le where"""
+        positions = self._candidats(arbre)
+        if positions is None:
+            positions = np.arange(len(self))
+        if arbre is None or not len(positions):
+            return positions
+        return positions[self._masque(arbre, positions)]
+
+# ==============================================================
+# API
+# ==============================================================
+
+def annees_du_dataset(dataset):
+    return sorted(annee for annee, nom in DATASETS_MAPPING.items() if nom == dataset)
+
+def _entier(params, nom, defaut):
+    try:
+        return int(params.get(nom, defaut))
+    except (TypeError, ValueError):
+        raise ErreurRequete(f"{nom} doit être un entier", code="InvalidRESTParameterError") from None
+
+class LocalAPI:
+    """Requêtes /records et /exports/jsonl sur le panel local, tables chargées à la première requête"""
+
+    def __init__(self, panel_dir=None):
+        self.panel_dir = panel_dir or panel_store.PANEL_DIR
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def table(self, dataset):
+        table = self._tables.get(dataset)
+        if table is None:
+            with self._lock:
+                table = self._tables.get(dataset)
+                if table is None:
+                    table = self._charger(dataset)
+                    self._tables[dataset] = table
+        return table
+
+    def _charger(self, dataset):
+        annees = annees_du_dataset(dataset)
+        if not annees:
+            raise ErreurRequete(f"Dataset inconnu : {dataset}", code="UnknownDataset")
+        frames = []
+        for annee in annees:
+            chemin = os.path.join(self.panel_dir, f"{annee}.parquet")
+            if os.path.exists(chemin):
+                frames.append(pd.read_parquet(chemin))
+        return TableDataset(pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["an", "inom", "dep"]))
+
+    def _selection(self, table, select):
+        if not select:
+            return table.colonnes
+        champs = [c.strip() for c in select.split(",") if c.strip()]
+        inconnus = [c for c in champs if c not in table.colonnes]
+        if inconnus:
+            raise ErreurRequete(f"Champ inconnu dans select : {', '.join(inconnus)}")
+        return champs
+
+    def records(self, dataset, params):
+        """Réponse /records : {"total_count", "results"}"""
+        limit = _entier(params, "limit", 10)
+        offset = _entier(params, "offset", 0)
+        if not 0 <= limit <= LIMITE_MAX:
+            raise ErreurRequete(f"limit doit être compris entre 0 et {LIMITE_MAX}", code="InvalidRESTParameterError")
+        if offset < 0 or offset + limit > FENETRE:
+            raise ErreurRequete(f"offset + limit doit rester inférieur à {FENETRE}", code="InvalidRESTParameterError")
+
+        table = self.table(dataset)
+        champs = self._selection(table, params.get("select"))
+        positions = table.filtrer(analyser_where(params.get("where")))
+        resultats = []
+        for i in positions[offset:offset + limit]:
+            ligne = table.ligne(int(i))
+            resultats.append({c: ligne[c] for c in champs})
+        return {"total_count": int(len(positions)), "results": resultats}
+
+    def iter_export_jsonl(self, dataset, params):
+        """Lignes de /exports/jsonl (toutes les lignes, sans limite)"""
+        table = self.table(dataset)
+        champs = self._selection(table, params.get("select"))
+        for i in table.filtrer(analyser_where(params.get("where"))):
+            ligne = table.ligne(int(i))
+            yield (json.dumps({c: ligne[c] for c in champs}, ensure_ascii=False) + "\n").encode("utf-8")
+
+class LocalAPIServer:
+    """Serveur HTTP multi-thread devant une LocalAPI"""
+
+    def __init__(self, api=None, host="127.0.0.1", port=0):
+        self.api = api or LocalAPI()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{BASE_PATH}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="local-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _handler(self):
+        api = self.api
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _envoyer(self, statut, corps, type_contenu="application/json; charset=utf-8"):
+                self.send_response(statut)
+                self.send_header("Content-Type", type_contenu)
+                self.send_header("Content-Length", str(len(corps)))
+                self.end_headers()
+                self.wfile.write(corps)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                match = _CHEMIN_RE.match(url.path)
+                if not match:
+                    self._envoyer(404, b'{"error_code": "NotFound", "message": "Chemin inconnu"}')
+                    return
+                dataset, ressource = match.groups()
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                try:
+                    if ressource == "records":
+                        corps = json.dumps(api.records(dataset, params), ensure_ascii=False).encode("utf-8")
+                        self._envoyer(200, corps)
+                    else:
+                        corps = b"".join(api.iter_export_jsonl(dataset, params))
+                        self._envoyer(200, corps, "application/jsonlines; charset=utf-8")
+                except ErreurRequete as e:
+                    erreur = {"error_code": e.code, "message": str(e)}
+                    self._envoyer(400, json.dumps(erreur, ensure_ascii=False).encode("utf-8"))
+                except Exception as e:
+                    # Réponse plutôt que connexion coupée (le client rejouerait la requête)
+                    erreur = {"error_code": "InternalError", "message": f"{type(e).__name__} : {e}"}
+                    self._envoyer(500, json.dumps(erreur, ensure_ascii=False).encode("utf-8"))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API /records locale sur le panel Parquet (hors ligne, tests de charge)")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--panel-dir", default=panel_store.PANEL_DIR)
+    args = parser.parse_args(argv)
+
+    serveur = LocalAPIServer(LocalAPI(args.panel_dir), host=args.host, port=args.port)
+    print(f"FOCUS_API_BASE_URL={serveur.base_url}")
+    try:
+        serveur.start()._thread.join()
+    except KeyboardInterrupt:
+        serveur.stop()
+
+if __name__ == "__main__":
+    main()
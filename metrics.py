@@ -0,0 +1,220 @@
+# metrics.py - Instrumentation des appels API (latence, octets, cache, retries, résultats vides)
+#
+# Les mesures sont agrégées en mémoire par (dataset, année, module) et exportées au
+# format texte Prometheus ou en JSON, soit sur la page Diagnostic, soit via un petit
+# serveur HTTP local (FOCUS_METRICS_PORT) que Prometheus peut scraper.
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bornes (secondes) de l'histogramme de latence
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_DATASET_RE = re.compile(r"/datasets/([^/]+)/")
+_ANNEE_RE = re.compile(r'\ban\s*=\s*"?(\d{4})"?')
+
+def labels_for_request(api_url, params, module=None, annee=None):
+    """Déduit les labels (dataset, année, module) d'une requête API"""
+    match = _DATASET_RE.search(api_url)
+    dataset = match.group(1) if match else api_url
+    if annee is None:
+        match = _ANNEE_RE.search(str(params.get("where", "")))
+        annee = match.group(1) if match else ""
+    return (dataset, str(annee), module or "autre")
+
+class _RequestStats:
+    __slots__ = ("requests", "errors", "empty", "coalesced", "cache_hits", "cache_misses", "retries", "bytes",
+                 "latency_sum", "latency_buckets")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.empty = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.retries = 0
+        self.bytes = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+
+class MetricsRegistry:
+    """Agrégats thread-safe des appels API, indexés par (dataset, année, module)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._missing = {}
+        self.started_at = time.time()
+
+    def _get(self, labels):
+        stats = self._stats.get(labels)
+        if stats is None:
+            stats = self._stats[labels] = _RequestStats()
+        return stats
+
+    def record_request(self, labels, latency, payload_bytes=0, retries=0, empty=False, error=False):
+        with self._lock:
+            stats = self._get(labels)
+            stats.requests += 1
+            stats.bytes += payload_bytes
+            stats.retries += retries
+            stats.latency_sum += latency
+            stats.empty += int(bool(empty))
+            stats.errors += int(bool(error))
+            for i, borne in enumerate(LATENCY_BUCKETS):
+                if latency <= borne:
+                    stats.latency_buckets[i] += 1
+
+    def record_coalesced(self, labels):
+        """Appel servi par une requête identique déjà en vol (aucun HTTP émis)"""
+        with self._lock:
+            self._get(labels).coalesced += 1
+
+    def record_cache(self, labels, hit):
+        """Réponse lue dans le cache des réponses (mémoire ou disque), ou absente"""
+        with self._lock:
+            stats = self._get(labels)
+            if hit:
+                stats.cache_hits += 1
+            else:
+                stats.cache_misses += 1
+
+    def record_missing(self, module, annee):
+        """Année introuvable pour un module après essai de toutes les variantes"""
+        key = (module, str(annee))
+        with self._lock:
+            self._missing[key] = self._missing.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._missing.clear()
+            self.started_at = time.time()
+
+    def snapshot(self):
+        """Copie des agrégats sous forme de liste de dicts (une ligne par labels)"""
+        with self._lock:
+            lignes = []
+            for (dataset, annee, module), s in sorted(self._stats.items()):
+                lignes.append({
+                    "dataset": dataset,
+                    "annee": annee,
+                    "module": module,
+                    "requetes": s.requests,
+                    "coalescees": s.coalesced,
+                    "cache_hits": s.cache_hits,
+                    "cache_misses": s.cache_misses,
+                    "erreurs": s.errors,
+                    "vides": s.empty,
+                    "retries": s.retries,
+                    "octets": s.bytes,
+                    "latence_totale_s": round(s.latency_sum, 4),
+                    "latence_moyenne_s": round(s.latency_sum / s.requests, 4) if s.requests else None,
+                    "latence_buckets": dict(zip([str(b) for b in LATENCY_BUCKETS], s.latency_buckets)),
+                })
+            manquants = [
+                {"module": module, "annee": annee, "total": total}
+                for (module, annee), total in sorted(self._missing.items())
+            ]
+        return lignes, manquants
+
+    def to_json(self):
+        from caches import cache_stats
+
+        lignes, manquants = self.snapshot()
+        return json.dumps({
+            "depuis": self.started_at,
+            "requetes": lignes,
+            "annees_manquantes": manquants,
+            "caches": cache_stats(),
+        }, ensure_ascii=False, indent=2, default=str)
+
+    def to_prometheus(self):
+        from caches import cache_stats
+
+        lignes, manquants = self.snapshot()
+        out = []
+
+        def serie(nom, type_, aide, valeurs):
+            out.append(f"# HELP {nom} {aide}")
+            out.append(f"# TYPE {nom} {type_}")
+            out.extend(valeurs)
+
+        def lbl(ligne, **extra):
+            labels = {"dataset": ligne["dataset"], "annee": ligne["annee"], "module": ligne["module"], **extra}
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+        serie("focus_api_requests_total", "counter", "Requêtes HTTP émises vers l'API",
+              [f"focus_api_requests_total{lbl(l)} {l['requetes']}" for l in lignes])
+        serie("focus_api_coalesced_total", "counter", "Appels servis par une requête identique en vol",
+              [f"focus_api_coalesced_total{lbl(l)} {l['coalescees']}" for l in lignes])
+        serie("focus_api_cache_hits_total", "counter", "Réponses lues dans le cache des réponses (mémoire ou disque)",
+              [f"focus_api_cache_hits_total{lbl(l)} {l['cache_hits']}" for l in lignes])
+        serie("focus_api_cache_misses_total", "counter", "Réponses absentes du cache des réponses",
+              [f"focus_api_cache_misses_total{lbl(l)} {l['cache_misses']}" for l in lignes])
+        serie("focus_api_errors_total", "counter", "Requêtes en échec (réseau ou JSON invalide)",
+              [f"focus_api_errors_total{lbl(l)} {l['erreurs']}" for l in lignes])
+        serie("focus_api_empty_results_total", "counter", "Réponses sans résultat",
+              [f"focus_api_empty_results_total{lbl(l)} {l['vides']}" for l in lignes])
+        serie("focus_api_retries_total", "counter", "Nouvelles tentatives après erreur transitoire",
+              [f"focus_api_retries_total{lbl(l)} {l['retries']}" for l in lignes])
+        serie("focus_api_response_bytes_total", "counter", "Octets reçus de l'API",
+              [f"focus_api_response_bytes_total{lbl(l)} {l['octets']}" for l in lignes])
+
+        histo = []
+        for l in lignes:
+            for borne, total in l["latence_buckets"].items():
+                histo.append(f"focus_api_request_duration_seconds_bucket{lbl(l, le=borne)} {total}")
+            histo.append(f"focus_api_request_duration_seconds_bucket{lbl(l, le='+Inf')} {l['requetes']}")
+            histo.append(f"focus_api_request_duration_seconds_sum{lbl(l)} {l['latence_totale_s']}")
+            histo.append(f"focus_api_request_duration_seconds_count{lbl(l)} {l['requetes']}")
+        serie("focus_api_request_duration_seconds", "histogram", "Latence des requêtes API", histo)
+
+        serie("focus_fetch_missing_years_total", "counter", "Années introuvables par module",
+              [f'focus_fetch_missing_years_total{{module="{_escape(m["module"])}",annee="{m["annee"]}"}} {m["total"]}'
+               for m in manquants])
+
+        caches = cache_stats()
+        for champ, nom in (("hits", "hits"), ("misses", "misses"), ("evictions", "evictions"), ("entrées", "entries")):
+            type_ = "gauge" if champ == "entrées" else "counter"
+            suffixe = "" if type_ == "gauge" else "_total"
+            serie(f"focus_cache_{nom}{suffixe}", type_, f"Caches applicatifs : {nom}",
+                  [f'focus_cache_{nom}{suffixe}{{cache="{_escape(c["cache"])}"}} {c[champ]}'
+                   for c in caches if c[champ] is not None])
+
+        return "\n".join(out) + "\n"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# Registre global du processus
+registry = MetricsRegistry()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, content_type = registry.to_json(), "application/json; charset=utf-8"
+        elif self.path.startswith("/metrics"):
+            body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Démarre l'exposition /metrics et /metrics.json dans un thread daemon"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="focus-metrics", daemon=True)
+    thread.start()
+    return server
@@ -1,10 +1,12 @@
 import streamlit as st
 import pandas as pd
 import requests
-import plotly.express as px
 import re
 from functools import lru_cache
 from difflib import SequenceMatcher
+from app_fetchers import API_BASE_URL, MODULE_COLUMNS, api_get_json, select_for
+from cles import cle_commune, code_departement
+from figures import cle_figure, figure_evolution
 
 # Mapping des années vers les nouveaux datasets
 DATASETS_MAPPING = {
@@ -23,7 +25,7 @@ def get_dataset_for_year(annee):
 def get_api_url_for_year(annee):
     """Retourne l'URL de l'API pour une année donnée"""
     dataset = get_dataset_for_year(annee)
-    return f"https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/{dataset}/records"
+    return f"{API_BASE_URL}/catalog/datasets/{dataset}/records"
 
 class RobustCommuneFetcher:
     """Version adaptée aux nouveaux datasets"""
@@ -50,7 +52,7 @@ class RobustCommuneFetcher:
     
     def find_commune_variants(self, commune, departement=None):
         """Trouve les variantes d'une commune dans tous les datasets"""
-        cache_key = f"{commune}_{departement}"
+        cache_key = commune, departement = cle_commune(commune, departement)
         if cache_key in self._cache:
             return self._cache[cache_key]
         
@@ -61,7 +63,7 @@ class RobustCommuneFetcher:
         datasets_to_search = list(set(DATASETS_MAPPING.values()))
         
         for dataset in datasets_to_search:
-            api_url = f"https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/{dataset}/records"
+            api_url = f"{API_BASE_URL}/catalog/datasets/{dataset}/records"
             
             for term in search_terms:
                 where_clause = f'inom LIKE "%{term}%"'
@@ -72,8 +74,7 @@ class RobustCommuneFetcher:
                 params = {"where": where_clause, "limit": 50, "select": "inom,dep"}
                 
                 try:
-                    response = requests.get(api_url, params=params, timeout=10)
-                    data = response.json()
+                    data = api_get_json(api_url, params, module="variantes")
                     
                     if "results" in data:
                         for record in data["results"]:
@@ -118,17 +119,16 @@ class RobustCommuneFetcher:
 def get_fetcher():
     return RobustCommuneFetcher()
 
-def fetch_commune_caf(commune, annees, departement=None):
-    """Version robuste adaptée aux nouveaux datasets"""
-    
-    fetcher = get_fetcher()
+def _fetch_commune_caf(fetcher, commune, annees, departement, messages):
+    """Données de la page sans appel Streamlit : les messages (niveau, texte) vont dans `messages`"""
+    departement = code_departement(departement)
     
     # 1. Trouve les variantes
     variants = fetcher.find_commune_variants(commune, departement)
     
     if len(variants) > 1:
         variant_names = [v["nom"] for v in variants]
-        st.info(f"🔍 Variantes détectées: {', '.join(set(variant_names))}")
+        messages.append(("info", f"🔍 Variantes détectées: {', '.join(set(variant_names))}"))
     
     # 2. Récupère les données année par année
     dfs = []
@@ -145,17 +145,16 @@ def fetch_commune_caf(commune, annees, departement=None):
             if dept:
                 where_clause += f' AND dep="{dept}"'
             
-            params = {"where": where_clause, "limit": 100}
+            params = {"where": where_clause, "limit": 100, "select": select_for("caf")}
             
             try:
-                response = requests.get(api_url, params=params, timeout=10)
-                data = response.json()
+                data = api_get_json(api_url, params, module="page_caf")
 
                 if "results" not in data or not data["results"]:
                     continue
 
                 df = pd.DataFrame(data["results"])
-                colonnes_calc = ['an', 'pop1', 'fcaf', 'mcaf', 'fprod', 'mprod', 'fcafn', 'mcafn']
+                colonnes_calc = MODULE_COLUMNS["caf"]
                 colonnes_existantes = [c for c in colonnes_calc if c in df.columns]
                 
                 if not colonnes_existantes:
@@ -192,18 +191,32 @@ def fetch_commune_caf(commune, annees, departement=None):
                 continue
         
         if not annee_trouvee:
-            st.warning(f"⚠️ Données CAF non trouvées pour {commune} en {annee}")
+            messages.append(("warning", f"⚠️ Données CAF non trouvées pour {commune} en {annee}"))
 
     # 3. Résultat final
     if dfs:
         result = pd.concat(dfs, ignore_index=True)
         result.sort_values("Année", inplace=True)
-        st.success(f"✅ Données CAF récupérées: {len(result)} lignes sur {len(annees)} années demandées")
+        messages.append(("success", f"✅ Données CAF récupérées: {len(result)} lignes sur {len(annees)} années demandées"))
         return result
     else:
-        st.warning(f"❌ Aucune donnée CAF trouvée pour '{commune}'")
+        messages.append(("warning", f"❌ Aucune donnée CAF trouvée pour '{commune}'"))
         return pd.DataFrame()
 
+def fetch_commune_caf(commune, annees, departement=None):
+    """Version robuste adaptée aux nouveaux datasets"""
+    messages = []
+    resultat = _fetch_commune_caf(get_fetcher(), commune, annees, departement, messages)
+    for niveau, texte in messages:
+        getattr(st, niveau)(texte)
+    return resultat
+
+def precharger(commune, annees, departement=None):
+    """Requêtes de la page, sans appel Streamlit (préchargement en tâche de fond)"""
+    # Fetcher propre au préchargement : st.cache_resource exige une session
+    fetcher = RobustCommuneFetcher()
+    _fetch_commune_caf(fetcher, commune, annees, departement, [])
+
 def run(commune=None, annees=None, departement=None):
     """Votre fonction run - CODE ORIGINAL + fetch robuste mis à jour"""
     global table_caf  # <- important pour l'export
@@ -231,6 +244,8 @@ def run(commune=None, annees=None, departement=None):
 
         table_caf = caf.copy()  # on stocke pour export
 
+        cle = cle_figure("caf", commune_selectionnee, departement_selectionne, annees)
+
         mini_tableaux = {
             "CAF brute / habitant": ["CAF brute / habitant Commune", "CAF brute / habitant Moyenne"],
             "CAF brute / RRF": ["CAF brute / RRF Commune", "CAF brute / RRF Moyenne"],
@@ -243,20 +258,7 @@ def run(commune=None, annees=None, departement=None):
                     st.dataframe(caf.set_index('Année')[colonnes].T)
 
                     try:
-                        df_plot = caf[colonnes].copy()
-                        df_plot['Année'] = caf['Année']
-                        df_plot = df_plot.melt(id_vars="Année", var_name="Indicateur", value_name="Valeur")
-
-                        fig = px.line(
-                            df_plot,
-                            x="Année",
-                            y="Valeur",
-                            color="Indicateur",
-                            markers=True,
-                            title=f"Évolution - {titre}"
-                        )
-                        fig.update_traces(mode="lines+markers", line=dict(width=2), marker=dict(size=6))
-                        fig.update_layout(template="plotly_white", hovermode="x unified")
+                        fig = figure_evolution(caf, colonnes, titre, cle)
                         st.plotly_chart(fig, use_container_width=True)
                     except Exception as e:
                         st.warning(f"Impossible d'afficher le graphique pour {titre} ({e})")
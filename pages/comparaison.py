@@ -0,0 +1,159 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import requests
+
+from app_fetchers import fetch_communes
+from caches import MemoryBudgetCache
+from cles import annees_canoniques, cle_commune
+
+NB_COMMUNES_MAX = 12
+
+# Mini-tableaux par module : titre -> colonne commune (indicateurs.py)
+MINI_TABLEAUX = {
+    "Fonctionnement": ("fonctionnement", {
+        "Population": "Population",
+        "RRF / habitant": "Recettes réelles fonctionnement / hab",
+        "DRF / habitant": "Dépenses réelles fonctionnement / hab",
+        "Dotation Globale de Fonctionnement / habitant": "DGF / habitant",
+        "Dépenses de personnel / habitant": "Dépenses personnel / hab",
+        "Dépenses de personnel / DRF": "Ratio Personnel/DRF Commune",
+    }),
+    "CAF": ("caf", {
+        "CAF brute / habitant": "CAF brute / hab Commune",
+        "CAF brute / RRF": "CAF brute / RRF Commune",
+        "CAF nette / RRF": "CAF nette / RRF Commune",
+    }),
+    "Fiscalité": ("fiscalite", {
+        "Impôts / habitant": "Impôts / hab Commune",
+        "Impôts / RRF": "Impôts/RRF Commune",
+        "Taux TFB": "Taux TFB Commune",
+        "Taux TFNB": "Taux TFNB Commune",
+    }),
+    "Endettement": ("endettement", {
+        "Dette / habitant": "Dette / hab Commune",
+        "Dette en années de CAF": "Dette en années CAF Commune",
+    }),
+    "Investissement": ("investissement", {
+        "Équipement / habitant": "Équipement / hab Commune",
+        "Équipement / RRF": "Équipement / RRF Commune",
+    }),
+    "Fonds de roulement": ("fdr", {
+        "FDR / habitant": "FDR / hab Commune",
+        "FDR en jours de DRF": "FDR en jours DRF Commune",
+    }),
+}
+
+def lire_communes(texte):
+    """Une commune par ligne, « NOM » ou « NOM;département » -> [(nom, département)] sans doublon"""
+    communes = []
+    for ligne in texte.splitlines():
+        nom, _, departement = ligne.partition(";")
+        nom, departement = cle_commune(nom, departement)
+        if nom and (nom, departement) not in communes:
+            communes.append((nom, departement))
+    return communes
+
+# Six tableaux par sélection de communes : cache borné en octets (page Diagnostic)
+COMPARAISONS_CACHE_BUDGET = 32 * 2**20
+COMPARAISONS_CACHE_TTL = 6 * 3600
+
+_comparaisons_cache = MemoryBudgetCache(COMPARAISONS_CACHE_BUDGET, ttl=COMPARAISONS_CACHE_TTL, name="comparaisons")
+
+def charger_comparaison(communes, annees):
+    """Six modules pour toutes les communes, une requête paginée par dataset.
+
+    Retourne des copies : la page peut modifier les tableaux sans toucher au cache.
+    """
+    cle = (tuple(communes), tuple(annees))
+    data = _comparaisons_cache.get(cle)
+    if data is None:
+        data = fetch_communes(list(communes), list(annees))
+        # Libellé « NOM (dép.) » : distingue les homonymes de départements différents
+        for df in data.values():
+            if not df.empty:
+                df["Libellé"] = df["Commune"] + " (" + df["Département"].astype(str) + ")"
+        _comparaisons_cache.set(cle, data)
+    return {module: df.copy() for module, df in data.items()}
+
+def mini_tableau(df, colonne):
+    """Communes en lignes, années en colonnes"""
+    return df.pivot_table(index="Libellé", columns="Année", values=colonne, aggfunc="first")
+
+def graphique(df, titre, colonne):
+    df_plot = df[["Libellé", "Année", colonne]].dropna().sort_values("Année")
+    fig = px.line(
+        df_plot,
+        x="Année",
+        y=colonne,
+        color="Libellé",
+        markers=True,
+        title=f"Évolution - {titre}",
+        labels={colonne: "Valeur", "Libellé": "Commune"}
+    )
+    fig.update_traces(mode="lines+markers", line=dict(width=2), marker=dict(size=6))
+    fig.update_layout(template="plotly_white", hovermode="x unified")
+    return fig
+
+def run(commune=None, annees=None, departement=None):
+    """Comparaison de plusieurs communes sur les six modules"""
+    st.title("⚖️ Comparaison de communes")
+
+    valeur_defaut = f"{commune};{departement or ''}" if commune else ""
+    texte = st.text_area(
+        f"Communes à comparer (une par ligne, « NOM;département », {NB_COMMUNES_MAX} au plus) :",
+        value=valeur_defaut,
+        height=150
+    )
+    annees_disponibles = list(range(2024, 2018, -1))
+    annees = st.multiselect(
+        "Sélectionnez les années à afficher :",
+        options=annees_disponibles,
+        default=annees or annees_disponibles
+    )
+
+    communes = lire_communes(texte)
+    if len(communes) > NB_COMMUNES_MAX:
+        st.warning(f"⚠️ Seules les {NB_COMMUNES_MAX} premières communes sont comparées.")
+        communes = communes[:NB_COMMUNES_MAX]
+
+    if not communes or not annees:
+        st.info("Saisissez au moins une commune et une année.")
+        return
+
+    try:
+        with st.spinner(f"📥 Chargement de {len(communes)} commune(s)..."):
+            data = charger_comparaison(tuple(communes), annees_canoniques(annees))
+    except requests.RequestException as e:
+        st.error(f"❌ Erreur lors de la récupération des données : {e}")
+        return
+
+    trouvees = set()
+    for df in data.values():
+        if not df.empty:
+            trouvees.update(df["Commune"])
+    manquantes = [nom for nom, _ in communes if nom not in trouvees]
+    if manquantes:
+        st.warning(f"❌ Aucune donnée pour : {', '.join(manquantes)}")
+    if not trouvees:
+        return
+
+    st.success(f"✅ {len(trouvees)} commune(s) comparée(s) sur {len(annees)} année(s)")
+
+    for section, (module, mini_tableaux) in MINI_TABLEAUX.items():
+        df = data.get(module)
+        if df is None or df.empty:
+            continue
+        with st.expander(section):
+            for titre, colonne in mini_tableaux.items():
+                if colonne not in df.columns:
+                    continue
+                with st.expander(titre):
+                    st.dataframe(mini_tableau(df, colonne))
+                    try:
+                        st.plotly_chart(graphique(df, titre, colonne), use_container_width=True)
+                    except Exception as e:
+                        st.warning(f"Impossible d'afficher le graphique pour {titre} ({e})")
+
+if __name__ == "__main__":
+    run()
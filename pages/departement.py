@@ -0,0 +1,185 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import requests
+
+from app_fetchers import fetch_departement
+from caches import MemoryBudgetCache
+from cles import annees_canoniques, code_departement
+
+# Indicateurs clés par module : (libellé, colonne commune, colonne moyenne de strate)
+INDICATEURS_CLES = {
+    "fonctionnement": [
+        ("RRF / hab", "Recettes réelles fonctionnement / hab", "Moyenne strate Recettes / hab"),
+        ("DRF / hab", "Dépenses réelles fonctionnement / hab", "Moyenne strate Dépenses / hab"),
+        ("Personnel / DRF (%)", "Ratio Personnel/DRF Commune", "Ratio Personnel/DRF Moyenne"),
+    ],
+    "caf": [
+        ("CAF brute / hab", "CAF brute / hab Commune", "CAF brute / hab Moyenne"),
+        ("CAF brute / RRF (%)", "CAF brute / RRF Commune", "CAF brute / RRF Moyenne"),
+    ],
+    "fiscalite": [
+        ("Impôts / hab", "Impôts / hab Commune", "Impôts / hab Moyenne"),
+        ("Taux TFB (%)", "Taux TFB Commune", "Taux TFB Moyenne"),
+    ],
+    "endettement": [
+        ("Dette / hab", "Dette / hab Commune", "Dette / hab Moyenne"),
+        ("Dette en années de CAF", "Dette en années CAF Commune", "Dette en années CAF Moyenne"),
+    ],
+    "investissement": [
+        ("Équipement / hab", "Équipement / hab Commune", "Équipement / hab Moyenne"),
+    ],
+    "fdr": [
+        ("FDR en jours de DRF", "FDR en jours DRF Commune", "FDR en jours DRF Moyenne"),
+    ],
+}
+
+CLES = ["Commune", "Code commune", "Année"]
+
+# Six tableaux de plusieurs Mo par département : cache borné en octets (page Diagnostic)
+DEPARTEMENTS_CACHE_BUDGET = 64 * 2**20
+DEPARTEMENTS_CACHE_TTL = 6 * 3600
+
+_departements_cache = MemoryBudgetCache(DEPARTEMENTS_CACHE_BUDGET, ttl=DEPARTEMENTS_CACHE_TTL, name="departements")
+
+def charger_departement(departement, annees):
+    """Indicateurs des six modules pour toutes les communes du département (requêtes paginées).
+
+    Retourne des copies : la page peut modifier les tableaux sans toucher au cache.
+    """
+    cle = (departement, tuple(annees))
+    data = _departements_cache.get(cle)
+    if data is None:
+        data = fetch_departement(departement, list(annees))
+        _departements_cache.set(cle, data)
+    return {module: df.copy() for module, df in data.items()}
+
+def tableau_departement(data, annee):
+    """Une ligne par commune : population et indicateurs clés des six modules pour une année"""
+    tableau = None
+    for module, indicateurs in INDICATEURS_CLES.items():
+        df = data.get(module)
+        if df is None or df.empty:
+            continue
+        colonnes = [c for _, c, _ in indicateurs if c in df.columns]
+        if module == "fonctionnement" and "Population" in df.columns:
+            colonnes = ["Population"] + colonnes
+        df = df.loc[df["Année"].astype(str) == str(annee), CLES + colonnes]
+        tableau = df if tableau is None else tableau.merge(df, on=CLES, how="outer")
+
+    if tableau is None:
+        return pd.DataFrame()
+    libelles = {c: libelle for indicateurs in INDICATEURS_CLES.values() for libelle, c, _ in indicateurs}
+    return tableau.drop(columns="Année").rename(columns=libelles).sort_values("Commune")
+
+def nuage_strate(df, titre, colonne_commune, colonne_moyenne, commune=None):
+    """Valeur de chaque commune face à la moyenne de sa strate, diagonale = moyenne"""
+    df_plot = df.dropna(subset=[colonne_commune, colonne_moyenne])
+    if df_plot.empty:
+        return None
+
+    hover = ["Population"] if "Population" in df_plot.columns else None
+    fig = px.scatter(
+        df_plot,
+        x=colonne_moyenne,
+        y=colonne_commune,
+        hover_name="Commune",
+        hover_data=hover,
+        opacity=0.7,
+        render_mode="webgl",
+        title=titre,
+        labels={colonne_moyenne: "Moyenne de la strate", colonne_commune: "Commune"}
+    )
+    borne_min = min(df_plot[colonne_moyenne].min(), df_plot[colonne_commune].min())
+    borne_max = max(df_plot[colonne_moyenne].max(), df_plot[colonne_commune].max())
+    fig.add_shape(type="line", x0=borne_min, y0=borne_min, x1=borne_max, y1=borne_max,
+                  line=dict(color="grey", dash="dash"))
+
+    if commune:
+        selection = df_plot[df_plot["Commune"] == commune]
+        if not selection.empty:
+            fig.add_scatter(x=selection[colonne_moyenne], y=selection[colonne_commune], mode="markers",
+                            marker=dict(size=14, color="crimson", symbol="star"), name=commune)
+
+    fig.update_layout(template="plotly_white", showlegend=bool(commune))
+    return fig
+
+def run(commune=None, annees=None, departement=None):
+    """Toutes les communes d'un département : indicateurs clés et position face à la strate"""
+    st.title("🗺️ Communes du département")
+
+    departement_selectionne = st.text_input("Département :", value=departement or "")
+    annees_disponibles = list(range(2024, 2018, -1))
+    annees = st.multiselect(
+        "Sélectionnez les années à charger :",
+        options=annees_disponibles,
+        default=annees or annees_disponibles
+    )
+
+    if not departement_selectionne or not annees:
+        st.info("Saisissez un département et au moins une année.")
+        return
+
+    try:
+        with st.spinner(f"📥 Chargement des communes du département {departement_selectionne}..."):
+            data = charger_departement(code_departement(departement_selectionne), annees_canoniques(annees))
+    except requests.RequestException as e:
+        st.error(f"❌ Erreur lors de la récupération des données : {e}")
+        return
+
+    if all(df.empty for df in data.values()):
+        st.warning("Aucune donnée disponible pour ce département et ces années.")
+        return
+
+    annee = st.selectbox("Année affichée :", sorted(annees, reverse=True))
+    tableau = tableau_departement(data, annee)
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Communes", len(tableau))
+    if "Population" in tableau.columns:
+        col2.metric("Population totale", f"{tableau['Population'].sum():,.0f}".replace(",", " "))
+    if "CAF brute / hab" in tableau.columns:
+        col3.metric("CAF brute / hab (médiane)", f"{tableau['CAF brute / hab'].median():.0f} €")
+
+    st.markdown("### Indicateurs clés")
+    recherche = st.text_input("Filtrer les communes :", "")
+    tableau_affiche = tableau
+    if recherche:
+        tableau_affiche = tableau[tableau["Commune"].str.contains(recherche.upper(), regex=False, na=False)]
+    # Tri en cliquant sur l'en-tête d'une colonne
+    st.dataframe(tableau_affiche, use_container_width=True, hide_index=True)
+    st.download_button(
+        label="💾 Télécharger le tableau (CSV)",
+        data=tableau.to_csv(index=False, sep=";").encode("utf-8-sig"),
+        file_name=f"departement_{departement_selectionne}_{annee}.csv",
+        mime="text/csv"
+    )
+
+    st.markdown("### Position face à la strate")
+    choix = {
+        libelle: (module, colonne_commune, colonne_moyenne)
+        for module, indicateurs in INDICATEURS_CLES.items()
+        for libelle, colonne_commune, colonne_moyenne in indicateurs
+    }
+    libelle = st.selectbox("Indicateur :", list(choix))
+    module, colonne_commune, colonne_moyenne = choix[libelle]
+
+    df_module = data[module]
+    if df_module.empty:
+        st.warning(f"Aucune donnée {module} pour ce département.")
+        return
+    df_annee = df_module[df_module["Année"].astype(str) == str(annee)]
+    if "Population" not in df_annee.columns and not data["fonctionnement"].empty:
+        population = data["fonctionnement"][["Commune", "Code commune", "Année", "Population"]]
+        df_annee = df_annee.merge(population, on=CLES, how="left")
+
+    fig = nuage_strate(df_annee, f"{libelle} - {annee}", colonne_commune, colonne_moyenne, commune)
+    if fig is None:
+        st.warning(f"Pas de valeurs pour {libelle} en {annee}.")
+    else:
+        st.plotly_chart(fig, use_container_width=True)
+        au_dessus = (df_annee[colonne_commune] > df_annee[colonne_moyenne]).sum()
+        st.caption(f"{au_dessus} commune(s) sur {df_annee[colonne_commune].notna().sum()} au-dessus de la moyenne de leur strate.")
+
+if __name__ == "__main__":
+    run()
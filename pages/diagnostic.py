@@ -0,0 +1,84 @@
+import streamlit as st
+import pandas as pd
+
+from caches import cache_stats, reset_caches
+from metrics import registry as metrics
+from profiling import PROFILING_ENABLED, RECENT_TIMELINES
+
+def run():
+    """Page d'administration : état des caches et des appels API du processus"""
+    st.title("🛠️ Diagnostic")
+
+    st.markdown("### Caches (mémoire et disque)")
+    stats = cache_stats()
+    if stats:
+        st.dataframe(pd.DataFrame(stats).set_index("cache"), use_container_width=True)
+    else:
+        st.info("Aucun cache initialisé pour l'instant.")
+
+    st.markdown("### Appels API")
+    requetes, manquants = metrics.snapshot()
+    if requetes:
+        df_requetes = pd.DataFrame(requetes).drop(columns=["latence_buckets"])
+        st.dataframe(df_requetes, use_container_width=True, hide_index=True)
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Requêtes HTTP", int(df_requetes["requetes"].sum()))
+        col2.metric("Coalescées", int(df_requetes["coalescees"].sum()))
+        col3.metric("Réponses vides", int(df_requetes["vides"].sum()))
+        col4.metric("Volume reçu", f"{df_requetes['octets'].sum() / 1e6:.2f} Mo")
+    else:
+        st.info("Aucun appel API enregistré depuis le démarrage.")
+
+    if manquants:
+        st.markdown("**Années introuvables par module**")
+        st.dataframe(pd.DataFrame(manquants), use_container_width=True, hide_index=True)
+
+    col_prom, col_json = st.columns(2)
+    with col_prom:
+        st.download_button("📥 Métriques (Prometheus)", metrics.to_prometheus(),
+                           file_name="focus_metrics.prom", mime="text/plain")
+    with col_json:
+        st.download_button("📥 Métriques (JSON)", metrics.to_json(),
+                           file_name="focus_metrics.json", mime="application/json")
+    with st.expander("Exposition Prometheus"):
+        st.code(metrics.to_prometheus(), language="text")
+
+    if PROFILING_ENABLED:
+        st.markdown("### Profils d'export récents")
+        # Copie : un export d'une autre session peut en ajouter pendant l'affichage
+        profils = list(RECENT_TIMELINES)[::-1]
+        if profils:
+            st.dataframe(pd.DataFrame([
+                {"export": t.name, "durée (s)": round(t.total, 3), "étapes": len(t.events)}
+                for t in profils
+            ]), use_container_width=True, hide_index=True)
+            choix = st.selectbox("Profil :", range(len(profils)),
+                                 format_func=lambda i: f"{profils[i].name} ({profils[i].total:.2f} s)")
+            st.download_button("📥 Trace Chrome (JSON)", profils[choix].to_chrome_trace(),
+                               file_name=f"profil_{profils[choix].name.replace(' ', '_')}.json",
+                               mime="application/json")
+        else:
+            st.info("Aucun export profilé depuis le démarrage.")
+
+    st.markdown("### Rendu des graphiques")
+    from reports import capacites_rendu
+    capacites = capacites_rendu()
+    st.caption(
+        "PDF : matplotlib " + ("✅" if capacites["matplotlib"] else "❌")
+        + " · reportlab " + ("✅" if capacites["reportlab"] else "❌")
+        + " · kaleido " + (capacites["kaleido"] or "absent")
+        + " · Chrome " + ("détecté" if capacites["chrome"] else "absent")
+    )
+
+    if st.button("🗑️ Vider les caches"):
+        reset_caches()
+        metrics.reset()
+        # Affiché au rerun suivant (st.rerun interrompt celui-ci)
+        st.session_state["caches_vides"] = True
+        st.rerun()
+    if st.session_state.pop("caches_vides", False):
+        st.success("✅ Caches vidés et compteurs remis à zéro.")
+
+if __name__ == "__main__":
+    run()
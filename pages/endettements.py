@@ -1,10 +1,19 @@
 import pandas as pd
 import requests
 import streamlit as st
-import plotly.express as px
 import re
+import logging
 from functools import lru_cache
 from difflib import SequenceMatcher
+from app_fetchers import API_BASE_URL, api_get_json
+from cles import cle_commune, code_departement
+from figures import cle_figure, figure_evolution
+from metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+# Champs lus par la page (dette calculée `det2cal`), poussés dans `select`
+COLONNES_ENDETTEMENT = ['an', 'fdet2cal', 'mdet2cal', 'fcaf', 'mcaf', 'fcafn', 'mcafn', 'fprod', 'mprod']
 
 # Mapping des années vers les nouveaux datasets
 DATASETS_MAPPING = {
@@ -23,7 +32,7 @@ def get_dataset_for_year(annee):
 def get_api_url_for_year(annee):
     """Retourne l'URL de l'API pour une année donnée"""
     dataset = get_dataset_for_year(annee)
-    return f"https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/{dataset}/records"
+    return f"{API_BASE_URL}/catalog/datasets/{dataset}/records"
 
 class RobustCommuneFetcher:
     """Version adaptée aux nouveaux datasets"""
@@ -50,7 +59,7 @@ class RobustCommuneFetcher:
     
     def find_commune_variants(self, commune, departement=None):
         """Trouve les variantes d'une commune dans tous les datasets"""
-        cache_key = f"{commune}_{departement}"
+        cache_key = commune, departement = cle_commune(commune, departement)
         if cache_key in self._cache:
             return self._cache[cache_key]
         
@@ -61,7 +70,7 @@ class RobustCommuneFetcher:
         datasets_to_search = list(set(DATASETS_MAPPING.values()))
         
         for dataset in datasets_to_search:
-            api_url = f"https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/{dataset}/records"
+            api_url = f"{API_BASE_URL}/catalog/datasets/{dataset}/records"
             
             for term in search_terms:
                 where_clause = f'inom LIKE "%{term}%"'
@@ -72,8 +81,7 @@ class RobustCommuneFetcher:
                 params = {"where": where_clause, "limit": 50, "select": "inom,dep"}
                 
                 try:
-                    response = requests.get(api_url, params=params, timeout=10)
-                    data = response.json()
+                    data = api_get_json(api_url, params, module="variantes")
                     
                     if "results" in data:
                         for record in data["results"]:
@@ -118,17 +126,16 @@ class RobustCommuneFetcher:
 def get_fetcher():
     return RobustCommuneFetcher()
 
-def fetch_commune_endettement(commune, annees, departement=None):
-    """Version robuste adaptée aux nouveaux datasets"""
-    
-    fetcher = get_fetcher()
+def _fetch_commune_endettement(fetcher, commune, annees, departement, messages):
+    """Données de la page sans appel Streamlit : les messages (niveau, texte) vont dans `messages`"""
+    departement = code_departement(departement)
     
     # 1. Trouve les variantes
     variants = fetcher.find_commune_variants(commune, departement)
     
     if len(variants) > 1:
         variant_names = [v["nom"] for v in variants]
-        st.info(f"🔍 Variantes détectées: {', '.join(set(variant_names))}")
+        messages.append(("info", f"🔍 Variantes détectées: {', '.join(set(variant_names))}"))
     
     # 2. Récupère les données année par année
     df_list = []
@@ -146,15 +153,14 @@ def fetch_commune_endettement(commune, annees, departement=None):
             if dept:
                 where_clause += f' AND dep="{dept}"'
             
-            params = {"where": where_clause, "limit": 100}
+            params = {"where": where_clause, "limit": 100, "select": ",".join(COLONNES_ENDETTEMENT)}
             
             try:
-                r = requests.get(api_url, params=params, timeout=10)
-                data = r.json().get("results", [])
+                data = api_get_json(api_url, params, module="page_endettement").get("results", [])
 
                 if data:
                     df = pd.DataFrame(data)
-                    cols = ['an', 'fdet2cal', 'mdet2cal', 'fcaf', 'mcaf', 'fcafn', 'mcafn','fprod','mprod']
+                    cols = COLONNES_ENDETTEMENT
                     df_exist = [c for c in cols if c in df.columns]
                     
                     if df_exist:
@@ -184,9 +190,9 @@ def fetch_commune_endettement(commune, annees, departement=None):
             except requests.RequestException:
                 continue
         
-        # Debug pour voir ce qui se passe
         if not annee_trouvee:
-            st.warning(f"⚠️ Année {annee} non trouvée pour {commune}")
+            metrics.record_missing("page_endettement", annee)
+            messages.append(("warning", f"⚠️ Année {annee} non trouvée pour {commune}"))
     
     # 3. Combine les résultats
     if df_list:
@@ -194,17 +200,29 @@ def fetch_commune_endettement(commune, annees, departement=None):
         df_all = df_all.drop_duplicates(subset=['Année'], keep='first')
         df_all = df_all.sort_values("Année")
         
-        st.success(f"✅ Données endettement récupérées: {len(df_all)} lignes sur {len(annees)} années demandées")
+        messages.append(("success", f"✅ Données endettement récupérées: {len(df_all)} lignes sur {len(annees)} années demandées"))
         
-        # Debug : affiche les années trouvées
-        annees_trouvees = sorted(df_all['Année'].unique())
-        st.write(f"🔍 **DEBUG**: Années récupérées: {annees_trouvees}")
+        logger.debug("Endettement %s : années récupérées %s", commune, sorted(df_all['Année'].unique()))
         
         return df_all
         
-    st.warning(f"❌ Aucune donnée d'endettement trouvée pour '{commune}'")
+    messages.append(("warning", f"❌ Aucune donnée d'endettement trouvée pour '{commune}'"))
     return pd.DataFrame()
 
+def fetch_commune_endettement(commune, annees, departement=None):
+    """Version robuste adaptée aux nouveaux datasets"""
+    messages = []
+    resultat = _fetch_commune_endettement(get_fetcher(), commune, annees, departement, messages)
+    for niveau, texte in messages:
+        getattr(st, niveau)(texte)
+    return resultat
+
+def precharger(commune, annees, departement=None):
+    """Requêtes de la page, sans appel Streamlit (préchargement en tâche de fond)"""
+    # Fetcher propre au préchargement : st.cache_resource exige une session
+    fetcher = RobustCommuneFetcher()
+    _fetch_commune_endettement(fetcher, commune, annees, departement, [])
+
 def run(commune=None, annees=None, departement=None):
     """Votre fonction run - CODE ORIGINAL + fetch robuste mis à jour"""
     st.title("📉 Endettement des communes")
@@ -227,6 +245,8 @@ def run(commune=None, annees=None, departement=None):
         if not df.empty:
             df.set_index("Année", inplace=True)
 
+            cle = cle_figure("endettements", commune_selectionnee, departement_selectionne, annees)
+
             mini_tableaux = {
                 "Dette / Habitant": ["Dette / Habitant Commune", "Dette / Habitant Moyenne"],
                 "Dettes / RRF": ["Dettes / RRF Commune", "Dettes / RRF Moyenne"],
@@ -244,19 +264,7 @@ def run(commune=None, annees=None, departement=None):
 
                         # Graphiques Plotly (identiques à votre version)
                         try:
-                            df_plot = df[colonnes].reset_index().melt(
-                                id_vars="Année", var_name="Indicateur", value_name="Valeur"
-                            )
-                            fig = px.line(
-                                df_plot,
-                                x="Année",
-                                y="Valeur",
-                                color="Indicateur",
-                                markers=True,
-                                title=f"Évolution - {titre}"
-                            )
-                            fig.update_traces(mode="lines+markers", line=dict(width=2), marker=dict(size=6))
-                            fig.update_layout(template="plotly_white", hovermode="x unified")
+                            fig = figure_evolution(df, colonnes, titre, cle)
                             st.plotly_chart(fig, use_container_width=True)
                         except Exception as e:
                             st.warning(f"Impossible d'afficher le graphique pour {titre} ({e})")
@@ -1,10 +1,12 @@
 import streamlit as st
 import pandas as pd
 import requests
-import plotly.express as px
 import re
 from functools import lru_cache
 from difflib import SequenceMatcher
+from app_fetchers import API_BASE_URL, MODULE_COLUMNS, api_get_json, select_for
+from cles import cle_commune, code_departement
+from figures import cle_figure, figure_evolution
 
 # Mapping des années vers les nouveaux datasets
 DATASETS_MAPPING = {
@@ -23,7 +25,7 @@ def get_dataset_for_year(annee):
 def get_api_url_for_year(annee):
     """Retourne l'URL de l'API pour une année donnée"""
     dataset = get_dataset_for_year(annee)
-    return f"https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/{dataset}/records"
+    return f"{API_BASE_URL}/catalog/datasets/{dataset}/records"
 
 class RobustCommuneFetcher:
     """Version adaptée aux nouveaux datasets"""
@@ -50,7 +52,7 @@ class RobustCommuneFetcher:
     
     def find_commune_variants(self, commune, departement=None):
         """Trouve les variantes d'une commune dans tous les datasets"""
-        cache_key = f"{commune}_{departement}"
+        cache_key = commune, departement = cle_commune(commune, departement)
         if cache_key in self._cache:
             return self._cache[cache_key]
         
@@ -61,7 +63,7 @@ class RobustCommuneFetcher:
         datasets_to_search = list(set(DATASETS_MAPPING.values()))
         
         for dataset in datasets_to_search:
-            api_url = f"https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/{dataset}/records"
+            api_url = f"{API_BASE_URL}/catalog/datasets/{dataset}/records"
             
             for term in search_terms:
                 where_clause = f'inom LIKE "%{term}%"'
@@ -72,8 +74,7 @@ class RobustCommuneFetcher:
                 params = {"where": where_clause, "limit": 50, "select": "inom,dep"}
                 
                 try:
-                    response = requests.get(api_url, params=params, timeout=10)
-                    data = response.json()
+                    data = api_get_json(api_url, params, module="variantes")
                     
                     if "results" in data:
                         for record in data["results"]:
@@ -118,10 +119,9 @@ class RobustCommuneFetcher:
 def get_fetcher():
     return RobustCommuneFetcher()
 
-def fetch_commune_fonctionnement(commune, annee, departement=None):
-    """Version robuste adaptée aux nouveaux datasets"""
-    
-    fetcher = get_fetcher()
+def _fetch_commune_fonctionnement(fetcher, commune, annee, departement, messages):
+    """Données de la page sans appel Streamlit : les messages (niveau, texte) vont dans `messages`"""
+    departement = code_departement(departement)
     api_url = get_api_url_for_year(annee)  # URL adaptée à l'année
     
     # 1. Trouve les variantes (une seule fois pour toutes les années)
@@ -136,18 +136,16 @@ def fetch_commune_fonctionnement(commune, annee, departement=None):
         if dept:
             where_clause += f' AND dep="{dept}"'
         
-        params = {"where": where_clause, "limit": 100}
+        params = {"where": where_clause, "limit": 100, "select": select_for("fonctionnement")}
         
         try:
-            response = requests.get(api_url, params=params, timeout=10)
-            data = response.json()
+            data = api_get_json(api_url, params, module="page_fonctionnement")
             
             if "results" not in data or not data["results"]:
                 continue  # Essaye la variante suivante
             
             df = pd.DataFrame(data["results"])
-            colonnes_voulu = ['an', 'pop1', 'prod', 'charge', 'fprod', 'mprod',
-                              'fcharge', 'mcharge', 'fdgf', 'mdgf', 'fperso', 'mperso']
+            colonnes_voulu = MODULE_COLUMNS["fonctionnement"]
             colonnes_existantes = [c for c in colonnes_voulu if c in df.columns]
             
             if not colonnes_existantes:
@@ -186,7 +184,7 @@ def fetch_commune_fonctionnement(commune, annee, departement=None):
             
             # Succès ! Donnée trouvée avec cette variante
             if commune_nom != commune:
-                st.info(f"🔍 Données trouvées pour '{commune}' via '{commune_nom}'")
+                messages.append(("info", f"🔍 Données trouvées pour '{commune}' via '{commune_nom}'"))
             
             return df_fonctionnement
             
@@ -196,6 +194,21 @@ def fetch_commune_fonctionnement(commune, annee, departement=None):
     # Aucune variante n'a fonctionné
     return pd.DataFrame()
 
+def fetch_commune_fonctionnement(commune, annee, departement=None):
+    """Version robuste adaptée aux nouveaux datasets"""
+    messages = []
+    resultat = _fetch_commune_fonctionnement(get_fetcher(), commune, annee, departement, messages)
+    for niveau, texte in messages:
+        getattr(st, niveau)(texte)
+    return resultat
+
+def precharger(commune, annees, departement=None):
+    """Requêtes de la page, sans appel Streamlit (préchargement en tâche de fond)"""
+    # Fetcher propre au préchargement : st.cache_resource exige une session
+    fetcher = RobustCommuneFetcher()
+    for annee in annees:
+        _fetch_commune_fonctionnement(fetcher, commune, annee, departement, [])
+
 def run(commune=None, annees=None, departement=None):
     """Votre fonction run - CODE ORIGINAL + fetch robuste mis à jour"""
     st.title("💰 Fonctionnement des communes")
@@ -233,6 +246,8 @@ def run(commune=None, annees=None, departement=None):
             
             st.success(f"✅ Données fonctionnement récupérées: {len(df_list)} années sur {len(annees)} demandées")
 
+            cle = cle_figure("fonctionnement", commune_selectionnee, departement_selectionne, annees)
+
             mini_tableaux = {
                 "Population": ["Population"],
                 "Recettes et Dépenses": ["Recettes de fonctionnement", "Dépenses de fonctionnement"],
@@ -256,27 +271,7 @@ def run(commune=None, annees=None, departement=None):
 
                         # Graphique avec Plotly (identique à votre version)
                         try:
-                            df_plot = (
-                                fonctionnement[colonnes]
-                                .reset_index()
-                                .sort_values("Année")  # trie croissant
-                                .melt(id_vars="Année", var_name="Indicateur", value_name="Valeur")
-                            )
-                            fig = px.line(
-                                df_plot,
-                                x="Année",
-                                y="Valeur",
-                                color="Indicateur",
-                                markers=True,
-                                title=f"Évolution - {titre}"
-                            )
-                            fig.update_traces(mode="lines+markers", line=dict(width=2), marker=dict(size=6))
-                            fig.update_layout(
-                                xaxis_title="Année",
-                                yaxis_title="Valeur",
-                                template="plotly_white",
-                                hovermode="x unified"
-                            )
+                            fig = figure_evolution(fonctionnement, colonnes, titre, cle, layout=dict(xaxis_title="Année", yaxis_title="Valeur"))
                             st.plotly_chart(fig, use_container_width=True)
                         except Exception as e:
                             st.warning(f"Impossible d'afficher le graphique pour {titre} ({e})")
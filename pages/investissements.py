@@ -1,10 +1,12 @@
 import pandas as pd
 import streamlit as st
-import plotly.express as px
 import requests
 import re
 from functools import lru_cache
 from difflib import SequenceMatcher
+from app_fetchers import API_BASE_URL, MODULE_COLUMNS, api_get_json, select_for
+from cles import cle_commune, code_departement
+from figures import cle_figure, figure_evolution
 
 # Mapping des années vers les nouveaux datasets
 DATASETS_MAPPING = {
@@ -23,7 +25,7 @@ def get_dataset_for_year(annee):
 def get_api_url_for_year(annee):
     """Retourne l'URL de l'API pour une année donnée"""
     dataset = get_dataset_for_year(annee)
-    return f"https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/{dataset}/records"
+    return f"{API_BASE_URL}/catalog/datasets/{dataset}/records"
 
 class RobustCommuneFetcher:
     """Version adaptée aux nouveaux datasets"""
@@ -50,7 +52,7 @@ class RobustCommuneFetcher:
     
     def find_commune_variants(self, commune, departement=None):
         """Trouve les variantes d'une commune dans tous les datasets"""
-        cache_key = f"{commune}_{departement}"
+        cache_key = commune, departement = cle_commune(commune, departement)
         if cache_key in self._cache:
             return self._cache[cache_key]
         
@@ -61,7 +63,7 @@ class RobustCommuneFetcher:
         datasets_to_search = list(set(DATASETS_MAPPING.values()))
         
         for dataset in datasets_to_search:
-            api_url = f"https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/{dataset}/records"
+            api_url = f"{API_BASE_URL}/catalog/datasets/{dataset}/records"
             
             for term in search_terms:
                 where_clause = f'inom LIKE "%{term}%"'
@@ -72,8 +74,7 @@ class RobustCommuneFetcher:
                 params = {"where": where_clause, "limit": 50, "select": "inom,dep"}
                 
                 try:
-                    response = requests.get(api_url, params=params, timeout=10)
-                    data = response.json()
+                    data = api_get_json(api_url, params, module="variantes")
                     
                     if "results" in data:
                         for record in data["results"]:
@@ -118,20 +119,12 @@ class RobustCommuneFetcher:
 def get_fetcher():
     return RobustCommuneFetcher()
 
-def fetch_commune_investissement(commune, annees, departement=None):
-    """Version robuste adaptée aux nouveaux datasets avec diagnostic"""
-    
-    fetcher = get_fetcher()
-    
+def _fetch_commune_investissement(fetcher, commune, annees, departement):
+    """Données de la page sans appel Streamlit : (tableau, variantes, diagnostic par année)"""
     # 1. Trouve les variantes
     variants = fetcher.find_commune_variants(commune, departement)
     
-    if len(variants) > 1:
-        variant_names = [v["nom"] for v in variants]
-        st.info(f"Variantes détectées: {', '.join(set(variant_names))}")
-    
     # 2. Diagnostic détaillé par année
-    st.write("Diagnostic par année:")
     diagnostic_data = []
     
     # 3. Récupère les données avec diagnostic
@@ -149,15 +142,14 @@ def fetch_commune_investissement(commune, annees, departement=None):
             if dept:
                 where_clause += f' AND dep="{dept}"'
             
-            params = {"where": where_clause, "limit": 100}
+            params = {"where": where_clause, "limit": 100, "select": select_for("investissement")}
             
             try:
-                r = requests.get(api_url, params=params, timeout=10)
-                data = r.json().get("results", [])
+                data = api_get_json(api_url, params, module="page_investissement").get("results", [])
                 
                 if data:
                     df = pd.DataFrame(data)
-                    cols = ['an', 'fequip', 'mequip', 'fprod', 'mprod']
+                    cols = MODULE_COLUMNS["investissement"]
                     df_exist = [c for c in cols if c in df.columns]
                     
                     if df_exist:
@@ -194,6 +186,25 @@ def fetch_commune_investissement(commune, annees, departement=None):
                 "Département": departement or "Non spécifié"
             })
     
+    if df_list:
+        df_final = pd.concat(df_list, ignore_index=True)
+        df_final = df_final.drop_duplicates(subset=['Année'], keep='first')
+        df_final = df_final.sort_values("Année")
+    else:
+        df_final = pd.DataFrame()
+    return df_final, variants, diagnostic_data
+
+def fetch_commune_investissement(commune, annees, departement=None):
+    """Version robuste adaptée aux nouveaux datasets avec diagnostic"""
+    departement = code_departement(departement)
+    df_final, variants, diagnostic_data = _fetch_commune_investissement(get_fetcher(), commune, annees, departement)
+    
+    if len(variants) > 1:
+        variant_names = [v["nom"] for v in variants]
+        st.info(f"Variantes détectées: {', '.join(set(variant_names))}")
+    
+    st.write("Diagnostic par année:")
+    
     # Affiche le diagnostic
     if diagnostic_data:
         df_diagnostic = pd.DataFrame(diagnostic_data)
@@ -224,8 +235,7 @@ def fetch_commune_investissement(commune, annees, departement=None):
                         params = {"where": where_clause, "limit": 10, "select": "inom,dep"}
                         
                         try:
-                            response = requests.get(api_url_recherche, params=params, timeout=8)
-                            data = response.json()
+                            data = api_get_json(api_url_recherche, params, timeout=8, module="recherche_elargie")
                             
                             if "results" in data and data["results"]:
                                 st.write(f"Communes similaires trouvées pour '{term}':")
@@ -236,15 +246,15 @@ def fetch_commune_investissement(commune, annees, departement=None):
                             continue
     
     # 4. Résultat final
-    if df_list:
-        df_final = pd.concat(df_list, ignore_index=True)
-        df_final = df_final.drop_duplicates(subset=['Année'], keep='first')
-        df_final = df_final.sort_values("Année")
-        
+    if not df_final.empty:
         st.success(f"Données récupérées: {len(df_final)} lignes sur {len(annees)} demandées")
-        return df_final
-    
-    return pd.DataFrame()
+    return df_final
+
+def precharger(commune, annees, departement=None):
+    """Requêtes de la page, sans appel Streamlit (préchargement en tâche de fond)"""
+    # Fetcher propre au préchargement : st.cache_resource exige une session
+    fetcher = RobustCommuneFetcher()
+    _fetch_commune_investissement(fetcher, commune, annees, code_departement(departement))
 
 def run(commune=None, annees=None, departement=None):
     """Votre fonction run - CODE ORIGINAL + fetch robuste mis à jour"""
@@ -268,6 +278,8 @@ def run(commune=None, annees=None, departement=None):
         if not df.empty:
             df.set_index("Année", inplace=True)
 
+            cle = cle_figure("investissements", commune_selectionnee, departement_selectionne, annees)
+
             mini_tableaux = {
                 "Dépenses d'équipement / habitant": [
                     "Dépenses d'équipement / habitant Commune",
@@ -286,19 +298,7 @@ def run(commune=None, annees=None, departement=None):
 
                         # Graphique Plotly
                         try:
-                            df_plot = df[colonnes].reset_index().melt(
-                                id_vars="Année", var_name="Indicateur", value_name="Valeur"
-                            )
-                            fig = px.line(
-                                df_plot,
-                                x="Année",
-                                y="Valeur",
-                                color="Indicateur",
-                                markers=True,
-                                title=f"Évolution - {titre}"
-                            )
-                            fig.update_traces(mode="lines+markers", line=dict(width=2), marker=dict(size=6))
-                            fig.update_layout(template="plotly_white", hovermode="x unified")
+                            fig = figure_evolution(df, colonnes, titre, cle)
                             st.plotly_chart(fig, use_container_width=True)
                         except Exception as e:
                             st.warning(f"Impossible d'afficher le graphique pour {titre} ({e})")
@@ -0,0 +1,47 @@
+import streamlit as st
+import requests
+
+from communes_similaires import CARACTERISTIQUES, charger_profils
+from pages.comparaison import NB_COMMUNES_MAX
+
+def run(commune=None, annees=None, departement=None):
+    """Communes au profil financier le plus proche, à l'échelle nationale"""
+    st.title("🧭 Communes similaires")
+
+    commune_selectionnee = st.text_input("Nom de la commune :", value=commune or "RENAGE")
+    departement_selectionne = st.text_input("Département (optionnel) :", value=departement or "")
+    annees_disponibles = list(range(2024, 2018, -1))
+    annee = st.selectbox(
+        "Année de référence :",
+        options=annees_disponibles,
+        index=annees_disponibles.index(max(annees)) if annees and max(annees) in annees_disponibles else 0
+    )
+    k = st.slider("Nombre de communes similaires :", min_value=5, max_value=50, value=10)
+
+    if not commune_selectionnee:
+        return
+
+    try:
+        with st.spinner(f"📥 Chargement des profils de toutes les communes ({annee})..."):
+            profils = charger_profils(annee)
+    except requests.RequestException as e:
+        st.error(f"❌ Erreur lors de la récupération des données : {e}")
+        return
+
+    similaires = profils.similaires(commune_selectionnee, departement_selectionne or None, k=k)
+    if similaires.empty:
+        st.warning(f"❌ Commune '{commune_selectionnee}' introuvable en {annee}")
+        return
+
+    st.success(f"✅ {k} communes les plus proches sur {len(profils):,} communes".replace(",", " "))
+    st.caption("Distance euclidienne sur les indicateurs standardisés : " + ", ".join(CARACTERISTIQUES) + ".")
+    st.dataframe(similaires, use_container_width=True, hide_index=True)
+
+    with st.expander("Comparer ces communes"):
+        st.markdown("À coller dans la page **Comparaison** :")
+        premieres = similaires.head(NB_COMMUNES_MAX)
+        st.code("\n".join(f"{c};{d}" for c, d in zip(premieres["Commune"], premieres["Département"])),
+                language=None)
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,208 @@
+# panel_store.py - Stockage local du panel national (un fichier Parquet par année)
+#
+# Le panel complet (~35 000 communes x 6 années x ~200 colonnes) est téléchargé une
+# fois via l'endpoint d'export Parquet de l'API, puis relu par lots : aucune fonction
+# de ce module ne charge le panel entier en mémoire.
+import argparse
+import os
+import sys
+from io import BytesIO
+
+import pandas as pd
+import requests
+
+from app_fetchers import API_BASE_URL, DATASETS_MAPPING, get_dataset_for_year, iter_record_pages, records_to_frame
+
+PANEL_DIR = os.environ.get(
+    "FOCUS_PANEL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "panel")
+)
+
+# Colonnes toujours exportées en tête, pour identifier chaque ligne
+COLONNES_IDENTIFIANTS = ["an", "dep", "icom", "inom"]
+
+BATCH_SIZE = 50_000
+
+# Export servi par l'application (st.download_button garde les octets en mémoire
+# de session) : au-delà, l'export se fait en ligne de commande
+EXPORT_APP_MAX_OCTETS = 100 * 1024 * 1024
+
+def get_exports_url_for_year(annee, format="parquet"):
+    """Retourne l'URL d'export complet du dataset d'une année"""
+    dataset = get_dataset_for_year(annee)
+    return f"{API_BASE_URL}/catalog/datasets/{dataset}/exports/{format}"
+
+def panel_path(annee):
+    """Chemin du fichier Parquet local pour une année"""
+    return os.path.join(PANEL_DIR, f"{annee}.parquet")
+
+def annees_disponibles():
+    """Années présentes dans le stockage local"""
+    if not os.path.isdir(PANEL_DIR):
+        return []
+    annees = []
+    for nom in os.listdir(PANEL_DIR):
+        base, ext = os.path.splitext(nom)
+        if ext == ".parquet" and base.isdigit():
+            annees.append(int(base))
+    return sorted(annees)
+
+def build_panel_store(annees=None, colonnes=None, chunk_size=1 << 20):
+    """Télécharge l'export Parquet de chaque année dans le stockage local (en streaming)"""
+    annees = annees or sorted(DATASETS_MAPPING)
+    os.makedirs(PANEL_DIR, exist_ok=True)
+
+    chemins = []
+    for annee in annees:
+        params = {"where": f'an="{annee}"'}
+        if colonnes:
+            params["select"] = ",".join(colonnes)
+
+        chemin = panel_path(annee)
+        chemin_tmp = chemin + ".tmp"
+        with requests.get(get_exports_url_for_year(annee), params=params, stream=True, timeout=300) as response:
+            response.raise_for_status()
+            with open(chemin_tmp, "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+        # Remplacement atomique : un export interrompu ne corrompt pas le stockage
+        os.replace(chemin_tmp, chemin)
+        chemins.append(chemin)
+    return chemins
+
+def colonnes_disponibles():
+    """Union des colonnes présentes dans le stockage local"""
+    import pyarrow.parquet as pq
+
+    colonnes = []
+    for annee in annees_disponibles():
+        for nom in pq.read_schema(panel_path(annee)).names:
+            if nom not in colonnes:
+                colonnes.append(nom)
+    return colonnes
+
+def _colonnes_export(colonnes):
+    """Identifiants en tête, puis les indicateurs demandés (sans doublon)"""
+    colonnes = colonnes or []
+    return COLONNES_IDENTIFIANTS + [c for c in colonnes if c not in COLONNES_IDENTIFIANTS]
+
+def iter_panel_batches(colonnes=None, annees=None, batch_size=BATCH_SIZE):
+    """Itère sur le panel local par lots Arrow, avec un schéma identique pour tous les lots"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    colonnes = _colonnes_export(colonnes)
+    # None : toutes les années ; une liste vide n'exporte rien
+    if annees is None:
+        annees = annees_disponibles()
+    annees = [a for a in annees if os.path.exists(panel_path(a))]
+
+    for annee in sorted(annees):
+        fichier = pq.ParquetFile(panel_path(annee))
+        presentes = [c for c in colonnes if c in fichier.schema_arrow.names]
+        types = {c: fichier.schema_arrow.field(c).type for c in presentes}
+
+        for batch in fichier.iter_batches(batch_size=batch_size, columns=presentes):
+            # Colonnes absentes d'une année : remplies de valeurs nulles
+            arrays = [
+                batch.column(c) if c in types else pa.nulls(batch.num_rows)
+                for c in colonnes
+            ]
+            yield pa.RecordBatch.from_arrays(arrays, names=colonnes)
+
+def lire_annee(annee, colonnes):
+    """Colonnes d'une année en DataFrame : stockage local s'il existe, sinon API (flux paginé / export)"""
+    colonnes = _colonnes_export(colonnes)
+    if os.path.exists(panel_path(annee)):
+        batches = list(iter_panel_batches(colonnes, annees=[annee]))
+        if not batches:
+            return pd.DataFrame(columns=colonnes)
+        return pd.concat([batch.to_pandas() for batch in batches], ignore_index=True)
+
+    lignes = []
+    for page in iter_record_pages(get_dataset_for_year(annee), f'an="{annee}"', select=",".join(colonnes)):
+        lignes.extend(page)
+    return records_to_frame(lignes, colonnes)
+
+def iter_csv_chunks(batches, colonnes=None):
+    """Sérialise un flux de lots en CSV (en-tête émis une seule fois)"""
+    import pyarrow.csv as pacsv
+
+    header_ecrit = False
+    for batch in batches:
+        if not header_ecrit:
+            yield (",".join(batch.schema.names) + "\n").encode("utf-8")
+            header_ecrit = True
+        buffer = BytesIO()
+        pacsv.write_csv(batch, buffer, write_options=pacsv.WriteOptions(include_header=False))
+        yield buffer.getvalue()
+
+    if not header_ecrit and colonnes is not None:
+        yield (",".join(_colonnes_export(colonnes)) + "\n").encode("utf-8")
+
+def iter_ndjson_chunks(batches):
+    """Sérialise un flux de lots en NDJSON (un objet JSON par ligne)"""
+    for batch in batches:
+        if batch.num_rows:
+            # to_json(lines=True) termine déjà chaque ligne par un saut de ligne
+            yield batch.to_pandas().to_json(orient="records", lines=True, force_ascii=False).encode("utf-8")
+
+def iter_panel_export(colonnes=None, annees=None, format="csv", batch_size=BATCH_SIZE):
+    """Pipeline complet : stockage local -> lots Arrow -> octets CSV ou NDJSON"""
+    batches = iter_panel_batches(colonnes, annees, batch_size=batch_size)
+    if format == "ndjson":
+        return iter_ndjson_chunks(batches)
+    return iter_csv_chunks(batches, colonnes)
+
+def write_panel_export(fileobj, colonnes=None, annees=None, format="csv", batch_size=BATCH_SIZE,
+                       max_octets=None):
+    """Écrit l'export dans un fichier ouvert en binaire, retourne le nombre d'octets.
+
+    Au-delà de `max_octets`, l'écriture s'arrête (lots suivants non lus) et renvoie None.
+    """
+    total = 0
+    for chunk in iter_panel_export(colonnes, annees, format=format, batch_size=batch_size):
+        total += len(chunk)
+        if max_octets is not None and total > max_octets:
+            return None
+        fileobj.write(chunk)
+    return total
+
+def commande_export(colonnes=None, annees=None, format="csv", sortie=None):
+    """Ligne de commande équivalente à un export demandé depuis l'application"""
+    commande = ["python panel_store.py export", f"--format {format}"]
+    if colonnes:
+        commande.append("--colonnes " + " ".join(colonnes))
+    if annees:
+        commande.append("--annees " + " ".join(str(a) for a in annees))
+    commande.append(f"--sortie {sortie or f'panel.{format}'}")
+    return " ".join(commande)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stockage local du panel national Focus Financier")
+    sub = parser.add_subparsers(dest="commande", required=True)
+
+    build = sub.add_parser("build", help="Télécharge le panel dans le stockage local")
+    build.add_argument("--annees", type=int, nargs="*")
+    build.add_argument("--colonnes", nargs="*")
+
+    export = sub.add_parser("export", help="Exporte le panel en CSV ou NDJSON")
+    export.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    export.add_argument("--colonnes", nargs="*")
+    export.add_argument("--annees", type=int, nargs="*")
+    export.add_argument("--sortie", help="Fichier de sortie (défaut : sortie standard)")
+
+    args = parser.parse_args(argv)
+
+    if args.commande == "build":
+        for chemin in build_panel_store(args.annees, args.colonnes):
+            print(f"✅ {chemin}")
+    elif args.sortie:
+        with open(args.sortie, "wb") as f:
+            taille = write_panel_export(f, args.colonnes, args.annees, format=args.format)
+        print(f"✅ {args.sortie} ({taille:,} octets)", file=sys.stderr)
+    else:
+        write_panel_export(sys.stdout.buffer, args.colonnes, args.annees, format=args.format)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# prechargement.py - Préchargement en tâche de fond des pages d'une commune
+#
+# Dès qu'une commune est choisie, un thread de travail rejoue les requêtes des
+# pages d'analyse (dans l'ordre de la navigation), puis celles des exports et les
+# graphiques du PDF. Les réponses restent dans les caches partagés (réponses API,
+# données par année, graphiques) : changer de page ne bloque plus sur le réseau.
+# Le thread n'a pas de session : rien ici n'appelle st.* (ni st.cache_resource).
+import importlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from caches import LRUCache
+from cles import cle_commune
+
+logger = logging.getLogger(__name__)
+
+# Préchargements simultanés dans tout le processus (toutes sessions confondues)
+PRECHARGEMENT_WORKERS = 2
+# Même durée que le cache des réponses API : au-delà, la commune est repréchargée
+PRECHARGEMENT_TTL = 3600
+
+PREFIXE_THREADS = "prechargement"
+
+_executor = ThreadPoolExecutor(max_workers=PRECHARGEMENT_WORKERS, thread_name_prefix=PREFIXE_THREADS)
+_lances = LRUCache(maxsize=500, ttl=PRECHARGEMENT_TTL, name="prechargements")
+_lances_lock = threading.Lock()
+
+def precharger(commune, annees, departement=None, pages=(), graphiques=True):
+    """Préchargement synchrone (thread de travail, warmup.py)"""
+    for module in pages:
+        importlib.import_module(module).precharger(commune, annees, departement)
+    if pages:
+        # Importé par le premier graphique affiché : autant le payer ici
+        importlib.import_module("plotly.express")
+
+    from app_fetchers import get_all_commune_data
+    get_all_commune_data(commune, annees, departement)
+
+    if graphiques:
+        from reports import precharger_graphiques
+        precharger_graphiques(commune, annees, departement)
+
+def _termine(cle, future):
+    if future.exception() is not None:
+        logger.warning("Préchargement de %s interrompu : %s", cle, future.exception())
+        with _lances_lock:
+            # Réessayé au prochain rerun
+            _lances.set(cle, None)
+
+def precharger_commune(commune, annees, departement=None, pages=(), graphiques=True):
+    """Lance (une fois par commune, département et années) le préchargement en tâche de fond.
+
+    `pages` : modules de pages exposant `precharger(commune, annees, departement)`,
+    dans l'ordre où ils seront sans doute visités. Retourne le Future, ou None
+    si ce préchargement est déjà lancé.
+    """
+    if not commune or not annees:
+        return None
+    cle = cle_commune(commune, departement, annees)
+    with _lances_lock:
+        if _lances.get(cle) is not None:
+            return None
+        future = _executor.submit(precharger, commune, list(annees), departement, tuple(pages), graphiques)
+        _lances.set(cle, future)
+    future.add_done_callback(lambda f: _termine(cle, f))
+    return future
@@ -1,686 +1,163 @@
-import streamlit as st
-import pandas as pd
-import requests
-import plotly.express as px
-import plotly.io as pio
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from io import BytesIO
-from datetime import datetime
-import tempfile
+import importlib
+import io
 import os
-import kaleido
+
+import streamlit as st
 
 # -----------------------
-# Fonctions de récupération des données (reprises de vos modules)
+# Fonctions de récupération des données et exports
 # -----------------------
 
 from app_fetchers import (
-    fetch_commune_fonctionnement,
-    fetch_commune_caf,
-    fetch_commune_fiscalite,
-    fetch_commune_investissement,
-    fetch_commune_endettement,
-    fetch_commune_fdr
+    search_commune,
+    get_all_commune_data,
+    compter_requetes,
+    commune_request_budget,
+    reset_request_counters
 )
+from cles import nom_commune
+from profiling import profile
 
-# Mapping des années vers les nouveaux datasets
-DATASETS_MAPPING = {
-    2019: "comptes-individuels-des-communes-fichier-global-2019-2020",
-    2020: "comptes-individuels-des-communes-fichier-global-2019-2020",
-    2021: "comptes-individuels-des-communes-fichier-global-2021",
-    2022: "comptes-individuels-des-communes-fichier-global-2022",
-    2023: "comptes-individuels-des-communes-fichier-global-2023-2024",
-    2024: "comptes-individuels-des-communes-fichier-global-2023-2024"
-}
+# Les piles d'export (reportlab, matplotlib, seaborn, pyarrow) et les pages ne
+# sont importées qu'à l'usage : un rerun ne paie que ce qu'il affiche.
 
-def get_dataset_for_year(annee):
-    """Retourne le dataset approprié pour une année donnée"""
-    return DATASETS_MAPPING.get(annee, "comptes-individuels-des-communes-fichier-global-2023-2024")
-
-@st.cache_data(show_spinner=False)
-def search_commune(nom_commune, annee_reference=2024):
-    """Recherche une commune et retourne les informations incluant le département"""
-    dataset = get_dataset_for_year(annee_reference)
-    url = f"https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/{dataset}/records"
-    
-    params = {
-        "where": f'an="{annee_reference}" AND inom="{nom_commune}"',
-        "limit": 100
-    }
-    
-    response = requests.get(url, params=params)
-    data = response.json()
-    
-    if "results" not in data or not data["results"]:
-        return []
-    
-    communes = []
-    for result in data["results"]:
-        communes.append({
-            "nom": result.get("inom", ""),
-            "departement": result.get("dep", ""),
-            "population": result.get("pop1", 0)
-        })
-    
-    return communes
-
-@st.cache_data(show_spinner=False)
-def get_all_commune_data(commune, annees, departement):
-    """Récupère toutes les données financières pour une commune"""
-    data = {}
-    data['fonctionnement'] = fetch_commune_fonctionnement(commune, annees,departement)
-    data['caf'] = fetch_commune_caf(commune, annees,departement)
-    data['fiscalite'] = fetch_commune_fiscalite(commune, annees,departement)
-    data['endettement'] = fetch_commune_endettement(commune, annees, departement)
-    data['investissement'] = fetch_commune_investissement(commune, annees, departement)
-    data['fdr'] = fetch_commune_fdr(commune, annees, departement)
-    return data
-
-import plotly.io as pio
-import tempfile
-import os
-import streamlit as st
-
-import plotly.express as px
-import plotly.io as pio
-import tempfile
-import os
-import streamlit as st
-import subprocess
-import sys
-
-def ensure_kaleido_chrome():
-    """
-    Vérifie si Kaleido + Chrome sont installés.
-    Si non, tente de les installer automatiquement.
-    """
-    try:
-        import kaleido
-    except ImportError:
-        st.info("📥 Installation de kaleido...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "kaleido"])
-    
-    try:
-        # Test simple pour voir si Kaleido peut exporter PNG
-        import plotly.io as pio
-        fig_test = px.line(x=[1, 2], y=[1, 2])
-        fig_test.to_image(format="png")
-    except Exception:
-        st.info("⚙ Installation de Chrome pour Kaleido...")
-        try:
-            subprocess.check_call([sys.executable, "-m", "kaleido"])
-        except Exception:
-            st.error("❌ Impossible d'installer Chrome pour Kaleido. Veuillez l'installer manuellement.")
-            return False
-    return True
-
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-def create_chart_image(df, colonnes, titre):
-    """Crée un graphique Matplotlib et le sauvegarde comme image temporaire"""
-    if df.empty or not colonnes:
+# Exposition des métriques API pour Prometheus (une seule fois par processus)
+@st.cache_resource
+def start_metrics_endpoint():
+    port = os.environ.get("FOCUS_METRICS_PORT")
+    if not port:
         return None
-
-    try:
-        # Préparation des données
-        df_plot = df[colonnes].reset_index().melt(
-            id_vars="Année", var_name="Indicateur", value_name="Valeur"
+    from metrics import start_metrics_server
+    return start_metrics_server(int(port))
+
+start_metrics_endpoint()
+
+# Moteurs de rendu sondés au démarrage, une fois par processus (sans pip ni Chromium)
+@st.cache_resource
+def sonder_capacites_rendu():
+    from reports import capacites_rendu
+    return capacites_rendu()
+
+sonder_capacites_rendu()
+
+def afficher_profil(timeline):
+    """Affiche la frise des étapes d'un export et propose la trace Chrome (FOCUS_PROFILE=1)"""
+    if timeline is None:
+        return
+
+    import plotly.graph_objects as go
+
+    rows = timeline.rows()
+    # Libellés uniques (les mêmes titres reviennent dans plusieurs sections)
+    labels = [f"{i:02d} {'  ' * (e['depth'] - 1)}{e['name']}" for i, e in enumerate(rows)]
+
+    with st.expander(f"⏱️ Profil : {timeline.name} ({timeline.total:.2f} s)"):
+        fig = go.Figure(go.Bar(
+            y=labels,
+            x=[e["duration"] for e in rows],
+            base=[e["start"] for e in rows],
+            orientation="h",
+            marker_color=[e["depth"] for e in rows],
+            hovertemplate="%{y}<br>début %{base:.3f} s<br>durée %{x:.3f} s<extra></extra>"
+        ))
+        fig.update_layout(
+            template="plotly_white",
+            height=max(300, 18 * len(rows)),
+            xaxis_title="Secondes",
+            yaxis=dict(autorange="reversed")
         )
+        st.plotly_chart(fig, use_container_width=True)
 
-        # Vérifier qu'il y a des données
-        if df_plot.empty or df_plot['Valeur'].isna().all():
-            return None
-
-        # Couleurs personnalisées
-        colors_palette = ['#1f4e79', '#87ceeb']  # Bleu foncé, bleu clair
-
-        # Création du graphique
-        plt.figure(figsize=(8, 6))
-        sns.set(style="whitegrid")
-
-        for i, indicateur in enumerate(df_plot['Indicateur'].unique()):
-            data = df_plot[df_plot['Indicateur'] == indicateur]
-            plt.plot(
-                data["Année"],
-                data["Valeur"],
-                marker='o',
-                linewidth=2,
-                markersize=6,
-                label=indicateur,
-                color=colors_palette[i % len(colors_palette)]
-            )
-
-        plt.title(f"Évolution - {titre}", fontsize=14, weight="bold")
-        plt.xlabel("Année", fontsize=12)
-        plt.ylabel("Valeur", fontsize=12)
-        plt.legend(loc="upper center", bbox_to_anchor=(0.5, -0.15), ncol=len(df_plot['Indicateur'].unique()))
-        plt.tight_layout()
-
-        # Sauvegarde en fichier temporaire
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-        temp_path = temp_file.name
-        temp_file.close()
+        st.download_button(
+            label="📥 Trace Chrome (JSON)",
+            data=timeline.to_chrome_trace(),
+            file_name=f"profil_{timeline.name.replace(' ', '_')}.json",
+            mime="application/json"
+        )
 
-        plt.savefig(temp_path, dpi=150)
-        plt.close()
+# Bandeau du nombre de requêtes HTTP émises par rerun (FOCUS_DEBUG_REQUESTS=1)
+DEBUG_REQUESTS = os.environ.get("FOCUS_DEBUG_REQUESTS", "").lower() in ("1", "true", "yes", "on")
+
+def afficher_bandeau_requetes(compteur, commune, annees):
+    """Affiche dans la sidebar les requêtes HTTP du rerun, comparées au budget d'une commune"""
+    budget = commune_request_budget(commune, annees) if commune and annees else None
+    message = f"🌐 {compteur.requetes} requête(s) HTTP ce rerun ({compteur.coalescees} coalescée(s))"
+    if budget is not None:
+        message += f" — budget commune : {budget}"
+    if compteur.depasse(budget):
+        st.sidebar.warning(message)
+    else:
+        st.sidebar.caption(message)
+    if compteur.par_dataset:
+        st.sidebar.caption(" · ".join(f"{d.rsplit('-', 1)[-1]} : {n}" for d, n in sorted(compteur.par_dataset.items())))
 
-        if os.path.exists(temp_path) and os.path.getsize(temp_path) > 0:
-            print(f"✅ Graphique créé: {titre} -> {temp_path}")
-            return temp_path
-        else:
-            print(f"❌ Échec création: {titre}")
-            return None
+# -----------------------
+# Pages chargées à la demande (seul le module de la page affichée est importé)
+# -----------------------
 
-    except Exception as e:
-        print(f"❌ Erreur création graphique {titre}: {e}")
-        return None
+# Pages d'analyse d'une commune : exigent une commune sélectionnée sur l'accueil
+PAGES_COMMUNE = {
+    "Fonctionnement": "pages.fonctionnement",
+    "CAF": "pages.caf",
+    "Fiscalité": "pages.fiscalite",
+    "Endettement": "pages.endettements",
+    "Investissement": "pages.investissements",
+    "Fonds de roulement": "pages.fdr",
+}
 
-def create_pdf_report(commune, annees, departement=None):
-    """Crée un rapport PDF professionnel avec tous les indicateurs financiers et graphiques"""
-    
-    # Import local pour éviter les conflits
-    from io import BytesIO as PDFBytesIO
-    
-    # Récupération de toutes les données
-    with st.spinner("📄 Génération du rapport PDF avec graphiques..."):
-        all_data = get_all_commune_data(commune, annees, departement)
-    
-    # Liste pour stocker les fichiers temporaires à nettoyer
-    temp_files = []
-    
-    # Création du PDF en mémoire
-    pdf_buffer = PDFBytesIO()
-    doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, leftMargin=50, rightMargin=50)
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=30,
-        spaceAfter=50,
-        textColor=colors.darkblue,
-        alignment=1  # Center
+# Pages utilisables sans commune (la commune en session sert de valeur par défaut)
+PAGES_LIBRES = {
+    "Comparaison": "pages.comparaison",
+    "Communes similaires": "pages.similaires",
+    "Département": "pages.departement",
+}
 
+def charger_page(page):
+    """Fonction run() du module d'une page, importé au premier affichage"""
+    module = PAGES_COMMUNE.get(page) or PAGES_LIBRES[page]
+    return importlib.import_module(module).run
+
+# Préchargement en tâche de fond des pages de la commune en session (FOCUS_PRECHARGEMENT=0 pour couper)
+PRECHARGEMENT = os.environ.get("FOCUS_PRECHARGEMENT", "1").lower() not in ("0", "false", "no", "off")
+
+# Commune pré-remplie sur l'accueil : affichée sans choix de l'utilisateur, elle n'est
+# ni comptée ni préchargée (le préchargement importe les piles d'export)
+COMMUNE_PAR_DEFAUT = "RENAGE"
+
+def choisir_homonyme():
+    st.session_state["homonyme_choisi"] = True
+
+def noter_consultation(commune, departement):
+    """Choix explicite de la commune : ouvre le préchargement, compte la commune une fois par session (relue par warmup.py)"""
+    st.session_state["choix_explicite"] = True
+    import cache_persistant
+    if cache_persistant.consultations is None:
+        return
+    notees = st.session_state.setdefault("consultations_notees", set())
+    if (commune, departement) not in notees:
+        notees.add((commune, departement))
+        cache_persistant.consultations.noter(commune, departement)
+
+def lancer_prechargement():
+    """Précharge les pages d'analyse, les exports et les graphiques PDF de la commune choisie en session"""
+    if not PRECHARGEMENT or not st.session_state.get("choix_explicite"):
+        return
+    from prechargement import precharger_commune
+    precharger_commune(
+        st.session_state["commune"],
+        st.session_state["annees"],
+        st.session_state["departement"],
+        pages=PAGES_COMMUNE.values()
     )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        fontName='Helvetica-Bold',
-        parent=styles['Heading2'],
-        fontSize=30,
-        spaceAfter=60,
-        textColor=colors.navy,
-        alignment=1
-    )
-    
-    sub_heading_style = ParagraphStyle(
-        'SubHeading',
-        fontName='Helvetica-Bold',
-        parent=styles['Heading3'],
-        fontSize=26,
-        spaceAfter=50,
-        textColor=colors.darkgrey
-    )
-    
-    # Contenu du PDF
-    story = []
-    
-    # Page de titre
-    story.append(Paragraph(f"Focus Financier", title_style))
-    story.append(Paragraph(f"Analyse financière de la commune de {commune.upper()}", styles['Normal']))
-    story.append(Spacer(1, 20))
-    story.append(Paragraph(f"Période : {min(annees)} - {max(annees)}", styles['Normal']))
-    story.append(Paragraph(f"Date du rapport : {datetime.now().strftime('%d/%m/%Y')}", styles['Normal']))
-    story.append(PageBreak())
-    
-    # Synthèse exécutive
-    if not all_data['fonctionnement'].empty:
-        story.append(Paragraph("SYNTHÈSE EXÉCUTIVE", heading_style))
-        
-        # Tableau de synthèse
-        synthese_data = []
-        synthese_data.append(['Indicateur', 'Commune', 'Moyenne Strate'])
-        
-        # Population
-        pop_data = all_data['fonctionnement'].sort_values('Année')
-        if len(pop_data) > 0:
-            derniere_pop = pop_data.iloc[-1]['Population']
-            if len(pop_data) > 1:
-                evolution_pop = derniere_pop - pop_data.iloc[0]['Population']
-                synthese_data.append(['Population', f"{derniere_pop:,.0f} hab.", f"{evolution_pop:+.0f}"])
-            else:
-                synthese_data.append(['Population', f"{derniere_pop:,.0f} hab.", "N/A"])
-        
-       # FONCTIONNEMENT
-        if not all_data['fonctionnement'].empty:
-            fonc_data = all_data['fonctionnement'].sort_values('Année')
-            derniere_fonc = fonc_data.iloc[-1]
-            
-            rec_commune = derniere_fonc['Recettes réelles fonctionnement / hab']
-            rec_moyenne = derniere_fonc['Moyenne strate Recettes / hab']
-            synthese_data.append(['Recettes réelles fonct. / hab', f"{rec_commune:.0f} €", f"{rec_moyenne:.0f} €"])
-            
-            dep_commune = derniere_fonc['Dépenses réelles fonctionnement / hab']
-            dep_moyenne = derniere_fonc['Moyenne strate Dépenses / hab']
-            synthese_data.append(['Dépenses réelles fonct. / hab', f"{dep_commune:.0f} €", f"{dep_moyenne:.0f} €"])
-            
-            perso_commune = derniere_fonc['Dépenses personnel / hab']
-            perso_moyenne = derniere_fonc['Moyenne strate Personnel / hab']
-            synthese_data.append(['Dépenses personnel / hab', f"{perso_commune:.0f} €", f"{perso_moyenne:.0f} €"])
-            
-            ratio_commune = derniere_fonc['Ratio Personnel/DRF Commune']
-            ratio_moyenne = derniere_fonc['Ratio Personnel/DRF Moyenne']
-            synthese_data.append(['Ratio Personnel / DRF', f"{ratio_commune:.1f} %", f"{ratio_moyenne:.1f} %"])
-        
-        # CAF
-        if not all_data['caf'].empty:
-            caf_data = all_data['caf'].sort_values('Année')
-            derniere_caf = caf_data.iloc[-1]
-            
-            caf_commune = derniere_caf['CAF brute / hab Commune']
-            caf_moyenne = derniere_caf['CAF brute / hab Moyenne']
-            synthese_data.append(['CAF brute / hab', f"{caf_commune:.0f} €", f"{caf_moyenne:.0f} €"])
-            
-            cafbrut_commune = derniere_caf['CAF brute / RRF Commune']
-            cafbrut_moyenne = derniere_caf['CAF brute / RRF Moyenne']
-            synthese_data.append(['CAF brute / RRF', f"{cafbrut_commune:.1f} %", f"{cafbrut_moyenne:.1f} %"])
-            
-            cafnette_commune = derniere_caf['CAF nette / RRF Commune']
-            cafnette_moyenne = derniere_caf['CAF nette / RRF Moyenne']
-            synthese_data.append(['CAF nette / RRF', f"{cafnette_commune:.1f} %", f"{cafnette_moyenne:.1f} %"])
-        
-        # FISCALITÉ
-        if not all_data['fiscalite'].empty:
-            fisc_data = all_data['fiscalite'].sort_values('Année')
-            derniere_fisc = fisc_data.iloc[-1]
-            
-            impots_commune = derniere_fisc['Impôts / hab Commune']
-            impots_moyenne = derniere_fisc['Impôts / hab Moyenne']
-            synthese_data.append(['Impôts locaux / hab', f"{impots_commune:.0f} €", f"{impots_moyenne:.0f} €"])
-            
-            taux_th_commune = derniere_fisc['Taux TH Commune']
-            taux_th_moyenne = derniere_fisc['Taux TH Moyenne']
-            synthese_data.append(['Taux taxe habitation', f"{taux_th_commune:.2f} %", f"{taux_th_moyenne:.2f} %"])
-            
-            taux_tfb_commune = derniere_fisc['Taux TFB Commune']
-            taux_tfb_moyenne = derniere_fisc['Taux TFB Moyenne']
-            synthese_data.append(['Taux foncier bâti', f"{taux_tfb_commune:.2f} %", f"{taux_tfb_moyenne:.2f} %"])
-            
-            taux_tfnb_commune = derniere_fisc['Taux TFNB Commune']
-            taux_tfnb_moyenne = derniere_fisc['Taux TFNB Moyenne']
-            synthese_data.append(['Taux foncier non bâti', f"{taux_tfnb_commune:.2f} %", f"{taux_tfnb_moyenne:.2f} %"])
-        
-        # ENDETTEMENT
-        if not all_data['endettement'].empty:
-            dette_data = all_data['endettement'].sort_values('Année')
-            derniere_dette = dette_data.iloc[-1]
-            
-            dette_commune = derniere_dette['Dette / hab Commune']
-            dette_moyenne = derniere_dette['Dette / hab Moyenne']
-            synthese_data.append(['Dette / hab', f"{dette_commune:.0f} €", f"{dette_moyenne:.0f} €"])
-            
-            dette_ans_commune = derniere_dette['Dette en années CAF Commune']
-            dette_ans_moyenne = derniere_dette['Dette en années CAF Moyenne']
-            synthese_data.append(['Dette en années CAF', f"{dette_ans_commune:.1f} ans", f"{dette_ans_moyenne:.1f} ans"])
-
-        #FDR
-        if not all_data['fdr'].empty:
-            fdr_data = all_data['fdr'].sort_values('Année')
-            derniere_fdr = fdr_data.iloc[-1]
-            
-            fdr_commune = derniere_fdr['FDR / hab Commune']
-            fdr_moyenne = derniere_fdr['FDR / hab Moyenne']
-            synthese_data.append(['Fonds de roulement / hab', f"{fdr_commune:.0f} €", f"{fdr_moyenne:.0f} €"])
-            
-            fdr_jours_commune = derniere_fdr['FDR en jours DRF Commune']
-            fdr_jours_moyenne = derniere_fdr['FDR en jours DRF Moyenne']
-            synthese_data.append(['Fonds de roulement en jours de DRF', f"{fdr_jours_commune:.1f} jours", f"{fdr_jours_moyenne:.1f} jours"])
-        
-        # INVESTISSEMENT
-        if not all_data['investissement'].empty:
-            invest_data = all_data['investissement'].sort_values('Année')
-            derniere_invest = invest_data.iloc[-1]
-            
-            equip_commune = derniere_invest['Équipement / hab Commune']
-            equip_moyenne = derniere_invest['Équipement / hab Moyenne']
-            synthese_data.append(['Équipement / hab', f"{equip_commune:.0f} €", f"{equip_moyenne:.0f} €"])
-        
-
-        # Créer le tableau
-        synthese_table = Table(synthese_data)
-        synthese_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0),colors.darkblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        story.append(synthese_table)
-        story.append(Spacer(1, 20))
-    
-    # Section par section avec graphiques
-    sections_config = {
-        'Fonctionnement': {
-            'data': all_data['fonctionnement'],
-            'mini_tableaux': {
-                "Recettes et Dépenses": ["Recettes de fonctionnement", "Dépenses de fonctionnement"],
-                "Population": ["Population"],
-                "RRF / habitant": ["Recettes réelles fonctionnement / hab", "Moyenne strate Recettes / hab"],
-                "DRF / habitant": ["Dépenses réelles fonctionnement / hab", "Moyenne strate Dépenses / hab"],
-                "Dotation Globale de Fonctionnement": ["DGF / habitant", "Moyenne strate DGF / hab"],
-                "Dépenses de personnel / habitant": ["Dépenses personnel / hab", "Moyenne strate Personnel / hab"],
-                "Dépenses de personnel / DRF": ["Ratio Personnel/DRF Commune", "Ratio Personnel/DRF Moyenne"]
-            }
-        },
-        'CAF': {
-            'data': all_data['caf'],
-            'mini_tableaux': {
-                "CAF brute / habitant": ["CAF brute / hab Commune", "CAF brute / hab Moyenne"],
-                "CAF brute / RRF": ["CAF brute / RRF Commune", "CAF brute / RRF Moyenne"],
-                "CAF nette / RRF": ["CAF nette / RRF Commune", "CAF nette / RRF Moyenne"]
-            }
-        },
-        'Fiscalité': {
-            'data': all_data['fiscalite'],
-            'mini_tableaux': {
-                "Impôts locaux par habitant": ["Impôts / hab Commune", "Impôts / hab Moyenne"],
-                "Impôts locaux sur RRF": ["Impôts/RRF Commune", "Impôts/RRF Moyenne"],
-                "Taux taxe d'habitation": ["Taux TH Commune", "Taux TH Moyenne"],
-                "Taux taxe foncier bâti": ["Taux TFB Commune", "Taux TFB Moyenne"],
-                "Taux taxe foncier non bâti": ["Taux TFNB Commune", "Taux TFNB Moyenne"]
-            }
-        },
-        'Endettement': {
-            'data': all_data['endettement'],
-            'mini_tableaux': {
-                "Dette / Habitant": ["Dette / hab Commune", "Dette / hab Moyenne"],
-                "Dettes / RRF": ["Dette / RRF Commune", "Dette / RRF Moyenne"],
-                "Dette en années de CAF Brute": ["Dette en années CAF Commune", "Dette en années CAF Moyenne"],
-                "Part du remboursement de la dette / CAF Brute": [
-                    "Part du remboursement de la dette / CAF Brute Commune",
-                    "Part du remboursement de la dette / CAF Brute Moyenne"
-                ]
-            }
-        },
-        'Investissement': {
-            'data': all_data['investissement'],
-            'mini_tableaux': {
-                "Dépenses d'équipement / habitant": ["Équipement / hab Commune", "Équipement / hab Moyenne"],
-                "Dépenses d'équipement / RRF": ["Équipement / RRF Commune", "Équipement / RRF Moyenne"]
-            }
-        },
-        'Fonds de roulement': {
-            'data': all_data['fdr'],
-            'mini_tableaux': {
-                "Fonds de roulement / habitant": ["FDR / hab Commune", "FDR / hab Moyenne"],
-                "Fonds de roulement en jours de DRF": ["FDR en jours DRF Commune", "FDR en jours DRF Moyenne"]
-            }
-        }
-    }
-    
-    for section_name, config in sections_config.items():
-        df = config['data']
-        mini_tableaux = config['mini_tableaux']
-        
-        if not df.empty:
-            story.append(PageBreak())
-            story.append(Paragraph(section_name.upper(), heading_style))
-            
-            # Préparer le DataFrame avec index Année
-            if 'Année' in df.columns:
-                df_indexed = df.set_index('Année')
-            else:
-                df_indexed = df
-            
-            # Pour chaque mini-tableau dans la section
-            for titre, colonnes in mini_tableaux.items():
-                # Vérifier que les colonnes existent
-                colonnes_existantes = [col for col in colonnes if col in df_indexed.columns]
-                
-                if colonnes_existantes:
-                    story.append(Paragraph(titre, sub_heading_style))
-                    
-                    # Créer le tableau de données
-                    df_subset = df_indexed[colonnes_existantes].copy()
-                    
-                    # Convertir en liste pour le tableau PDF
-                    data = [['Année'] + list(df_subset.columns)]  # En-têtes
-                    for annee, row in df_subset.iterrows():
-                        formatted_row = [str(int(annee))]  # Année
-                        for val in row:
-                            if pd.isna(val):
-                                formatted_row.append("N/A")
-                            elif isinstance(val, (int, float)):
-                                formatted_row.append(f"{val:,.1f}")
-                            else:
-                                formatted_row.append(str(val))
-                        data.append(formatted_row)
-                    
-                    # Créer le tableau
-                    table = Table(data)
-                    table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 9),
-                        ('FONTSIZE', (0, 1), (-1, -1), 8),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                    ]))
-                    
-                    story.append(table)
-                    story.append(Spacer(1, 10))
-                    
-                    # Créer et ajouter le graphique
-                    chart_path = create_chart_image(df_indexed, colonnes_existantes, titre)
-                    if chart_path:
-                        temp_files.append(chart_path)
-                        try:
-                            # Vérifier que l'image existe et a une taille > 0
-                            if os.path.exists(chart_path) and os.path.getsize(chart_path) > 1000:  # Au moins 1KB
-                                chart_image = Image(chart_path, width=5*inch, height=3.3*inch)
-                                story.append(chart_image)
-                                story.append(Spacer(1, 15))
-                                story.append(PageBreak())
-                            else:
-                                # Message de diagnostic
-                                story.append(Paragraph(f"[Graphique {titre} non généré - données insuffisantes]", styles['Normal']))
-                                story.append(Spacer(1, 10))
-                        except Exception as e:
-                            # Message d'erreur dans le PDF
-                            story.append(Paragraph(f"[Erreur graphique {titre}: {str(e)[:50]}]", styles['Normal']))
-                            story.append(Spacer(1, 10))
-                    else:
-                        # Pas de graphique généré
-                        story.append(Paragraph(f"[Graphique {titre} non disponible]", styles['Normal']))
-                        story.append(Spacer(1, 10))
-    
-    # Page de notes/méthodologie
-    story.append(PageBreak())
-    story.append(Paragraph("NOTES MÉTHODOLOGIQUES", heading_style))
-    
-    notes_text = """
-    <b>Sources des données :</b><br/>
-    - Direction Générale des Finances Publiques (DGFiP)<br/>
-    - SFP COLLECTIVITÉS<br/>
-    - Dataset : Comptes individuels des communes<br/><br/>
-    """
-    
-    story.append(Paragraph(notes_text, styles['Normal']))
-    
-    # Construire le PDF
-    try:
-        doc.build(story)
-        pdf_buffer.seek(0)
-        pdf_data = pdf_buffer.getvalue()
-        
-        # Nettoyage des fichiers temporaires
-        for temp_file in temp_files:
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
-        
-        return pdf_data
-    
-    except Exception as e:
-        # Nettoyage en cas d'erreur
-        for temp_file in temp_files:
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
-        raise e
-    """Crée un fichier Excel complet avec tous les indicateurs financiers"""
-    
-    # Récupération de toutes les données
-    with st.spinner("📊 Récupération des données financières..."):
-        all_data = get_all_commune_data(commune, annees, departement)
-    
-    # Création du fichier Excel en mémoire avec BytesIO (solution alternative)
-    from io import BytesIO
-    
-    excel_buffer = BytesIO()
-    
-    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-        
-        # Page de synthèse
-        if not all_data['fonctionnement'].empty:
-            # Création d'un tableau de synthèse
-            synthese = all_data['fonctionnement'][['Année', 'Population']].copy()
-            
-            # Ajout des indicateurs clés de chaque module
-            if not all_data['caf'].empty:
-                synthese = synthese.merge(
-                    all_data['caf'][['Année', 'CAF brute / hab Commune', 'CAF brute / RRF Commune']], 
-                    on='Année', how='left'
-                )
-            
-            if not all_data['fiscalite'].empty:
-                synthese = synthese.merge(
-                    all_data['fiscalite'][['Année', 'Impôts / hab Commune']], 
-                    on='Année', how='left'
-                )
-            
-            if not all_data['endettement'].empty:
-                synthese = synthese.merge(
-                    all_data['endettement'][['Année', 'Dette / hab Commune', 'Dette en années CAF Commune']], 
-                    on='Année', how='left'
-                )
-            
-            synthese.to_excel(writer, sheet_name='Synthèse', index=False)
-        
-        # Écriture des données par module
-        if not all_data['fonctionnement'].empty:
-            all_data['fonctionnement'].to_excel(writer, sheet_name='Fonctionnement', index=False)
-        
-        if not all_data['caf'].empty:
-            all_data['caf'].to_excel(writer, sheet_name='CAF', index=False)
-        
-        if not all_data['fiscalite'].empty:
-            all_data['fiscalite'].to_excel(writer, sheet_name='Fiscalité', index=False)
-        
-        if not all_data['endettement'].empty:
-            all_data['endettement'].to_excel(writer, sheet_name='Endettement', index=False)
-        
-        if not all_data['investissement'].empty:
-            all_data['investissement'].to_excel(writer, sheet_name='Investissement', index=False)
-        
-        if not all_data['fdr'].empty:
-            all_data['fdr'].to_excel(writer, sheet_name='Fonds de roulement', index=False)
-    
-    # Récupération des données depuis le buffer
-    excel_buffer.seek(0)
-    excel_data = excel_buffer.getvalue()
-    
-def create_excel_report(commune, annees, departement):
-    """Crée un fichier Excel complet avec tous les indicateurs financiers"""
-    
-    # Récupération de toutes les données
-    with st.spinner("📊 Récupération des données financières..."):
-        all_data = get_all_commune_data(commune, annees, departement)
-    
-    # Création du fichier Excel en mémoire
-    excel_buffer = BytesIO()
-    
-    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-        
-        # Page de synthèse
-        if not all_data['fonctionnement'].empty:
-            # Création d'un tableau de synthèse
-            synthese = all_data['fonctionnement'][['Année', 'Population']].copy()
-            
-            # Ajout des indicateurs clés de chaque module
-            if not all_data['caf'].empty:
-                synthese = synthese.merge(
-                    all_data['caf'][['Année', 'CAF brute / hab Commune', 'CAF brute / RRF Commune']], 
-                    on='Année', how='left'
-                )
-            
-            if not all_data['fiscalite'].empty:
-                synthese = synthese.merge(
-                    all_data['fiscalite'][['Année', 'Impôts / hab Commune']], 
-                    on='Année', how='left'
-                )
-            
-            if not all_data['endettement'].empty:
-                synthese = synthese.merge(
-                    all_data['endettement'][['Année', 'Dette / hab Commune', 'Dette en années CAF Commune']], 
-                    on='Année', how='left'
-                )
-            
-            synthese.to_excel(writer, sheet_name='Synthèse', index=False)
-        
-        # Écriture des données par module
-        if not all_data['fonctionnement'].empty:
-            all_data['fonctionnement'].to_excel(writer, sheet_name='Fonctionnement', index=False)
-        
-        if not all_data['caf'].empty:
-            all_data['caf'].to_excel(writer, sheet_name='CAF', index=False)
-        
-        if not all_data['fiscalite'].empty:
-            all_data['fiscalite'].to_excel(writer, sheet_name='Fiscalité', index=False)
-        
-        if not all_data['endettement'].empty:
-            all_data['endettement'].to_excel(writer, sheet_name='Endettement', index=False)
-        
-        if not all_data['investissement'].empty:
-            all_data['investissement'].to_excel(writer, sheet_name='Investissement', index=False)
-        
-        if not all_data['fdr'].empty:
-            all_data['fdr'].to_excel(writer, sheet_name='Fonds de roulement', index=False)
-    
-    # Récupération des données depuis le buffer
-    excel_buffer.seek(0)
-    excel_data = excel_buffer.getvalue()
-    
-    return excel_data
 
 # -----------------------
 # Sidebar navigation
 # -----------------------
 st.sidebar.title("Navigation")
-page = st.sidebar.selectbox("Choisissez la page :", [
-    "Accueil",
-    "Fonctionnement",
-    "CAF",
-    "Fiscalité",
-    "Endettement",
-    "Investissement",
-    "Fonds de roulement"
-])
+page = st.sidebar.selectbox(
+    "Choisissez la page :",
+    ["Accueil", *PAGES_COMMUNE, *PAGES_LIBRES, "Diagnostic"]
+)
 
 
 # ============================================================
@@ -697,6 +174,12 @@ if "annees" not in st.session_state:
 commune_selectionnee = st.session_state["commune"]
 departement_selectionne = st.session_state["departement"]
 annees = st.session_state["annees"]
+lancer_prechargement()
+
+compteur_requetes = None
+if DEBUG_REQUESTS:
+    reset_request_counters()
+    compteur_requetes = compter_requetes(f"rerun {page}").start()
 
 # ============================================================
 # 🏠 Page d'accueil
@@ -718,7 +201,7 @@ if page == "Accueil":
     with col1:
         commune_input = st.text_input(
             "Nom de la commune (⚠️ écrire le nom de la commune en majuscule) :", 
-            value="RENAGE"
+            value=COMMUNE_PAR_DEFAUT
         )
 
         commune_selectionnee = None
@@ -744,7 +227,7 @@ if page == "Accueil":
                     f"{c['nom']} - Dépt {c['departement']} (Pop: {c['population']:,})"
                     for c in communes_trouvees
                 ]
-                selection = st.selectbox("Choisissez la commune :", options)
+                selection = st.selectbox("Choisissez la commune :", options, on_change=choisir_homonyme)
 
                 # Extraction de la sélection
                 for i, opt in enumerate(options):
@@ -757,6 +240,9 @@ if page == "Accueil":
         if commune_selectionnee and departement_selectionne:
             st.session_state["commune"] = commune_selectionnee
             st.session_state["departement"] = departement_selectionne
+            # Choix explicite seulement : nom saisi ou homonyme choisi (la page d'analyse compte aussi)
+            if nom_commune(commune_input) != COMMUNE_PAR_DEFAUT or st.session_state.get("homonyme_choisi"):
+                noter_consultation(commune_selectionnee, departement_selectionne)
 
     # Sélecteur d’années
     with col2:
@@ -767,6 +253,9 @@ if page == "Accueil":
         )
         st.session_state["annees"] = annees
 
+    # Commune ou années modifiées : les autres pages se chargent pendant la lecture de l'accueil
+    lancer_prechargement()
+
     # ============================================================
     # 📊 Section Export Excel / PDF / CSV
     # ============================================================
@@ -781,7 +270,9 @@ if page == "Accueil":
         with col1:
             if st.button("📄 Rapport Excel", type="primary", use_container_width=True):
                 try:
-                    excel_data = create_excel_report(commune_selectionnee, annees, departement_selectionne)
+                    from reports import create_excel_report
+                    with profile("Rapport Excel") as timeline:
+                        excel_data = create_excel_report(commune_selectionnee, annees, departement_selectionne)
                     filename = f"Focus_Financier_{commune_selectionnee}_{min(annees)}-{max(annees)}.xlsx"
                     st.download_button(
                         label="📥 Télécharger Excel",
@@ -791,6 +282,7 @@ if page == "Accueil":
                         use_container_width=True
                     )
                     st.success("✅ Excel généré !")
+                    afficher_profil(timeline)
                 except Exception as e:
                     st.error(f"❌ Erreur Excel : {str(e)}")
 
@@ -798,7 +290,9 @@ if page == "Accueil":
         with col2:
             if st.button("📄 Rapport PDF", type="secondary", use_container_width=True):
                 try:
-                    pdf_data = create_pdf_report(commune_selectionnee, annees, departement_selectionne)
+                    from reports import create_pdf_report
+                    with profile("Rapport PDF") as timeline:
+                        pdf_data = create_pdf_report(commune_selectionnee, annees, departement_selectionne)
                     filename_pdf = f"Focus_Financier_{commune_selectionnee}_{min(annees)}-{max(annees)}.pdf"
                     st.download_button(
                         label="📥 Télécharger PDF",
@@ -808,8 +302,9 @@ if page == "Accueil":
                         use_container_width=True
                     )
                     st.success("✅ PDF généré !")
-                except ImportError:
-                    st.error("❌ Dépendance manquante : `pip install kaleido`")
+                    afficher_profil(timeline)
+                except ImportError as e:
+                    st.error(f"❌ Dépendance manquante pour le PDF ({e.name}) : `pip install reportlab matplotlib seaborn`")
                 except Exception as e:
                     st.error(f"❌ Erreur PDF : {str(e)}")
 
@@ -833,6 +328,34 @@ if page == "Accueil":
                 except Exception as e:
                     st.error(f"Erreur : {str(e)}")
 
+        # Export colonnaire (Parquet / Arrow IPC)
+        col_format, col_bouton = st.columns([1, 2])
+        with col_format:
+            format_colonnaire = st.selectbox(
+                "Format colonnaire :",
+                options=["parquet", "arrow"],
+                format_func=lambda f: "Parquet (.parquet)" if f == "parquet" else "Arrow IPC (.arrow)"
+            )
+        with col_bouton:
+            if st.button("📦 Export Parquet / Arrow (6 modules)", use_container_width=True):
+                try:
+                    from reports import create_columnar_export
+                    zip_data = create_columnar_export(
+                        commune_selectionnee, annees, departement_selectionne, format=format_colonnaire
+                    )
+                    filename_zip = f"Focus_Financier_{commune_selectionnee}_{min(annees)}-{max(annees)}_{format_colonnaire}.zip"
+                    st.download_button(
+                        label=f"📥 Télécharger {format_colonnaire.capitalize()} (zip)",
+                        data=zip_data,
+                        file_name=filename_zip,
+                        mime="application/zip",
+                        use_container_width=True
+                    )
+                except ImportError:
+                    st.error("❌ Dépendance manquante : `pip install pyarrow`")
+                except Exception as e:
+                    st.error(f"❌ Erreur export colonnaire : {str(e)}")
+
 # Informations sur les formats
         st.markdown("---")
         st.markdown("### 📋 Formats d'export")
@@ -866,9 +389,84 @@ if page == "Accueil":
             - Léger et rapide
             """)
 
+        st.markdown("""
+        **📦 Parquet / Arrow IPC :** archive zip contenant les six modules (un fichier par module),
+        colonnes typées et compressées (zstd), lisibles directement avec `pandas.read_parquet`
+        ou `pyarrow.ipc.open_file`.
+        """)
+
     elif commune_input and annees and not commune_selectionnee:
         st.info("Veuillez sélectionner une commune dans la liste ci-dessus pour générer les rapports.")
 
+    # ============================================================
+    # 🇫🇷 Export open data du panel national (stockage local)
+    # ============================================================
+
+    with st.expander("🇫🇷 Export open data : panel national (toutes communes, toutes années)"):
+        import panel_store
+
+        annees_panel = panel_store.annees_disponibles()
+        if not annees_panel:
+            st.info("Stockage local vide. Lancez `python panel_store.py build` pour télécharger le panel.")
+        else:
+            colonnes_panel = [
+                c for c in panel_store.colonnes_disponibles()
+                if c not in panel_store.COLONNES_IDENTIFIANTS
+            ]
+            indicateurs_panel = st.multiselect(
+                "Indicateurs à exporter :",
+                options=colonnes_panel,
+                default=[c for c in ["pop1", "fprod", "fcharge", "fcaf", "fdette"] if c in colonnes_panel]
+            )
+            annees_export = st.multiselect("Années :", options=annees_panel, default=annees_panel)
+            format_panel = st.radio("Format :", ["csv", "ndjson"], horizontal=True)
+
+            if st.button("📊 Générer l'export du panel", use_container_width=True):
+                if not annees_export:
+                    st.warning("⚠️ Sélectionnez au moins une année à exporter.")
+                else:
+                    try:
+                        # Écriture lot par lot, plafonnée : le bouton de téléchargement garde
+                        # les octets en mémoire de session, les gros exports passent par la CLI
+                        export_file = io.BytesIO()
+                        taille = panel_store.write_panel_export(
+                            export_file, indicateurs_panel, annees_export, format=format_panel,
+                            max_octets=panel_store.EXPORT_APP_MAX_OCTETS
+                        )
+                        if taille is None:
+                            st.warning(
+                                f"⚠️ Export supérieur à {panel_store.EXPORT_APP_MAX_OCTETS / 1e6:.0f} Mo : "
+                                "réduisez la sélection ou lancez-le en ligne de commande."
+                            )
+                            st.code(panel_store.commande_export(indicateurs_panel, annees_export, format_panel),
+                                    language="bash")
+                        else:
+                            st.download_button(
+                                label=f"📥 Télécharger le panel ({taille / 1e6:.1f} Mo)",
+                                data=export_file.getvalue(),
+                                file_name=f"Focus_Financier_panel_national.{format_panel}",
+                                mime="text/csv" if format_panel == "csv" else "application/x-ndjson",
+                                use_container_width=True
+                            )
+                    except Exception as e:
+                        st.error(f"❌ Erreur export panel : {str(e)}")
+
+# ============================================================
+# 🛠️ Diagnostic (caches, indépendant de la commune)
+# ============================================================
+
+elif page == "Diagnostic":
+    from pages.diagnostic import run
+    run()
+
+# ============================================================
+# ⚖️ Comparaison, 🧭 communes similaires, 🗺️ département (commune facultative)
+# ============================================================
+
+elif page in PAGES_LIBRES:
+    run = charger_page(page)
+    run(st.session_state.get("commune"), st.session_state.get("annees"), st.session_state.get("departement"))
+
 # ============================================================
 # 🔄 Autres pages (fonctionnement, CAF, fiscalité, etc.)
 # ============================================================
@@ -885,27 +483,17 @@ else:
     else:
         st.markdown(f"**Commune :** {commune} | **Département :** {departement or 'N/A'} | **Période :** {min(annees_session)}–{max(annees_session)}")
         st.markdown("---")
+        noter_consultation(commune, departement)
+        lancer_prechargement()
 
         try:
-            if page == "Fonctionnement":
-                from pages.fonctionnement import run
-                run(commune, annees_session, departement)
-            elif page == "CAF":
-                from pages.caf import run
-                run(commune, annees_session, departement)
-            elif page == "Fiscalité":
-                from pages.fiscalite import run
-                run(commune, annees_session, departement)
-            elif page == "Endettement":
-                from pages.endettements import run
-                run(commune, annees_session, departement)
-            elif page == "Investissement":
-                from pages.investissements import run
-                run(commune, annees_session, departement)
-            elif page == "Fonds de roulement":
-                from pages.fdr import run
-                run(commune, annees_session, departement)
+            run = charger_page(page)
+            run(commune, annees_session, departement)
         except ImportError as e:
             st.error(f"Erreur lors du chargement de la page : {str(e)}")
         except Exception as e:
             st.error(f"Erreur lors de l'exécution : {str(e)}")
+
+if compteur_requetes is not None:
+    compteur_requetes.stop()
+    afficher_bandeau_requetes(compteur_requetes, st.session_state.get("commune"), st.session_state.get("annees"))
@@ -0,0 +1,109 @@
+# profiling.py - Chronométrage par étape des exports (PDF, Excel), format Chrome trace
+#
+# Activé uniquement si FOCUS_PROFILE=1 au démarrage. Désactivé, `stage()` retourne
+# un context manager vide partagé : aucune horloge lue, aucune allocation.
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+PROFILING_ENABLED = os.environ.get("FOCUS_PROFILE", "").lower() in ("1", "true", "yes", "on")
+
+# Derniers profils terminés, consultables après coup
+RECENT_TIMELINES = deque(maxlen=10)
+
+_current = threading.local()
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class Timeline:
+    """Suite d'étapes chronométrées d'une exécution (imbrication par profondeur)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.events = []
+        self._t0 = time.perf_counter()
+        self._depth = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **args):
+        debut = time.perf_counter()
+        self._depth += 1
+        depth = self._depth
+        try:
+            yield
+        finally:
+            fin = time.perf_counter()
+            self._depth -= 1
+            with self._lock:
+                self.events.append({
+                    "name": name,
+                    "start": debut - self._t0,
+                    "duration": fin - debut,
+                    "depth": depth,
+                    "thread": threading.get_ident(),
+                    "args": args,
+                })
+
+    @property
+    def total(self):
+        return max((e["start"] + e["duration"] for e in self.events), default=0.0)
+
+    def rows(self):
+        """Étapes triées par début, pour affichage en tableau ou en frise"""
+        return sorted(self.events, key=lambda e: (e["start"], e["depth"]))
+
+    def to_chrome_trace(self):
+        """JSON au format Trace Event (chrome://tracing, Perfetto)"""
+        trace_events = [{
+            "name": e["name"],
+            "cat": self.name,
+            "ph": "X",
+            "ts": round(e["start"] * 1e6, 1),
+            "dur": round(e["duration"] * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": e["thread"],
+            "args": {k: str(v) for k, v in e["args"].items()},
+        } for e in self.rows()]
+        return json.dumps({"traceEvents": trace_events, "displayTimeUnit": "ms"}, ensure_ascii=False)
+
+def _stage_actif(name, **args):
+    timeline = getattr(_current, "timeline", None)
+    if timeline is None:
+        return _NULL_STAGE
+    return timeline.stage(name, **args)
+
+def _stage_inactif(name, **args):
+    return _NULL_STAGE
+
+# Choisi une fois pour toutes à l'import
+stage = _stage_actif if PROFILING_ENABLED else _stage_inactif
+
+@contextmanager
+def profile(name):
+    """Ouvre une timeline pour le thread courant ; produit None si le profilage est désactivé"""
+    if not PROFILING_ENABLED:
+        yield None
+        return
+
+    timeline = Timeline(name)
+    precedente = getattr(_current, "timeline", None)
+    _current.timeline = timeline
+    try:
+        with timeline.stage(name):
+            yield timeline
+    finally:
+        _current.timeline = precedente
+        RECENT_TIMELINES.append(timeline)
@@ -0,0 +1,733 @@
+# reports.py - Construction des exports (PDF, Excel, Parquet/Arrow) d'une commune
+#
+# Séparé de prod.py pour pouvoir générer les rapports hors de l'interface
+# (scripts, benchmarks) : importer prod.py exécute toute la page Streamlit.
+import hashlib
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+from functools import lru_cache
+from io import BytesIO
+from datetime import datetime
+
+import streamlit as st
+import pandas as pd
+
+import cache_persistant
+from app_fetchers import get_all_commune_data
+from caches import LRUCache
+from profiling import stage
+
+# Navigateurs utilisables par kaleido >= 1 (qui n'embarque plus Chromium)
+NAVIGATEURS = ("google-chrome", "chrome", "chromium", "chromium-browser")
+
+@lru_cache(maxsize=None)
+def capacites_rendu():
+    """Moteurs d'images statiques disponibles, sondés une fois par processus.
+
+    Rien n'est exécuté : ni pip, ni Chromium, ni rendu de test. Les graphiques
+    du PDF passent toujours par matplotlib ; kaleido n'est qu'informatif.
+    """
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        version_kaleido = version("kaleido")
+    except PackageNotFoundError:
+        version_kaleido = None
+    # kaleido 0.x embarque son Chromium ; les versions suivantes utilisent celui du système
+    chrome = bool(os.environ.get("BROWSER_PATH")) or any(shutil.which(n) for n in NAVIGATEURS)
+    return {
+        "matplotlib": importlib.util.find_spec("matplotlib") is not None,
+        "reportlab": importlib.util.find_spec("reportlab") is not None,
+        "kaleido": version_kaleido,
+        "chrome": chrome or (version_kaleido or "").startswith("0."),
+    }
+
+# Sections du PDF : module de get_all_commune_data et mini-tableaux (titre -> colonnes)
+SECTIONS_PDF = {
+    'Fonctionnement': {
+        'module': 'fonctionnement',
+        'mini_tableaux': {
+            "Recettes et Dépenses": ["Recettes de fonctionnement", "Dépenses de fonctionnement"],
+            "Population": ["Population"],
+            "RRF / habitant": ["Recettes réelles fonctionnement / hab", "Moyenne strate Recettes / hab"],
+            "DRF / habitant": ["Dépenses réelles fonctionnement / hab", "Moyenne strate Dépenses / hab"],
+            "Dotation Globale de Fonctionnement": ["DGF / habitant", "Moyenne strate DGF / hab"],
+            "Dépenses de personnel / habitant": ["Dépenses personnel / hab", "Moyenne strate Personnel / hab"],
+            "Dépenses de personnel / DRF": ["Ratio Personnel/DRF Commune", "Ratio Personnel/DRF Moyenne"]
+        }
+    },
+    'CAF': {
+        'module': 'caf',
+        'mini_tableaux': {
+            "CAF brute / habitant": ["CAF brute / hab Commune", "CAF brute / hab Moyenne"],
+            "CAF brute / RRF": ["CAF brute / RRF Commune", "CAF brute / RRF Moyenne"],
+            "CAF nette / RRF": ["CAF nette / RRF Commune", "CAF nette / RRF Moyenne"]
+        }
+    },
+    'Fiscalité': {
+        'module': 'fiscalite',
+        'mini_tableaux': {
+            "Impôts locaux par habitant": ["Impôts / hab Commune", "Impôts / hab Moyenne"],
+            "Impôts locaux sur RRF": ["Impôts/RRF Commune", "Impôts/RRF Moyenne"],
+            "Taux taxe d'habitation": ["Taux TH Commune", "Taux TH Moyenne"],
+            "Taux taxe foncier bâti": ["Taux TFB Commune", "Taux TFB Moyenne"],
+            "Taux taxe foncier non bâti": ["Taux TFNB Commune", "Taux TFNB Moyenne"]
+        }
+    },
+    'Endettement': {
+        'module': 'endettement',
+        'mini_tableaux': {
+            "Dette / Habitant": ["Dette / hab Commune", "Dette / hab Moyenne"],
+            "Dettes / RRF": ["Dette / RRF Commune", "Dette / RRF Moyenne"],
+            "Dette en années de CAF Brute": ["Dette en années CAF Commune", "Dette en années CAF Moyenne"],
+            "Part du remboursement de la dette / CAF Brute": [
+                "Part du remboursement de la dette / CAF Brute Commune",
+                "Part du remboursement de la dette / CAF Brute Moyenne"
+            ]
+        }
+    },
+    'Investissement': {
+        'module': 'investissement',
+        'mini_tableaux': {
+            "Dépenses d'équipement / habitant": ["Équipement / hab Commune", "Équipement / hab Moyenne"],
+            "Dépenses d'équipement / RRF": ["Équipement / RRF Commune", "Équipement / RRF Moyenne"]
+        }
+    },
+    'Fonds de roulement': {
+        'module': 'fdr',
+        'mini_tableaux': {
+            "Fonds de roulement / habitant": ["FDR / hab Commune", "FDR / hab Moyenne"],
+            "Fonds de roulement en jours de DRF": ["FDR en jours DRF Commune", "FDR en jours DRF Moyenne"]
+        }
+    }
+}
+
+# PNG des graphiques du PDF, par contenu (titre, colonnes, valeurs) : un export
+# relancé, ou préchargé en tâche de fond, ne refait pas le rendu matplotlib.
+# Derrière ce cache, le cache disque (cache_persistant) s'il est ouvert.
+GRAPHIQUES_CACHE_SIZE = 256
+GRAPHIQUES_CACHE_TTL = 3600
+
+_graphiques_cache = LRUCache(maxsize=GRAPHIQUES_CACHE_SIZE, ttl=GRAPHIQUES_CACHE_TTL, name="graphiques_pdf")
+
+# pyplot n'est pas thread-safe : rendus sérialisés (export et préchargement)
+_rendu_lock = threading.Lock()
+
+def _cle_graphique(df, colonnes, titre):
+    contenu = pd.util.hash_pandas_object(df[colonnes].reset_index(), index=False).to_numpy()
+    return titre, tuple(colonnes), hashlib.sha1(contenu.tobytes()).hexdigest()
+
+def _rendre_graphique(df, colonnes, titre):
+    """PNG (octets) du graphique d'évolution, None si pas de données"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Préparation des données
+    df_plot = df[colonnes].reset_index().melt(
+        id_vars="Année", var_name="Indicateur", value_name="Valeur"
+    )
+
+    # Vérifier qu'il y a des données
+    if df_plot.empty or df_plot['Valeur'].isna().all():
+        return None
+
+    # Couleurs personnalisées
+    colors_palette = ['#1f4e79', '#87ceeb']  # Bleu foncé, bleu clair
+
+    with _rendu_lock:
+        # Création du graphique
+        plt.figure(figsize=(8, 6))
+        sns.set(style="whitegrid")
+
+        for i, indicateur in enumerate(df_plot['Indicateur'].unique()):
+            data = df_plot[df_plot['Indicateur'] == indicateur]
+            plt.plot(
+                data["Année"],
+                data["Valeur"],
+                marker='o',
+                linewidth=2,
+                markersize=6,
+                label=indicateur,
+                color=colors_palette[i % len(colors_palette)]
+            )
+
+        plt.title(f"Évolution - {titre}", fontsize=14, weight="bold")
+        plt.xlabel("Année", fontsize=12)
+        plt.ylabel("Valeur", fontsize=12)
+        plt.legend(loc="upper center", bbox_to_anchor=(0.5, -0.15), ncol=len(df_plot['Indicateur'].unique()))
+        plt.tight_layout()
+
+        png = BytesIO()
+        plt.savefig(png, format="png", dpi=150)
+        plt.close()
+    return png.getvalue() or None
+
+def graphique_png(df, colonnes, titre):
+    """PNG du graphique d'évolution, en cache ; None si pas de données"""
+    if df.empty or not colonnes:
+        return None
+    cle = _cle_graphique(df, colonnes, titre)
+    png = _graphiques_cache.get(cle)
+    if png is not None:
+        return png
+
+    disque = cache_persistant.graphiques
+    png = disque.get(repr(cle)) if disque is not None else None
+    if png is None:
+        png = _rendre_graphique(df, colonnes, titre)
+        if png is None:
+            return None
+        if disque is not None:
+            disque.set(repr(cle), png)
+    _graphiques_cache.set(cle, png)
+    return png
+
+def create_chart_image(df, colonnes, titre):
+    """Crée un graphique Matplotlib et le sauvegarde comme image temporaire"""
+    try:
+        png = graphique_png(df, colonnes, titre)
+        if png is None:
+            return None
+
+        # Sauvegarde en fichier temporaire
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_file:
+            temp_file.write(png)
+        print(f"✅ Graphique créé: {titre} -> {temp_file.name}")
+        return temp_file.name
+
+    except Exception as e:
+        print(f"❌ Erreur création graphique {titre}: {e}")
+        return None
+
+def precharger_graphiques(commune, annees, departement=None):
+    """Calcule (en cache) les graphiques du PDF d'une commune sans construire le PDF ; retourne leur nombre"""
+    all_data = get_all_commune_data(commune, annees, departement)
+    nb_graphiques = 0
+    for config in SECTIONS_PDF.values():
+        df = all_data[config['module']]
+        if df.empty:
+            continue
+        df_indexed = df.set_index('Année') if 'Année' in df.columns else df
+        for titre, colonnes in config['mini_tableaux'].items():
+            colonnes_existantes = [col for col in colonnes if col in df_indexed.columns]
+            if graphique_png(df_indexed, colonnes_existantes, titre) is not None:
+                nb_graphiques += 1
+    return nb_graphiques
+
+def create_pdf_report(commune, annees, departement=None):
+    """Crée un rapport PDF professionnel avec tous les indicateurs financiers et graphiques"""
+    
+    # Import local pour éviter les conflits
+    from io import BytesIO as PDFBytesIO
+    # reportlab n'est chargé que pour le PDF (pas pour Excel ni Parquet)
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    
+    # Récupération de toutes les données
+    with st.spinner("📄 Génération du rapport PDF avec graphiques..."):
+        with stage("Récupération des données"):
+            all_data = get_all_commune_data(commune, annees, departement)
+    
+    # Liste pour stocker les fichiers temporaires à nettoyer
+    temp_files = []
+    
+    # Création du PDF en mémoire
+    pdf_buffer = PDFBytesIO()
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, leftMargin=50, rightMargin=50)
+    
+    # Styles
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=30,
+        spaceAfter=50,
+        textColor=colors.darkblue,
+        alignment=1  # Center
+
+    )
+    
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        fontName='Helvetica-Bold',
+        parent=styles['Heading2'],
+        fontSize=30,
+        spaceAfter=60,
+        textColor=colors.navy,
+        alignment=1
+    )
+    
+    sub_heading_style = ParagraphStyle(
+        'SubHeading',
+        fontName='Helvetica-Bold',
+        parent=styles['Heading3'],
+        fontSize=26,
+        spaceAfter=50,
+        textColor=colors.darkgrey
+    )
+    
+    # Contenu du PDF
+    story = []
+    
+    # Page de titre
+    story.append(Paragraph(f"Focus Financier", title_style))
+    story.append(Paragraph(f"Analyse financière de la commune de {commune.upper()}", styles['Normal']))
+    story.append(Spacer(1, 20))
+    story.append(Paragraph(f"Période : {min(annees)} - {max(annees)}", styles['Normal']))
+    story.append(Paragraph(f"Date du rapport : {datetime.now().strftime('%d/%m/%Y')}", styles['Normal']))
+    story.append(PageBreak())
+    
+    # Synthèse exécutive
+    with stage("Synthèse exécutive"):
+        if not all_data['fonctionnement'].empty:
+            story.append(Paragraph("SYNTHÈSE EXÉCUTIVE", heading_style))
+        
+            # Tableau de synthèse
+            synthese_data = []
+            synthese_data.append(['Indicateur', 'Commune', 'Moyenne Strate'])
+        
+            # Population
+            pop_data = all_data['fonctionnement'].sort_values('Année')
+            if len(pop_data) > 0:
+                derniere_pop = pop_data.iloc[-1]['Population']
+                if len(pop_data) > 1:
+                    evolution_pop = derniere_pop - pop_data.iloc[0]['Population']
+                    synthese_data.append(['Population', f"{derniere_pop:,.0f} hab.", f"{evolution_pop:+.0f}"])
+                else:
+                    synthese_data.append(['Population', f"{derniere_pop:,.0f} hab.", "N/A"])
+        
+           # FONCTIONNEMENT
+            if not all_data['fonctionnement'].empty:
+                fonc_data = all_data['fonctionnement'].sort_values('Année')
+                derniere_fonc = fonc_data.iloc[-1]
+            
+                rec_commune = derniere_fonc['Recettes réelles fonctionnement / hab']
+                rec_moyenne = derniere_fonc['Moyenne strate Recettes / hab']
+                synthese_data.append(['Recettes réelles fonct. / hab', f"{rec_commune:.0f} €", f"{rec_moyenne:.0f} €"])
+            
+                dep_commune = derniere_fonc['Dépenses réelles fonctionnement / hab']
+                dep_moyenne = derniere_fonc['Moyenne strate Dépenses / hab']
+                synthese_data.append(['Dépenses réelles fonct. / hab', f"{dep_commune:.0f} €", f"{dep_moyenne:.0f} €"])
+            
+                perso_commune = derniere_fonc['Dépenses personnel / hab']
+                perso_moyenne = derniere_fonc['Moyenne strate Personnel / hab']
+                synthese_data.append(['Dépenses personnel / hab', f"{perso_commune:.0f} €", f"{perso_moyenne:.0f} €"])
+            
+                ratio_commune = derniere_fonc['Ratio Personnel/DRF Commune']
+                ratio_moyenne = derniere_fonc['Ratio Personnel/DRF Moyenne']
+                synthese_data.append(['Ratio Personnel / DRF', f"{ratio_commune:.1f} %", f"{ratio_moyenne:.1f} %"])
+        
+            # CAF
+            if not all_data['caf'].empty:
+                caf_data = all_data['caf'].sort_values('Année')
+                derniere_caf = caf_data.iloc[-1]
+            
+                caf_commune = derniere_caf['CAF brute / hab Commune']
+                caf_moyenne = derniere_caf['CAF brute / hab Moyenne']
+                synthese_data.append(['CAF brute / hab', f"{caf_commune:.0f} €", f"{caf_moyenne:.0f} €"])
+            
+                cafbrut_commune = derniere_caf['CAF brute / RRF Commune']
+                cafbrut_moyenne = derniere_caf['CAF brute / RRF Moyenne']
+                synthese_data.append(['CAF brute / RRF', f"{cafbrut_commune:.1f} %", f"{cafbrut_moyenne:.1f} %"])
+            
+                cafnette_commune = derniere_caf['CAF nette / RRF Commune']
+                cafnette_moyenne = derniere_caf['CAF nette / RRF Moyenne']
+                synthese_data.append(['CAF nette / RRF', f"{cafnette_commune:.1f} %", f"{cafnette_moyenne:.1f} %"])
+        
+            # FISCALITÉ
+            if not all_data['fiscalite'].empty:
+                fisc_data = all_data['fiscalite'].sort_values('Année')
+                derniere_fisc = fisc_data.iloc[-1]
+            
+                impots_commune = derniere_fisc['Impôts / hab Commune']
+                impots_moyenne = derniere_fisc['Impôts / hab Moyenne']
+                synthese_data.append(['Impôts locaux / hab', f"{impots_commune:.0f} €", f"{impots_moyenne:.0f} €"])
+            
+                taux_th_commune = derniere_fisc['Taux TH Commune']
+                taux_th_moyenne = derniere_fisc['Taux TH Moyenne']
+                synthese_data.append(['Taux taxe habitation', f"{taux_th_commune:.2f} %", f"{taux_th_moyenne:.2f} %"])
+            
+                taux_tfb_commune = derniere_fisc['Taux TFB Commune']
+                taux_tfb_moyenne = derniere_fisc['Taux TFB Moyenne']
+                synthese_data.append(['Taux foncier bâti', f"{taux_tfb_commune:.2f} %", f"{taux_tfb_moyenne:.2f} %"])
+            
+                taux_tfnb_commune = derniere_fisc['Taux TFNB Commune']
+                taux_tfnb_moyenne = derniere_fisc['Taux TFNB Moyenne']
+                synthese_data.append(['Taux foncier non bâti', f"{taux_tfnb_commune:.2f} %", f"{taux_tfnb_moyenne:.2f} %"])
+        
+            # ENDETTEMENT
+            if not all_data['endettement'].empty:
+                dette_data = all_data['endettement'].sort_values('Année')
+                derniere_dette = dette_data.iloc[-1]
+            
+                dette_commune = derniere_dette['Dette / hab Commune']
+                dette_moyenne = derniere_dette['Dette / hab Moyenne']
+                synthese_data.append(['Dette / hab', f"{dette_commune:.0f} €", f"{dette_moyenne:.0f} €"])
+            
+                dette_ans_commune = derniere_dette['Dette en années CAF Commune']
+                dette_ans_moyenne = derniere_dette['Dette en années CAF Moyenne']
+                synthese_data.append(['Dette en années CAF', f"{dette_ans_commune:.1f} ans", f"{dette_ans_moyenne:.1f} ans"])
+
+            #FDR
+            if not all_data['fdr'].empty:
+                fdr_data = all_data['fdr'].sort_values('Année')
+                derniere_fdr = fdr_data.iloc[-1]
+            
+                fdr_commune = derniere_fdr['FDR / hab Commune']
+                fdr_moyenne = derniere_fdr['FDR / hab Moyenne']
+                synthese_data.append(['Fonds de roulement / hab', f"{fdr_commune:.0f} €", f"{fdr_moyenne:.0f} €"])
+            
+                fdr_jours_commune = derniere_fdr['FDR en jours DRF Commune']
+                fdr_jours_moyenne = derniere_fdr['FDR en jours DRF Moyenne']
+                synthese_data.append(['Fonds de roulement en jours de DRF', f"{fdr_jours_commune:.1f} jours", f"{fdr_jours_moyenne:.1f} jours"])
+        
+            # INVESTISSEMENT
+            if not all_data['investissement'].empty:
+                invest_data = all_data['investissement'].sort_values('Année')
+                derniere_invest = invest_data.iloc[-1]
+            
+                equip_commune = derniere_invest['Équipement / hab Commune']
+                equip_moyenne = derniere_invest['Équipement / hab Moyenne']
+                synthese_data.append(['Équipement / hab', f"{equip_commune:.0f} €", f"{equip_moyenne:.0f} €"])
+        
+
+            # Créer le tableau
+            synthese_table = Table(synthese_data)
+            synthese_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0),colors.darkblue),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 12),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black)
+            ]))
+        
+            story.append(synthese_table)
+            story.append(Spacer(1, 20))
+    
+    # Section par section avec graphiques
+    sections_config = {
+        nom: {'data': all_data[config['module']], 'mini_tableaux': config['mini_tableaux']}
+        for nom, config in SECTIONS_PDF.items()
+    }
+    
+    for section_name, config in sections_config.items():
+        df = config['data']
+        mini_tableaux = config['mini_tableaux']
+        
+        if not df.empty:
+            with stage(f"Section {section_name}"):
+                story.append(PageBreak())
+                story.append(Paragraph(section_name.upper(), heading_style))
+            
+                # Préparer le DataFrame avec index Année
+                if 'Année' in df.columns:
+                    df_indexed = df.set_index('Année')
+                else:
+                    df_indexed = df
+            
+                # Pour chaque mini-tableau dans la section
+                for titre, colonnes in mini_tableaux.items():
+                    # Vérifier que les colonnes existent
+                    colonnes_existantes = [col for col in colonnes if col in df_indexed.columns]
+                
+                    if colonnes_existantes:
+                        story.append(Paragraph(titre, sub_heading_style))
+                    
+                        # Créer le tableau de données
+                        with stage(f"Tableau {titre}", section=section_name):
+                            df_subset = df_indexed[colonnes_existantes].copy()
+                    
+                            # Convertir en liste pour le tableau PDF
+                            data = [['Année'] + list(df_subset.columns)]  # En-têtes
+                            for annee, row in df_subset.iterrows():
+                                formatted_row = [str(int(annee))]  # Année
+                                for val in row:
+                                    if pd.isna(val):
+                                        formatted_row.append("N/A")
+                                    elif isinstance(val, (int, float)):
+                                        formatted_row.append(f"{val:,.1f}")
+                                    else:
+                                        formatted_row.append(str(val))
+                                data.append(formatted_row)
+                    
+                            # Créer le tableau
+                            table = Table(data)
+                            table.setStyle(TableStyle([
+                                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+                                ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+                                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                                ('FONTSIZE', (0, 0), (-1, 0), 9),
+                                ('FONTSIZE', (0, 1), (-1, -1), 8),
+                                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+                                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+                                ('GRID', (0, 0), (-1, -1), 1, colors.black)
+                            ]))
+                    
+                            story.append(table)
+                            story.append(Spacer(1, 10))
+                    
+                        # Créer et ajouter le graphique
+                        with stage(f"Graphique {titre}", section=section_name):
+                            chart_path = create_chart_image(df_indexed, colonnes_existantes, titre)
+                        if chart_path:
+                            temp_files.append(chart_path)
+                            try:
+                                # Vérifier que l'image existe et a une taille > 0
+                                if os.path.exists(chart_path) and os.path.getsize(chart_path) > 1000:  # Au moins 1KB
+                                    chart_image = Image(chart_path, width=5*inch, height=3.3*inch)
+                                    story.append(chart_image)
+                                    story.append(Spacer(1, 15))
+                                    story.append(PageBreak())
+                                else:
+                                    # Message de diagnostic
+                                    story.append(Paragraph(f"[Graphique {titre} non généré - données insuffisantes]", styles['Normal']))
+                                    story.append(Spacer(1, 10))
+                            except Exception as e:
+                                # Message d'erreur dans le PDF
+                                story.append(Paragraph(f"[Erreur graphique {titre}: {str(e)[:50]}]", styles['Normal']))
+                                story.append(Spacer(1, 10))
+                        else:
+                            # Pas de graphique généré
+                            story.append(Paragraph(f"[Graphique {titre} non disponible]", styles['Normal']))
+                            story.append(Spacer(1, 10))
+    
+    # Page de notes/méthodologie
+    story.append(PageBreak())
+    story.append(Paragraph("NOTES MÉTHODOLOGIQUES", heading_style))
+    
+    notes_text = """
+    <b>Sources des données :</b><br/>
+    - Direction Générale des Finances Publiques (DGFiP)<br/>
+    - SFP COLLECTIVITÉS<br/>
+    - Dataset : Comptes individuels des communes<br/><br/>
+    """
+    
+    story.append(Paragraph(notes_text, styles['Normal']))
+    
+    # Construire le PDF
+    try:
+        with stage("doc.build", flowables=len(story)):
+            doc.build(story)
+        pdf_buffer.seek(0)
+        pdf_data = pdf_buffer.getvalue()
+        
+        # Nettoyage des fichiers temporaires
+        for temp_file in temp_files:
+            try:
+                os.unlink(temp_file)
+            except:
+                pass
+        
+        return pdf_data
+    
+    except Exception as e:
+        # Nettoyage en cas d'erreur
+        for temp_file in temp_files:
+            try:
+                os.unlink(temp_file)
+            except:
+                pass
+        raise e
+    """Crée un fichier Excel complet avec tous les indicateurs financiers"""
+    
+    # Récupération de toutes les données
+    with st.spinner("📊 Récupération des données financières..."):
+        all_data = get_all_commune_data(commune, annees, departement)
+    
+    # Création du fichier Excel en mémoire avec BytesIO (solution alternative)
+    from io import BytesIO
+    
+    excel_buffer = BytesIO()
+    
+    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
+        
+        # Page de synthèse
+        if not all_data['fonctionnement'].empty:
+            # Création d'un tableau de synthèse
+            synthese = all_data['fonctionnement'][['Année', 'Population']].copy()
+            
+            # Ajout des indicateurs clés de chaque module
+            if not all_data['caf'].empty:
+                synthese = synthese.merge(
+                    all_data['caf'][['Année', 'CAF brute / hab Commune', 'CAF brute / RRF Commune']], 
+                    on='Année', how='left'
+                )
+            
+            if not all_data['fiscalite'].empty:
+                synthese = synthese.merge(
+                    all_data['fiscalite'][['Année', 'Impôts / hab Commune']], 
+                    on='Année', how='left'
+                )
+            
+            if not all_data['endettement'].empty:
+                synthese = synthese.merge(
+                    all_data['endettement'][['Année', 'Dette / hab Commune', 'Dette en années CAF Commune']], 
+                    on='Année', how='left'
+                )
+            
+            synthese.to_excel(writer, sheet_name='Synthèse', index=False)
+        
+        # Écriture des données par module
+        if not all_data['fonctionnement'].empty:
+            all_data['fonctionnement'].to_excel(writer, sheet_name='Fonctionnement', index=False)
+        
+        if not all_data['caf'].empty:
+            all_data['caf'].to_excel(writer, sheet_name='CAF', index=False)
+        
+        if not all_data['fiscalite'].empty:
+            all_data['fiscalite'].to_excel(writer, sheet_name='Fiscalité', index=False)
+        
+        if not all_data['endettement'].empty:
+            all_data['endettement'].to_excel(writer, sheet_name='Endettement', index=False)
+        
+        if not all_data['investissement'].empty:
+            all_data['investissement'].to_excel(writer, sheet_name='Investissement', index=False)
+        
+        if not all_data['fdr'].empty:
+            all_data['fdr'].to_excel(writer, sheet_name='Fonds de roulement', index=False)
+    
+    # Récupération des données depuis le buffer
+    excel_buffer.seek(0)
+    excel_data = excel_buffer.getvalue()
+    
+def create_excel_report(commune, annees, departement):
+    """Crée un fichier Excel complet avec tous les indicateurs financiers"""
+    
+    # Récupération de toutes les données
+    with st.spinner("📊 Récupération des données financières..."):
+        with stage("Récupération des données"):
+            all_data = get_all_commune_data(commune, annees, departement)
+    
+    # Création du fichier Excel en mémoire
+    excel_buffer = BytesIO()
+    
+    with stage("Écriture Excel"):
+        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
+        
+            # Page de synthèse
+            with stage("Feuille Synthèse"):
+                if not all_data['fonctionnement'].empty:
+                    # Création d'un tableau de synthèse
+                    synthese = all_data['fonctionnement'][['Année', 'Population']].copy()
+            
+                    # Ajout des indicateurs clés de chaque module
+                    if not all_data['caf'].empty:
+                        synthese = synthese.merge(
+                            all_data['caf'][['Année', 'CAF brute / hab Commune', 'CAF brute / RRF Commune']], 
+                            on='Année', how='left'
+                        )
+            
+                    if not all_data['fiscalite'].empty:
+                        synthese = synthese.merge(
+                            all_data['fiscalite'][['Année', 'Impôts / hab Commune']], 
+                            on='Année', how='left'
+                        )
+            
+                    if not all_data['endettement'].empty:
+                        synthese = synthese.merge(
+                            all_data['endettement'][['Année', 'Dette / hab Commune', 'Dette en années CAF Commune']], 
+                            on='Année', how='left'
+                        )
+            
+                    synthese.to_excel(writer, sheet_name='Synthèse', index=False)
+        
+            # Écriture des données par module
+            if not all_data['fonctionnement'].empty:
+                all_data['fonctionnement'].to_excel(writer, sheet_name='Fonctionnement', index=False)
+        
+            if not all_data['caf'].empty:
+                all_data['caf'].to_excel(writer, sheet_name='CAF', index=False)
+        
+            if not all_data['fiscalite'].empty:
+                all_data['fiscalite'].to_excel(writer, sheet_name='Fiscalité', index=False)
+        
+            if not all_data['endettement'].empty:
+                all_data['endettement'].to_excel(writer, sheet_name='Endettement', index=False)
+        
+            if not all_data['investissement'].empty:
+                all_data['investissement'].to_excel(writer, sheet_name='Investissement', index=False)
+        
+            if not all_data['fdr'].empty:
+                all_data['fdr'].to_excel(writer, sheet_name='Fonds de roulement', index=False)
+    
+    # Récupération des données depuis le buffer
+    excel_buffer.seek(0)
+    excel_data = excel_buffer.getvalue()
+    
+    return excel_data
+# Nom des fichiers dans l'archive colonnaire (un fichier par module)
+COLUMNAR_MODULES = {
+    'fonctionnement': 'fonctionnement',
+    'caf': 'caf',
+    'fiscalite': 'fiscalite',
+    'endettement': 'endettement',
+    'investissement': 'investissement',
+    'fdr': 'fonds_de_roulement'
+}
+
+def _typer_colonnes(df):
+    """Convertit les colonnes en types numériques compacts avant export colonnaire"""
+    df = df.copy()
+    for col in df.columns:
+        if col == 'Année':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int16')
+        elif df[col].dtype == object:
+            converti = pd.to_numeric(df[col], errors='coerce')
+            # On ne convertit que si aucune valeur non vide n'est perdue
+            if converti.notna().sum() == df[col].notna().sum():
+                df[col] = converti.astype('float64')
+    return df
+
+def create_columnar_export(commune, annees, departement, format="parquet"):
+    """Crée une archive zip des six modules au format Parquet ou Arrow IPC"""
+    import zipfile
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with st.spinner("📦 Récupération des données financières..."):
+        all_data = get_all_commune_data(commune, annees, departement)
+
+    metadata = {
+        "commune": str(commune),
+        "departement": str(departement or ""),
+        "annees": ",".join(str(a) for a in sorted(annees)),
+        "source": "DGFiP - Comptes individuels des communes"
+    }
+    extension = "parquet" if format == "parquet" else "arrow"
+
+    zip_buffer = BytesIO()
+    # Les fichiers sont déjà compressés (zstd) : pas de recompression zip
+    with zipfile.ZipFile(zip_buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for module, nom_fichier in COLUMNAR_MODULES.items():
+            df = all_data[module]
+            if df.empty:
+                continue
+
+            table = pa.Table.from_pandas(_typer_colonnes(df), preserve_index=False)
+            table = table.replace_schema_metadata({
+                **(table.schema.metadata or {}),
+                **{k.encode(): v.encode() for k, v in {**metadata, "module": module}.items()}
+            })
+
+            file_buffer = pa.BufferOutputStream()
+            if format == "parquet":
+                pq.write_table(table, file_buffer, compression="zstd")
+            else:
+                options = pa.ipc.IpcWriteOptions(compression="zstd")
+                with pa.ipc.new_file(file_buffer, table.schema, options=options) as writer:
+                    writer.write_table(table)
+
+            archive.writestr(f"{nom_fichier}.{extension}", file_buffer.getvalue().to_pybytes())
+
+    zip_buffer.seek(0)
+    return zip_buffer.getvalue()
@@ -0,0 +1,147 @@
+# score_sante.py - Score de santé financière vectorisé, pour toutes les communes et années
+#
+# Mêmes règles que la fiche CAF de test.py (score sur 100, statut, alertes et
+# priorités), appliquées en une passe à un tableau long (une ligne par commune et
+# par année). Le classement national est rangé par strate de population et
+# stocké en Parquet à côté du panel, pour afficher « rang X sur Y » sans calcul.
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import panel_store
+from app_fetchers import DATASETS_MAPPING
+from caches import LRUCache
+from cles import cle_commune
+from indicateurs import IDENTIFIANTS, MODULE_COLUMNS, caf
+
+CLASSEMENT_PATH = os.path.join(panel_store.PANEL_DIR, "scores.parquet")
+
+# Strates démographiques DGFiP (bornes basses incluses)
+BORNES_STRATES = [0, 100, 200, 500, 2000, 3500, 5000, 10000, 20000, 50000, 100000, np.inf]
+STRATES = [
+    "< 100 hab", "100 - 200 hab", "200 - 500 hab", "500 - 2 000 hab", "2 000 - 3 500 hab",
+    "3 500 - 5 000 hab", "5 000 - 10 000 hab", "10 000 - 20 000 hab", "20 000 - 50 000 hab",
+    "50 000 - 100 000 hab", ">= 100 000 hab",
+]
+
+STATUTS = ["excellent", "good", "warning", "danger"]
+
+_classement_cache = LRUCache(maxsize=1, name="classement_sante")
+
+def strate(population):
+    """Libellé de strate pour une population (scalaire ou série)"""
+    if np.ndim(population) == 0:
+        indice = np.searchsorted(BORNES_STRATES, population, side="right") - 1
+        return STRATES[min(max(indice, 0), len(STRATES) - 1)]
+    return pd.cut(pd.Series(population), BORNES_STRATES, right=False, labels=STRATES)
+
+def evaluer(df):
+    """Score, statut, alertes et priorités de chaque ligne (commune, année).
+
+    `df` suit le format de indicateurs.caf ; l'évolution de la CAF / hab est
+    mesurée depuis la première année de chaque commune présente dans `df`.
+    """
+    cles = [c for c in ("Commune", "Département") if c in df.columns]
+    df = df.sort_values(cles + ["Année"], kind="stable").reset_index(drop=True)
+
+    ratio = df["CAF brute / RRF Commune"].to_numpy(dtype="float64")
+    moyenne = df["CAF brute / RRF Moyenne"].to_numpy(dtype="float64")
+    caf_hab = df["CAF brute / hab Commune"].to_numpy(dtype="float64")
+
+    # Première ligne de chaque commune : base de l'évolution
+    premiere = ~df.duplicated(cles) if cles else pd.Series(np.arange(len(df)) == 0)
+    groupe = premiere.cumsum().to_numpy() - 1
+    base = caf_hab[premiere.to_numpy()][groupe]
+    suivante = ~premiere.to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        evolution = np.where(suivante, (caf_hab / base - 1) * 100, np.nan)
+
+    score = 50 + np.select([ratio > 10, ratio > 7, ratio < 5], [20, 10, -10], 0)
+    score += np.where(ratio > moyenne, 15, -5)
+    score += np.select([evolution > 5, evolution > 0, evolution < -5], [15, 10, -15], 0)
+    score = np.clip(score, 0, 100)
+
+    df["Évolution CAF / hab (%)"] = evolution
+    df["Score"] = score
+    df["Statut"] = np.select([score >= 80, score >= 60, score >= 40], STATUTS[:3], STATUTS[3])
+
+    ecart = ratio - moyenne
+    df["Écart CAF / RRF"] = ecart
+    df["Alerte CAF / RRF supérieur"] = ecart > 2
+    df["Alerte CAF / RRF inférieur"] = ecart < -2
+    df["Alerte croissance"] = evolution > 10
+    df["Alerte baisse"] = evolution < -10
+    df["Alerte vigilance"] = ratio < 5
+    df["Priorité ratio"] = ratio < 7
+    df["Priorité moyenne"] = ratio < moyenne
+    df["Priorité tendance"] = evolution < 0
+    return df
+
+def classer(df):
+    """Ajoute la strate, le rang dans la strate (par année) et l'effectif de la strate"""
+    df = evaluer(df)
+    df["Strate"] = strate(df["Population"])
+    groupes = df.groupby(["Année", "Strate"], observed=True)["Score"]
+    df["Rang strate"] = groupes.rank(method="min", ascending=False).astype("Int64")
+    df["Communes strate"] = groupes.transform("size")
+    return df.sort_values(["Année", "Strate", "Rang strate"], ignore_index=True)
+
+def construire_classement(annees=None):
+    """Classement national : indicateurs CAF de chaque année (panel local ou API), puis scores"""
+    annees = sorted(annees or DATASETS_MAPPING)
+    colonnes = list(IDENTIFIANTS) + MODULE_COLUMNS["caf"]
+    frames = [caf(panel_store.lire_annee(annee, colonnes), identifiants=True) for annee in annees]
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    df["Année"] = df["Année"].astype(str)
+    return classer(df)
+
+def enregistrer_classement(classement, chemin=CLASSEMENT_PATH):
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    chemin_tmp = chemin + ".tmp"
+    classement.assign(Strate=classement["Strate"].astype(str)).to_parquet(chemin_tmp, index=False)
+    os.replace(chemin_tmp, chemin)
+    _classement_cache.reset()
+
+def charger_classement(chemin=CLASSEMENT_PATH):
+    """Classement stocké, None s'il n'a pas été construit"""
+    classement = _classement_cache.get(chemin)
+    if classement is None and os.path.exists(chemin):
+        classement = pd.read_parquet(chemin, columns=["Commune", "Département", "Année", "Strate", "Score"])
+        _classement_cache.set(chemin, classement)
+    return classement
+
+def rang_dans_strate(score, population, annee, commune=None, departement=None, classement=None):
+    """(rang, effectif, strate) d'un score parmi les autres communes de sa strate l'année donnée"""
+    classement = charger_classement() if classement is None else classement
+    if classement is None:
+        return None
+    libelle = strate(population)
+    masque = (classement["Année"] == str(annee)) & (classement["Strate"] == libelle)
+    if commune:
+        commune, departement = cle_commune(commune, departement)
+        elle_meme = classement["Commune"] == commune
+        if departement:
+            elle_meme &= classement["Département"] == departement
+        masque &= ~elle_meme
+    autres = classement.loc[masque, "Score"].to_numpy()
+    if not len(autres):
+        return None
+    return int((autres > score).sum()) + 1, len(autres) + 1, libelle
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classement national des scores de santé financière")
+    parser.add_argument("--annees", type=int, nargs="*")
+    parser.add_argument("--sortie", default=CLASSEMENT_PATH)
+    args = parser.parse_args(argv)
+
+    classement = construire_classement(args.annees)
+    enregistrer_classement(classement, args.sortie)
+    print(f"✅ {args.sortie} ({len(classement):,} lignes)")
+
+if __name__ == "__main__":
+    main()
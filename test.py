@@ -6,6 +6,8 @@ from plotly.subplots import make_subplots
 import re
 from functools import lru_cache
 from difflib import SequenceMatcher
+from app_fetchers import API_BASE_URL, MODULE_COLUMNS, api_get_json, select_for
+from score_sante import evaluer, rang_dans_strate
 import numpy as np
 
 # Configuration
@@ -345,7 +347,7 @@ def get_dataset_for_year(annee):
 
 def get_api_url_for_year(annee):
     dataset = get_dataset_for_year(annee)
-    return f"https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/{dataset}/records"
+    return f"{API_BASE_URL}/catalog/datasets/{dataset}/records"
 
 class RobustCommuneFetcher:
     def __init__(self):
@@ -374,7 +376,7 @@ class RobustCommuneFetcher:
         datasets_to_search = list(set(DATASETS_MAPPING.values()))
         
         for dataset in datasets_to_search:
-            api_url = f"https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/{dataset}/records"
+            api_url = f"{API_BASE_URL}/catalog/datasets/{dataset}/records"
             for term in search_terms:
                 where_clause = f'inom LIKE "%{term}%"'
                 if departement:
@@ -383,8 +385,7 @@ class RobustCommuneFetcher:
                 params = {"where": where_clause, "limit": 50, "select": "inom,dep"}
                 
                 try:
-                    response = requests.get(api_url, params=params, timeout=10)
-                    data = response.json()
+                    data = api_get_json(api_url, params, module="variantes")
                     if "results" in data:
                         for record in data["results"]:
                             nom = record.get("inom", "")
@@ -440,16 +441,15 @@ def fetch_commune_caf(commune, annees, departement=None):
             where_clause = f'an="{annee}" AND inom="{commune_nom}"'
             if dept:
                 where_clause += f' AND dep="{dept}"'
-            params = {"where": where_clause, "limit": 100}
+            params = {"where": where_clause, "limit": 100, "select": select_for("caf")}
             
             try:
-                response = requests.get(api_url, params=params, timeout=10)
-                data = response.json()
+                data = api_get_json(api_url, params, module="caf_analytics")
                 if "results" not in data or not data["results"]:
                     continue
                 
                 df = pd.DataFrame(data["results"])
-                colonnes_calc = ['an', 'pop1', 'fcaf', 'mcaf', 'fprod', 'mprod', 'fcafn', 'mcafn']
+                colonnes_calc = MODULE_COLUMNS["caf"]
                 colonnes_existantes = [c for c in colonnes_calc if c in df.columns]
                 if not colonnes_existantes:
                     continue
@@ -491,38 +491,17 @@ def fetch_commune_caf(commune, annees, departement=None):
         st.warning(f"Aucune donnée trouvée pour {commune}")
         return pd.DataFrame()
 
-# Fonctions d'analyse
+# Fonctions d'analyse (règles communes avec le classement national, voir score_sante.py)
+def evaluer_caf(caf_df):
+    """Score, alertes et priorités de la dernière année analysée"""
+    evaluation = evaluer(caf_df.rename(columns={'CAF brute / habitant Commune': 'CAF brute / hab Commune'}))
+    return evaluation.iloc[-1]
+
 def calculer_score_sante(caf_df):
     """Calcule un score de santé financière sur 100"""
     if caf_df.empty:
         return 0
-    
-    derniere = caf_df.iloc[-1]
-    score = 50
-    
-    if derniere['CAF brute / RRF Commune'] > 10:
-        score += 20
-    elif derniere['CAF brute / RRF Commune'] > 7:
-        score += 10
-    elif derniere['CAF brute / RRF Commune'] < 5:
-        score -= 10
-    
-    if derniere['CAF brute / RRF Commune'] > derniere['CAF brute / RRF Moyenne']:
-        score += 15
-    else:
-        score -= 5
-    
-    if len(caf_df) > 1:
-        evolution = ((caf_df['CAF brute / habitant Commune'].iloc[-1] / 
-                     caf_df['CAF brute / habitant Commune'].iloc[0]) - 1) * 100
-        if evolution > 5:
-            score += 15
-        elif evolution > 0:
-            score += 10
-        elif evolution < -5:
-            score -= 15
-    
-    return max(0, min(100, score))
+    return int(evaluer_caf(caf_df)['Score'])
 
 def get_health_status(score):
     """Retourne le statut de santé selon le score"""
@@ -542,36 +521,33 @@ def generer_insights(caf_df):
     if caf_df.empty:
         return insights
     
-    derniere = caf_df.iloc[-1]
+    derniere = evaluer_caf(caf_df)
+    diff_rrf = derniere['Écart CAF / RRF']
+    evolution = derniere['Évolution CAF / hab (%)']
     
-    diff_rrf = derniere['CAF brute / RRF Commune'] - derniere['CAF brute / RRF Moyenne']
-    if abs(diff_rrf) > 2:
-        if diff_rrf > 0:
-            insights.append({
-                "icon": "📈",
-                "text": f"Votre CAF/RRF est supérieur de {diff_rrf:.1f} points à la moyenne nationale. Excellente performance !"
-            })
-        else:
-            insights.append({
-                "icon": "⚠️",
-                "text": f"Votre CAF/RRF est inférieur de {abs(diff_rrf):.1f} points à la moyenne. Des marges d'amélioration existent."
-            })
+    if derniere['Alerte CAF / RRF supérieur']:
+        insights.append({
+            "icon": "📈",
+            "text": f"Votre CAF/RRF est supérieur de {diff_rrf:.1f} points à la moyenne nationale. Excellente performance !"
+        })
+    elif derniere['Alerte CAF / RRF inférieur']:
+        insights.append({
+            "icon": "⚠️",
+            "text": f"Votre CAF/RRF est inférieur de {abs(diff_rrf):.1f} points à la moyenne. Des marges d'amélioration existent."
+        })
     
-    if len(caf_df) > 1:
-        evolution = ((caf_df['CAF brute / habitant Commune'].iloc[-1] / 
-                     caf_df['CAF brute / habitant Commune'].iloc[0]) - 1) * 100
-        if evolution > 10:
-            insights.append({
-                "icon": "🚀",
-                "text": f"Croissance remarquable de {evolution:.1f}% de votre CAF/habitant sur la période."
-            })
-        elif evolution < -10:
-            insights.append({
-                "icon": "📉",
-                "text": f"Attention : diminution de {abs(evolution):.1f}% de votre CAF/habitant. Analyse recommandée."
-            })
+    if derniere['Alerte croissance']:
+        insights.append({
+            "icon": "🚀",
+            "text": f"Croissance remarquable de {evolution:.1f}% de votre CAF/habitant sur la période."
+        })
+    elif derniere['Alerte baisse']:
+        insights.append({
+            "icon": "📉",
+            "text": f"Attention : diminution de {abs(evolution):.1f}% de votre CAF/habitant. Analyse recommandée."
+        })
     
-    if derniere['CAF brute / RRF Commune'] < 5:
+    if derniere['Alerte vigilance']:
         insights.append({
             "icon": "🔴",
             "text": "Votre CAF/RRF est sous le seuil de vigilance de 5%. Action immédiate recommandée."
@@ -586,19 +562,16 @@ def identifier_priorites(caf_df):
     if caf_df.empty:
         return priorites
     
-    derniere = caf_df.iloc[-1]
+    derniere = evaluer_caf(caf_df)
     
-    if derniere['CAF brute / RRF Commune'] < 7:
+    if derniere['Priorité ratio']:
         priorites.append("Améliorer le ratio CAF/RRF (objectif > 7%) pour renforcer la capacité d'autofinancement")
     
-    if derniere['CAF brute / RRF Commune'] < derniere['CAF brute / RRF Moyenne']:
+    if derniere['Priorité moyenne']:
         priorites.append("Rattraper la moyenne nationale en optimisant les recettes de fonctionnement")
     
-    if len(caf_df) > 1:
-        evolution = ((caf_df['CAF brute / habitant Commune'].iloc[-1] / 
-                     caf_df['CAF brute / habitant Commune'].iloc[0]) - 1) * 100
-        if evolution < 0:
-            priorites.append("Inverser la tendance baissière observée sur les dernières années")
+    if derniere['Priorité tendance']:
+        priorites.append("Inverser la tendance baissière observée sur les dernières années")
     
     if len(priorites) == 0:
         priorites.append("Maintenir le bon niveau de performance actuel")
@@ -705,6 +678,12 @@ if commune_selectionnee and annees:
                 <div class="score-label">{status_label}</div>
             </div>
             """, unsafe_allow_html=True)
+            
+            rang = rang_dans_strate(score, derniere_ligne['Population'], derniere_annee,
+                                    commune_selectionnee, departement_selectionne)
+            if rang:
+                position, effectif, strate_commune = rang
+                st.caption(f"Rang {position:,} sur {effectif:,} dans la strate {strate_commune} ({derniere_annee})".replace(",", " "))
         
         with col_insights:
             insights = generer_insights(caf)
@@ -0,0 +1,109 @@
+# warmup.py - Préchauffage des caches persistants avant l'ouverture du serveur
+#
+# Rejoue, pour les communes les plus demandées, les requêtes de l'accueil, des six
+# pages d'analyse et des exports, et calcule les graphiques du PDF : les réponses
+# et les PNG sont écrits dans la base persistante (cache_persistant), que le
+# serveur relit ensuite derrière ses caches en mémoire.
+#
+#   python warmup.py --communes top_communes.txt       # « NOM » ou « NOM;département » par ligne
+#   python warmup.py --consultations 200               # communes les plus consultées dans l'app
+#   FOCUS_CACHE_DB=data/cache/focus.sqlite streamlit run prod.py
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import cache_persistant
+from cles import cle_commune
+from prechargement import PREFIXE_THREADS, precharger
+
+# Pages d'analyse d'une commune, dans l'ordre de la navigation de prod.py
+PAGES = [
+    "pages.fonctionnement", "pages.caf", "pages.fiscalite",
+    "pages.endettements", "pages.investissements", "pages.fdr",
+]
+
+ANNEES = list(range(2019, 2025))
+
+# Communes préchauffées en même temps : borne la charge envoyée à l'API
+CONCURRENCE = 4
+
+def lire_communes(lignes):
+    """« NOM » ou « NOM;département » par ligne (lignes vides et # ignorées) -> [(nom, département)]"""
+    communes = []
+    for ligne in lignes:
+        ligne = ligne.split("#", 1)[0].strip()
+        if not ligne:
+            continue
+        nom, _, departement = ligne.partition(";")
+        commune = cle_commune(nom, departement)
+        if commune[0] and commune not in communes:
+            communes.append(commune)
+    return communes
+
+def rechauffer_commune(nom, departement, annees=ANNEES, pages=PAGES, graphiques=True):
+    """Recherche de l'accueil puis préchargement de chaque homonyme retenu -> (communes, requêtes HTTP)"""
+    from app_fetchers import compter_requetes, search_commune
+
+    with compter_requetes("warmup") as compteur:
+        trouvees = [
+            (c["nom"], c["departement"]) for c in search_commune(nom)
+            if not departement or c["departement"] == departement
+        ]
+        for commune, dep in trouvees:
+            precharger(commune, annees, dep, pages=pages, graphiques=graphiques)
+    return trouvees, compteur.requetes
+
+def rechauffer(communes, annees=ANNEES, concurrence=CONCURRENCE, graphiques=True, sortie=sys.stdout):
+    """Préchauffe les communes (au plus `concurrence` à la fois) ; retourne les communes en échec"""
+    echecs = []
+    with ThreadPoolExecutor(max_workers=concurrence, thread_name_prefix=PREFIXE_THREADS) as executor:
+        futures = {
+            executor.submit(rechauffer_commune, nom, dep, annees, graphiques=graphiques): (nom, dep)
+            for nom, dep in communes
+        }
+        for future in as_completed(futures):
+            nom, dep = futures[future]
+            try:
+                trouvees, requetes = future.result()
+            except Exception as e:
+                echecs.append((nom, dep))
+                print(f"❌ {nom} ({dep or '?'}) : {e}", file=sortie)
+                continue
+            if trouvees:
+                print(f"✅ {nom} ({', '.join(d for _, d in trouvees)}) : {requetes} requête(s)", file=sortie)
+            else:
+                echecs.append((nom, dep))
+                print(f"⚠️ {nom} ({dep or '?'}) introuvable", file=sortie)
+    return echecs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Préchauffe les caches persistants (réponses API, graphiques PDF)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--communes", help="Fichier des communes (« NOM » ou « NOM;département » par ligne)")
+    source.add_argument("--consultations", type=int, metavar="N",
+                        help="Les N communes les plus consultées dans l'application")
+    parser.add_argument("--annees", type=int, nargs="*", default=ANNEES)
+    parser.add_argument("--concurrence", type=int, default=CONCURRENCE)
+    parser.add_argument("--db", default=os.environ.get("FOCUS_CACHE_DB") or cache_persistant.CACHE_DB_DEFAUT,
+                        help="Base persistante (défaut : FOCUS_CACHE_DB, sinon data/cache/focus.sqlite)")
+    parser.add_argument("--sans-graphiques", action="store_true", help="Ne calcule pas les graphiques du PDF")
+    args = parser.parse_args(argv)
+
+    cache_persistant.configurer(args.db)
+    if args.communes:
+        with open(args.communes, encoding="utf-8") as f:
+            communes = lire_communes(f)
+    else:
+        communes = [(c, d) for c, d, _ in cache_persistant.consultations.plus_consultees(args.consultations)]
+
+    debut = time.perf_counter()
+    echecs = rechauffer(communes, args.annees, args.concurrence, graphiques=not args.sans_graphiques)
+    print(f"{len(communes) - len(echecs)}/{len(communes)} communes préchauffées en "
+          f"{time.perf_counter() - debut:.1f} s -> {args.db}")
+    print(f"Lancer le serveur avec FOCUS_CACHE_DB={args.db}")
+    return 1 if echecs else 0
+
+if __name__ == "__main__":
+    sys.exit(main())